@@ -1,10 +1,16 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from services.claude_service import process_user_input
 from services.raw_logger import save_raw_message
-from services.daily_logs_manager import merge_daily_entry, get_daily_logs_for_api
-import os
+from services.daily_logs_manager import merge_daily_entry
+from services.ingest_queue import FINISHED, get_ingest_queue, log_queue_enabled
+from services.upstream_guard import UpstreamUnavailable, get_upstream_guard, unavailable_mode
+from typing import Iterator, List, Optional
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -12,10 +18,31 @@ class LogInput(BaseModel):
     input: str
 
 @router.post("/log")
-async def log_entry(log_input: LogInput):
+async def log_entry(log_input: LogInput, wait: bool = False):
+    """
+    Save the raw message and extract it into the daily logs.
+    With the ingestion queue enabled (LOG_QUEUE_ENABLED=1) this returns 202 with a job id
+    as soon as the raw message is saved; pass wait=true to process it in the request.
+    """
+    import asyncio
+    from datetime import datetime
+    
+    queue = get_ingest_queue() if log_queue_enabled() else None
+    if queue is not None and queue.running and not wait:
+        return await _enqueue_log(queue, log_input.input)
+    
+    # Fail fast, before saving anything, while the circuit breaker is open
+    breaker = get_upstream_guard().breaker
+    if unavailable_mode() == "fail" and breaker.state == "open":
+        return _unavailable_response(UpstreamUnavailable("Claude is unavailable (circuit open)"))
+    
+    if queue is not None:
+        queue.prepare()
+    timestamp = datetime.now().isoformat()
     try:
-        # Always save the raw message to logs.csv
-        raw_message_saved = save_raw_message(log_input.input)
+        # Always save the raw message to the raw log; the writes wait on file locks
+        # (a rebuild or bulk save may hold them), so they run off the event loop
+        raw_message_saved = await asyncio.to_thread(save_raw_message, log_input.input, timestamp)
         if not raw_message_saved:
             raise HTTPException(status_code=400, detail="Invalid or empty message")
         
@@ -25,7 +52,13 @@ async def log_entry(log_input: LogInput):
         # Only update daily logs if the message contains meaningful wellness data
         daily_log_updated = False
         if is_meaningful:
-            daily_log_updated = merge_daily_entry(structured_data)
+            daily_log_updated = await asyncio.to_thread(merge_daily_entry, structured_data)
+        
+        if queue is not None:
+            # Processed here, so the queue must not replay it after a restart
+            queue.record(timestamp, log_input.input.strip(), "done", result={
+                "data": structured_data, "daily_log_updated": daily_log_updated
+            })
         
         return {
             "status": "success", 
@@ -33,120 +66,346 @@ async def log_entry(log_input: LogInput):
             "daily_log_updated": daily_log_updated,
             "raw_message_saved": raw_message_saved
         }
+    except HTTPException:
+        raise
+    except UpstreamUnavailable as e:
+        # The raw message is saved; keep it for later instead of failing the request
+        logger.warning("Claude unavailable, stored raw message only: %s", e)
+        if queue is not None and queue.running and queue.has_room():
+            queue.submit(timestamp, log_input.input.strip())
+            detail = "Claude is unavailable; the message is queued for processing"
+        else:
+            if queue is not None:
+                queue.record(timestamp, log_input.input.strip(), "failed", error=str(e))
+            detail = "Claude is unavailable; the message is saved and can be processed by rebuild_daily_logs.py"
+        if unavailable_mode() == "fail":
+            return _unavailable_response(e)
+        return {
+            "status": "stored",
+            "data": None,
+            "daily_log_updated": False,
+            "raw_message_saved": True,
+            "detail": detail
+        }
     except Exception as e:
+        if queue is not None:
+            queue.record(timestamp, log_input.input.strip(), "failed", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/view")
-async def view_logs(format: str = "download"):
-    from services.daily_logs_manager import get_daily_logs_path
+def _unavailable_response(error: UpstreamUnavailable) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(error)},
+        headers={"Retry-After": str(max(1, round(error.retry_after)))}
+    )
+
+async def _enqueue_log(queue, message: str):
+    import asyncio
+    from datetime import datetime
+    
+    # Refuse before saving anything, so a retried request does not duplicate the raw row
+    if not queue.has_room():
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many messages waiting to be processed, try again shortly"},
+            headers={"Retry-After": "5"}
+        )
+    
+    queue.prepare()
+    timestamp = datetime.now().isoformat()
+    if not await asyncio.to_thread(save_raw_message, message, timestamp):
+        raise HTTPException(status_code=400, detail="Invalid or empty message")
+    
+    job_id = queue.submit(timestamp, message.strip())
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "queued",
+            "job_id": job_id,
+            "raw_message_saved": True,
+            "daily_log_updated": False
+        }
+    )
+
+@router.get("/log/jobs/{job_id}")
+async def get_log_job(job_id: str):
+    """Status of a queued /log message, with the extracted data once done"""
+    job = get_ingest_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/log/jobs/{job_id}/events")
+async def stream_log_job(job_id: str):
+    """Server-sent events with the job's status on every change, ending once it is finished"""
+    queue = get_ingest_queue()
+    if queue.store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    daily_logs_path = get_daily_logs_path()
+    async def events():
+        last_status = None
+        while True:
+            job = queue.store.get(job_id)
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                if job["status"] in FINISHED:
+                    return
+            if not queue.running:
+                return
+            if not await queue.wait_for_change(timeout=15):
+                yield ": keep-alive\n\n"
     
-    if not os.path.exists(daily_logs_path):
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+def _project(row: dict, fields: Optional[List[str]], key_fields: tuple) -> dict:
+    """Keep the key fields plus the requested ones"""
+    if fields is None:
+        return row
+    return {field: row.get(field, "") for field in (*key_fields, *fields)}
+
+def _stream_json(rows: Iterator[dict]) -> Iterator[str]:
+    """Stream {"logs": [...]} one row at a time"""
+    yield '{"logs": ['
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(row)
+    yield "]}"
+
+def _stream_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+def _rows_response(rows: Iterator[dict], format: str):
+    if format == "ndjson":
+        return StreamingResponse(_stream_ndjson(rows), media_type="application/x-ndjson")
+    return StreamingResponse(_stream_json(rows), media_type="application/json")
+
+@router.get("/view")
+async def view_logs(
+    format: str = "download",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    Daily logs as a CSV download, JSON or NDJSON.
+    JSON and NDJSON accept a date range (from/to), field projection (fields=sleep,caffeine)
+    and pagination (limit, then cursor=next_cursor from the previous page).
+    """
+    from services.daily_logs_manager import has_daily_logs, iter_daily_logs, iter_daily_logs_csv
+    
+    if not has_daily_logs():
         return JSONResponse(content={"message": "No logs found"}, status_code=404)
     
     if format == "download":
-        return FileResponse(
-            path=daily_logs_path,
+        # The CSV is generated from the store on demand
+        return StreamingResponse(
+            iter_daily_logs_csv(),
             media_type="text/csv",
-            filename="daily_wellness_logs.csv"
+            headers={"Content-Disposition": 'attachment; filename="daily_wellness_logs.csv"'}
         )
-    else:
-        logs = get_daily_logs_for_api()
-        return {"logs": logs}
+    
+    selected = _parse_fields(fields)
+    
+    if limit is not None:
+        # One page: at most `limit` rows in memory
+        logs = list(iter_daily_logs(date_from, date_to, after=cursor, limit=limit + 1))
+        next_cursor = logs[limit - 1]["date"] if len(logs) > limit else None
+        return {
+            "logs": [_project(row, selected, ("date",)) for row in logs[:limit]],
+            "next_cursor": next_cursor
+        }
+    
+    rows = (_project(row, selected, ("date",)) for row in iter_daily_logs(date_from, date_to, after=cursor))
+    return _rows_response(rows, format)
 
 @router.get("/view/raw")
-async def view_raw_logs(format: str = "download"):
-    """Endpoint to view raw message logs"""
-    from services.raw_logger import get_raw_logs_path
+async def view_raw_logs(
+    format: str = "download",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[int] = Query(None, ge=0),
+    fields: Optional[str] = None
+):
+    """Endpoint to view raw message logs, with the same options as /view"""
+    from services.raw_logger import get_raw_log, iter_raw_messages
     
-    raw_logs_path = get_raw_logs_path()
+    raw_log = get_raw_log()
     
-    if not os.path.exists(raw_logs_path):
+    if not raw_log.count():
         return JSONResponse(content={"message": "No raw logs found"}, status_code=404)
     
     if format == "download":
-        return FileResponse(
-            path=raw_logs_path,
+        # One CSV, streamed from the monthly segments in order
+        return StreamingResponse(
+            raw_log.iter_csv(),
             media_type="text/csv",
-            filename="raw_messages.csv"
+            headers={"Content-Disposition": 'attachment; filename="raw_messages.csv"'}
         )
-    else:
-        import csv
-        with open(raw_logs_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            logs = list(reader)
-        return {"logs": logs}
+    
+    selected = _parse_fields(fields)
+    messages = iter_raw_messages(date_from, date_to, start=cursor or 0)
+    
+    if limit is not None:
+        # The cursor is the row number to resume from
+        logs = []
+        next_cursor = None
+        for row_number, row in messages:
+            if len(logs) == limit:
+                next_cursor = row_number
+                break
+            logs.append(_project(row, selected, ("timestamp",)))
+        return {"logs": logs, "next_cursor": next_cursor}
+    
+    rows = (_project(row, selected, ("timestamp",)) for _, row in messages)
+    return _rows_response(rows, format)
+
+@router.get("/search")
+async def search_logs(
+    q: str = Query(..., min_length=1),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    kind: Optional[str] = Query(None, pattern="^(raw|daily)$"),
+    order: str = Query("rank", pattern="^(rank|date)$"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """
+    Search raw messages and daily log fields; every term must match the same message or day.
+    Terms can be scoped to a field (notes:headache, supplements:magnesium, mood:anxious),
+    quoted as a "phrase" or end in * for a prefix. order=date lists the newest first.
+    """
+    import asyncio
+    from services.search_index import ensure_search_index, search_enabled
+    
+    if not search_enabled():
+        raise HTTPException(status_code=503, detail="Search is disabled (SEARCH_INDEX_ENABLED=0)")
+    
+    # The first search after an upgrade builds the index from the logs
+    index = await asyncio.to_thread(ensure_search_index)
+    try:
+        return await asyncio.to_thread(index.search, q, date_from, date_to, kind, order, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/recent")
-async def get_recent_activity():
+async def get_recent_activity(limit: int = Query(10, ge=1, le=1000)):
     """Get recent raw messages and today's aggregated data for the UI"""
-    import csv
-    from datetime import datetime, timedelta
-    from services.raw_logger import get_raw_logs_path
-    from services.daily_logs_manager import get_daily_logs_for_api
+    from datetime import datetime
+    from services.raw_logger import get_recent_messages
+    from services.daily_logs_manager import get_daily_log, get_daily_summary
     
-    # Get recent raw messages (last 10)
+    # Get recent raw messages (last `limit`, 10 by default)
     recent_messages = []
-    raw_logs_path = get_raw_logs_path()
-    
-    if os.path.exists(raw_logs_path):
-        try:
-            with open(raw_logs_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                all_messages = []
-                
-                for row in reader:
-                    # Validate each row has required fields and valid data
-                    if (row.get("timestamp") and row.get("message") and 
-                        row["message"].strip() and row["timestamp"].strip()):
-                        all_messages.append(row)
-                
-                recent_messages = all_messages[-10:] if all_messages else []
-        except Exception as e:
-            print(f"Error reading raw logs: {e}")
+    try:
+        recent_messages = get_recent_messages(limit)
+    except Exception as e:
+        logger.error("Error reading raw logs: %s", e)
     
     # Get today's aggregated data
     today = datetime.now().strftime("%Y-%m-%d")
-    daily_logs = get_daily_logs_for_api()
-    today_log = next((log for log in daily_logs if log.get("date") == today), None)
+    today_log = get_daily_log(today)
     
-    # Calculate activity streak
-    def calculate_streak(logs):
-        if not logs:
-            return 0
-        
-        # Sort logs by date in descending order
-        sorted_logs = sorted(logs, key=lambda x: x.get("date", ""), reverse=True)
-        
-        streak = 0
-        current_date = datetime.now().date()
-        
-        for log in sorted_logs:
-            log_date_str = log.get("date")
-            if not log_date_str:
-                continue
-                
-            try:
-                log_date = datetime.strptime(log_date_str, "%Y-%m-%d").date()
-                
-                # If this is today or the expected previous day, count it
-                if log_date == current_date or (streak > 0 and log_date == current_date - timedelta(days=1)):
-                    streak += 1
-                    current_date = log_date
-                else:
-                    # Streak is broken
-                    break
-            except ValueError:
-                continue
-        
-        return streak
-    
-    activity_streak = calculate_streak(daily_logs)
+    # Streaks and rollups are maintained on every merge, so this is a few lookups
+    summary = get_daily_summary()
     
     return {
         "recent_messages": recent_messages,
         "today_log": today_log,
-        "daily_logs": daily_logs,
-        "activity_streak": activity_streak
-    }
\ No newline at end of file
+        "activity_streak": summary["current_streak"],
+        "summary": summary
+    }
+
+@router.get("/stats/daily")
+async def get_daily_stats():
+    """Days logged per week and month, plus the /recent summary"""
+    from services.daily_logs_manager import get_daily_rollups, get_daily_summary
+    
+    return {**get_daily_summary(), **get_daily_rollups()}
+
+@router.get("/trends")
+async def get_trends(
+    fields: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    window: int = Query(7, ge=1, le=365),
+    lag: int = Query(0, ge=0, le=30)
+):
+    """
+    Numeric fields (caffeine mg, sleep hours, hydration liters, alcohol) per day with a
+    rolling mean over `window` days, weekly and monthly aggregates and correlations
+    between fields; lag=1 pairs each day with the next (caffeine vs. that night's sleep).
+    """
+    import asyncio
+    from services.daily_logs_manager import get_daily_trends
+    
+    try:
+        return await asyncio.to_thread(get_daily_trends, _parse_fields(fields), date_from, date_to, window, lag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/stats")
+async def get_stats():
+    """Cache hit/miss counters, Claude token usage, admission control and the ingestion queue"""
+    from services.claude_service import get_usage_stats
+    from services.read_cache import read_cache_stats
+    from services.result_cache import cache_enabled, get_result_cache
+    
+    return {
+        "upstream": get_upstream_guard().stats(),
+        "ingest_queue": get_ingest_queue().stats() if log_queue_enabled() else None,
+        "read_cache": read_cache_stats(),
+        "claude_cache": get_result_cache().stats() if cache_enabled() else None,
+        "token_usage": get_usage_stats()
+    }
+
+class FieldInput(BaseModel):
+    name: str
+    type: str = "text"
+    merge: Optional[str] = None
+    description: str = ""
+    meaningful: bool = True
+
+@router.get("/schema")
+async def get_schema():
+    """Daily log columns and the declared fields with their type and merge policy"""
+    from services.schema_registry import get_schema_registry
+    
+    registry = get_schema_registry()
+    return {
+        "columns": registry.columns(),
+        "fields": [spec.as_dict() for spec in registry.fields()]
+    }
+
+@router.post("/schema/fields")
+async def add_schema_field(field_input: FieldInput):
+    """Add a custom tracker; stored days are not rewritten and show it empty"""
+    from services.read_cache import invalidate_daily_logs_caches
+    from services.schema_registry import FieldSpec, get_schema_registry
+    
+    spec = FieldSpec(
+        name=field_input.name.strip(),
+        type=field_input.type,
+        merge=field_input.merge,
+        description=field_input.description,
+        meaningful=field_input.meaningful,
+    )
+    try:
+        get_schema_registry().add_field(spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # The schema is shared, and every user's cached rows were expanded to the old columns
+    invalidate_daily_logs_caches()
+    return {"status": "success", "field": spec.as_dict()}
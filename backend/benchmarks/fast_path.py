@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Measure how much of the raw log (or a raw messages CSV) the local fast-path extractor
+handles without Claude, and the latency that saves.
+
+Usage: python benchmarks/fast_path.py [--logs FILE.csv] [--claude-latency-ms 2000] [--json]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.fast_extractor import extract_locally, min_confidence
+
+def iter_rows(logs_path: str):
+    if logs_path is None:
+        from services.raw_logger import iter_raw_messages
+        yield from (row for _, row in iter_raw_messages())
+        return
+    with open(logs_path, "r", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+def run(logs_path: str, claude_latency_ms: float) -> dict:
+    threshold = min_confidence()
+    total = 0
+    handled = 0
+    local_seconds = 0.0
+
+    for row in iter_rows(logs_path):
+        message = (row.get("message") or "").strip()
+        if not message:
+            continue
+
+        try:
+            reference_time = datetime.fromisoformat(row.get("timestamp", "").replace("Z", "+00:00"))
+        except ValueError:
+            reference_time = datetime.now()
+
+        start = time.perf_counter()
+        structured_data, _, confidence = extract_locally(message, reference_time)
+        local_seconds += time.perf_counter() - start
+
+        total += 1
+        if structured_data and confidence >= threshold:
+            handled += 1
+
+    mean_local_ms = local_seconds * 1000 / total if total else 0.0
+
+    return {
+        "messages": total,
+        "handled_locally": handled,
+        "handled_fraction": handled / total if total else 0.0,
+        "min_confidence": threshold,
+        "mean_local_ms": round(mean_local_ms, 4),
+        "assumed_claude_latency_ms": claude_latency_ms,
+        "latency_saved_seconds": round(handled * claude_latency_ms / 1000 - local_seconds, 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", default=None, help="raw messages CSV to replay (default: the raw log)")
+    parser.add_argument("--claude-latency-ms", type=float, default=2000,
+                        help="typical Claude round-trip to count as saved per local hit")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.logs and not os.path.exists(args.logs):
+        sys.exit(f"No raw logs found at {args.logs}")
+
+    report = run(args.logs, args.claude_latency_ms)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Messages:          {report['messages']}")
+        print(f"Handled locally:   {report['handled_locally']} ({report['handled_fraction']:.1%})")
+        print(f"Mean local time:   {report['mean_local_ms']} ms")
+        print(f"Latency saved:     {report['latency_saved_seconds']} s "
+              f"(at {args.claude_latency_ms:.0f} ms per Claude call)")
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ingestion and read paths as the data grows, for comparison between commits.
+
+For each corpus size a synthetic logs.csv (that many raw messages) and daily_logs.csv (one
+row per day, `--messages-per-day` messages each) are generated, and the app is driven
+in-process at each concurrency level:
+  - log:           POST /log, answered by the fake Claude server with --latency-ms delay
+  - recent:        GET /recent
+  - view_page:     GET /view?format=json&limit=100
+  - view_download: GET /view (the full CSV export)
+Each endpoint reports the first (cold) request's latency and, per concurrency level,
+throughput, p50/p95/p99 latency, errors and peak RSS while it ran.
+Micro-benchmarks cover merge_field_value, read_daily_logs and the streak summary.
+
+Every size runs in a fresh process and data directory, so caches and peak RSS do not
+carry over between sizes.
+
+Usage: python benchmarks/harness.py [--sizes 1000,10000,100000] [--concurrency 1,8,32]
+           [--requests 200] [--latency-ms 50] [--output report.json] [--compare old.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+MESSAGES = [
+    "had oatmeal with berries for breakfast", "2 coffees", "slept 7 hours",
+    "chicken salad for lunch", "walked 8000 steps", "feeling good this afternoon",
+    "drank 2L of water", "took vitamin d and magnesium", "pasta for dinner",
+]
+
+# Full CSV downloads are much heavier than the other requests, so fewer are made
+DOWNLOAD_REQUESTS = 10
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # No /proc (macOS): the process-wide peak is the best available
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class RssSampler:
+    """Highest RSS seen while the block runs, sampled from a background thread"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+def generate_corpus(size: int, messages_per_day: int) -> Dict:
+    """Write data/logs.csv with `size` messages and data/daily_logs.csv with their days"""
+    os.makedirs("data", exist_ok=True)
+    days = max(1, size // messages_per_day)
+    first_day = date.today() - timedelta(days=days - 1)
+    started = time.perf_counter()
+
+    with open("data/logs.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "message"])
+        for n in range(size):
+            day = first_day + timedelta(days=n // messages_per_day)
+            stamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=7, minutes=n % messages_per_day * 90)
+            writer.writerow([stamp.isoformat(), MESSAGES[n % len(MESSAGES)]])
+
+    with open("data/daily_logs.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "breakfast_description", "lunch_description", "mood_afternoon",
+                         "sleep", "hydration", "activity", "caffeine", "supplements", "last_updated"])
+        for n in range(days):
+            day = (first_day + timedelta(days=n)).isoformat()
+            writer.writerow([day, "oatmeal with berries", "chicken salad", "good", "7 hours",
+                             "2L water", "8000 steps", "190", '["Vitamin D", "Magnesium"]',
+                             f"{day}T21:00:00"])
+
+    return {"raw_rows": size, "daily_rows": days, "generate_seconds": round(time.perf_counter() - started, 3)}
+
+def start_fake_claude() -> str:
+    import uvicorn
+    from stubs.fake_claude import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+async def drive(send: Callable, requests: int, concurrency: int) -> Dict:
+    """Issue `requests` calls with at most `concurrency` in flight"""
+    timings: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for n in counter:
+            start = time.perf_counter()
+            try:
+                response = await send(n)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            timings.append((time.perf_counter() - start) * 1000)
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "peak_rss_mb": round(rss.peak, 1),
+    }
+
+async def run_endpoints(concurrency_levels: List[int], requests: int) -> Dict:
+    import httpx
+    import main as app_module
+
+    endpoints = {
+        "log": lambda client, n: client.post("/log", json={"input": f"{MESSAGES[n % len(MESSAGES)]} #{n}"}),
+        "recent": lambda client, n: client.get("/recent"),
+        "view_page": lambda client, n: client.get("/view", params={"format": "json", "limit": 100}),
+        "view_download": lambda client, n: client.get("/view"),
+    }
+
+    results: Dict = {}
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+        for name, call in endpoints.items():
+            # The first request fills caches; it is reported on its own, not in the percentiles
+            started = time.perf_counter()
+            await call(client, -1)
+            results[name] = {"first_ms": round((time.perf_counter() - started) * 1000, 3)}
+            for concurrency in concurrency_levels:
+                count = min(requests, DOWNLOAD_REQUESTS) if name == "view_download" else requests
+                results[name][str(concurrency)] = await drive(
+                    lambda n, call=call: call(client, n), count, concurrency
+                )
+    return results
+
+def time_calls(fn: Callable, iterations: int) -> Dict:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "mean_us": round(elapsed / iterations * 1e6, 2),
+        "ops_per_second": round(iterations / elapsed, 1) if elapsed else 0.0,
+    }
+
+def run_micro(daily_rows: int) -> Dict:
+    from services.daily_logs_manager import get_daily_logs_store, get_daily_summary, merge_field_value, read_daily_logs
+    from services.daily_stats import rebuild_daily_stats
+
+    # A day's snack field after 20 distinct items, then a new item, a repeat and a refinement
+    existing = ", ".join(f"{MESSAGES[n % len(MESSAGES)]} {n}" for n in range(20))
+    new_values = ["green tea", "pasta for dinner 3", "pasta for dinner 3 with pesto"]
+    counter = iter(range(10 ** 9))
+    micro = {
+        "merge_field_value": time_calls(
+            lambda: merge_field_value(existing, new_values[next(counter) % 3], "snack_description"), 20000
+        ),
+    }
+
+    read_iterations = max(1, min(20, 200000 // daily_rows))
+    micro["read_daily_logs"] = time_calls(read_daily_logs, read_iterations)
+
+    # The streak shown by /recent is maintained on merge; the full recompute is what
+    # every request used to cost
+    micro["streak_summary"] = time_calls(get_daily_summary, 2000)
+    store = get_daily_logs_store()
+    micro["streak_rebuild"] = time_calls(lambda: rebuild_daily_stats(store), max(1, read_iterations // 2))
+    return micro
+
+def run_size(options: Dict) -> Dict:
+    """One corpus size, in its own process and data directory"""
+    os.chdir(tempfile.mkdtemp(prefix="cal-harness-"))
+    corpus = generate_corpus(options["size"], options["messages_per_day"])
+
+    base_url = start_fake_claude()
+    os.environ.update({
+        "ANTHROPIC_API_KEY": "fake",
+        "ANTHROPIC_BASE_URL": base_url,
+        "FAKE_CLAUDE_LATENCY_MS": str(options["latency_ms"]),
+        # Echoed as a snack, so every /log also merges into today's daily log
+        "FAKE_CLAUDE_ECHO_FIELD": "snack_description",
+        # Every /log goes to the (fake) upstream
+        "CLAUDE_CACHE_ENABLED": "0",
+        "FAST_PATH_ENABLED": "0",
+        "CLAUDE_MAX_CONCURRENCY": str(max(options["concurrency"])),
+        "CLAUDE_MAX_WAITING": str(max(options["concurrency"]) * 4),
+    })
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # First use imports daily_logs.csv into the store and splits logs.csv into
+        # monthly segments, as on an upgrade
+        started = time.perf_counter()
+        from services.daily_logs_manager import get_daily_logs_store
+        get_daily_logs_store()
+        corpus["import_seconds"] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+        from services.raw_logger import get_raw_log
+        get_raw_log()
+        corpus["raw_import_seconds"] = round(time.perf_counter() - started, 3)
+
+        endpoints = asyncio.run(run_endpoints(options["concurrency"], options["requests"]))
+        micro = run_micro(corpus["daily_rows"])
+
+    return {
+        "size": options["size"],
+        "corpus": corpus,
+        "endpoints": endpoints,
+        "micro": micro,
+        "process_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(old: Dict, new: Dict):
+    """Print the change in p50, p99 and throughput for every endpoint both reports have"""
+    old_sizes = {result["size"]: result for result in old["results"]}
+    print(f"\nCompared with {old.get('commit', '?')}:")
+    for result in new["results"]:
+        before = old_sizes.get(result["size"])
+        if before is None:
+            continue
+        for name, levels in result["endpoints"].items():
+            for concurrency, stats in levels.items():
+                previous = before["endpoints"].get(name, {}).get(concurrency)
+                if not isinstance(stats, dict) or not previous:
+                    continue
+                changes = []
+                for key in ("p50_ms", "p99_ms", "throughput_rps"):
+                    if previous[key]:
+                        changes.append(f"{key} {(stats[key] / previous[key] - 1) * 100:+.0f}%")
+                print(f"  size {result['size']:>8} {name:>13} c={concurrency:<3} " + ", ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion and read path benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="raw messages per corpus, comma-separated (up to 1000000)")
+    parser.add_argument("--concurrency", default="1,8,32", help="concurrency levels, comma-separated")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and level")
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake Claude response delay")
+    parser.add_argument("--messages-per-day", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--compare", default=None, help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    concurrency = [int(level) for level in args.concurrency.split(",")]
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": concurrency,
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "messages_per_day": args.messages_per_day,
+        },
+        "results": [],
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        print(f"Size {size}...", file=sys.stderr)
+        with context.Pool(1) as pool:
+            report["results"].append(pool.apply(run_size, ({
+                "size": size,
+                "concurrency": concurrency,
+                "requests": args.requests,
+                "latency_ms": args.latency_ms,
+                "messages_per_day": args.messages_per_day,
+            },)))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
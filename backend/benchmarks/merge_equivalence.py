@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Property checks and timings for the append-field merge engine, against the previous
+string-scanning merge_field_value (kept below verbatim as the reference).
+
+On randomly sampled merge sequences it checks that:
+  - the new result holds the same information: every item of either result is covered
+    (all its tokens present) by an item of the other,
+  - merging a value again changes nothing (idempotence),
+  - no item is covered by another item (no leftover less-detailed duplicates),
+  - the text form round-trips through the stored item list,
+and reports how often the two results are identical text. Differences are expected where
+the old substring checks depended on merge order or matched inside words.
+
+Usage: python benchmarks/merge_equivalence.py [--cases 5000] [--seed 1] [--busy-day 300]
+Exits 1 if any property fails.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.daily_logs_manager import merge_entry, merge_field_value
+from services.merge_engine import ItemList, item_tokens, split_items
+
+def legacy_merge_field_value(existing_value: str, new_value: str, field: str) -> str:
+    """merge_field_value for append fields before the merge engine"""
+    if not existing_value or not existing_value.strip():
+        return new_value
+    if not new_value or not new_value.strip():
+        return existing_value
+
+    existing_clean = existing_value.strip()
+    new_clean = new_value.strip()
+    existing_lower = existing_clean.lower()
+    new_lower = new_clean.lower()
+
+    if new_lower in existing_lower:
+        return existing_clean
+    if existing_lower in new_lower:
+        return new_clean
+
+    existing_items = [item.strip().lower() for item in existing_clean.split(',')]
+    for existing_item in existing_items:
+        if (len(new_lower) > 3 and new_lower in existing_item) or \
+           (len(existing_item) > 3 and existing_item in new_lower):
+            if len(new_clean) > len(existing_item):
+                existing_items_original = [item.strip() for item in existing_clean.split(',')]
+                for i, orig_item in enumerate(existing_items_original):
+                    if orig_item.lower() == existing_item:
+                        existing_items_original[i] = new_clean
+                        return ', '.join(existing_items_original)
+            return existing_clean
+
+    return f"{existing_clean}, {new_clean}"
+
+FOODS = ["coffee", "green tea", "apple", "banana", "almonds", "oatmeal", "toast", "eggs",
+         "chicken salad", "rice", "yogurt", "protein bar", "water", "orange juice", "pasta"]
+DETAILS = ["with milk", "with honey", "and berries", "2 cups", "large", "grilled", "500ml"]
+
+def sample_value(rng: random.Random, logged: list) -> str:
+    """A value like Claude returns: a repeat, a more or less detailed variant, or something new"""
+    roll = rng.random()
+    if logged and roll < 0.25:
+        value = rng.choice(logged)                                # repeat
+    elif logged and roll < 0.5:
+        value = f"{rng.choice(logged)} {rng.choice(DETAILS)}"     # more detailed
+    elif logged and roll < 0.6:
+        value = rng.choice(logged).split(" ")[0]                  # less detailed
+    elif roll < 0.7:
+        value = ", ".join(rng.sample(FOODS, 2))                   # several items at once
+    else:
+        value = rng.choice(FOODS)
+    if rng.random() < 0.2:
+        value = value.title()
+    logged.append(value)
+    return value
+
+def covered(item: str, items: list) -> bool:
+    tokens = item_tokens(item)
+    return any(tokens <= item_tokens(other) for other in items)
+
+def check_case(rng: random.Random, merges: int) -> tuple:
+    field = "snack_description"
+    legacy, current, logged = "", "", []
+    for _ in range(merges):
+        value = sample_value(rng, logged)
+        legacy = legacy_merge_field_value(legacy, value, field)
+        current = merge_field_value(current, value, field)
+
+    problems = []
+    legacy_items, current_items = split_items(legacy), split_items(current)
+    if not all(covered(item, current_items) for item in legacy_items):
+        problems.append("lost information present in the legacy result")
+    if not all(covered(item, legacy_items) for item in current_items):
+        problems.append("has information absent from the legacy result")
+    again = merge_field_value(current, logged[-1], field) if logged else current
+    if again != current:
+        problems.append("not idempotent")
+    for i, item in enumerate(current_items):
+        if covered(item, current_items[:i] + current_items[i + 1:]):
+            problems.append(f"keeps less detailed duplicate {item!r}")
+            break
+    if str(ItemList.from_value(ItemList.from_value(current).items)) != current:
+        problems.append("text does not round-trip")
+
+    return legacy == current, problems, (logged, legacy, current)
+
+def time_busy_day(merges: int) -> dict:
+    """One field merged `merges` times with mostly distinct items, as on a busy day"""
+    values = [f"{FOODS[n % len(FOODS)]} {n}" for n in range(merges)]
+    timings = {}
+    for name, merge in (("legacy", legacy_merge_field_value), ("current", merge_field_value)):
+        value = ""
+        start = time.perf_counter()
+        for new_value in values:
+            value = merge(value, new_value, "notes")
+        timings[name] = (time.perf_counter() - start) * 1000
+
+    # Daily log rows store the field as an item list, so merges skip the text round-trip
+    entry = {"date": "2024-01-01"}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for new_value in values:
+            entry = merge_entry(entry, {"notes": new_value})
+    timings["merge_entry"] = (time.perf_counter() - start) * 1000
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge engine properties against the legacy merge")
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--merges", type=int, default=12, help="merges per sampled day")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--busy-day", type=int, default=300, help="merges in the timing run")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    identical = 0
+    failures = []
+    for _ in range(args.cases):
+        same, problems, example = check_case(rng, rng.randint(1, args.merges))
+        identical += same
+        if problems:
+            failures.append((problems, example))
+
+    print(f"Cases: {args.cases}, identical to legacy: {identical / args.cases:.1%}, "
+          f"property failures: {len(failures)}")
+    for problems, (values, legacy, current) in failures[:5]:
+        print(f"  {problems}\n    values:  {values}\n    legacy:  {legacy}\n    current: {current}")
+
+    timings = time_busy_day(args.busy_day)
+    print(f"Busy day ({args.busy_day} merges): " +
+          ", ".join(f"{name} {ms:.1f} ms" for name, ms in timings.items()))
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Check that a migration run (services/migrations.py) leaves the derived state matching
+the migrated rows: the field fill counts from daily_stats and the search index.
+
+Each case stores random rows in the pre-migration shapes (a single mood column,
+multi-select values as text or "[]", append fields as comma-joined text) at schema
+version 0, builds the fill counts and search index from them as the server would,
+runs the migrations, and then compares the fill counts with a count over the stored
+rows and searches every filled field of every day for its own text.
+
+Usage: python benchmarks/migration_equivalence.py [--cases 100] [--seed 1] [--days 60]
+Runs in a temporary data directory; exits 1 if any case differs.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ["happy", "tired", "calm", "oatmeal", "eggs", "toast", "walk", "yoga", "tea", "rice"]
+
+def legacy_row(rng: random.Random, day: str) -> dict:
+    """A row as stored before the migrations, with some of each legacy shape"""
+    row = {"date": day}
+    if rng.random() < 0.7:
+        row["mood"] = rng.choice(WORDS[:3])
+    if rng.random() < 0.3:
+        row["mood_afternoon"] = rng.choice(WORDS[:3])
+    if rng.random() < 0.6:
+        row["supplements"] = rng.choice(["[]", "", "fish oil, vitamin d", json.dumps(["magnesium"])])
+    for field in ("breakfast_description", "activity", "notes"):
+        if rng.random() < 0.6:
+            row[field] = ", ".join(rng.sample(WORDS[3:], rng.randint(0, 3)))
+    if rng.random() < 0.5:
+        row["sleep"] = "7 hours"
+    return row
+
+def expected_fill_counts(rows) -> dict:
+    return dict(Counter(field for row in rows for field, value in row.items()
+                        if field not in ("date", "last_updated") and value))
+
+def check_case(rng: random.Random, case: int, days: int) -> list:
+    from services import daily_logs_manager as manager
+    from services.daily_stats import rebuild_daily_stats
+    from services.data_paths import as_user
+    from services.migrations import LATEST_VERSION, run_migrations, schema_version
+    from services.search_index import daily_documents, get_search_index, reindex_daily_logs
+
+    problems = []
+    with as_user(f"case{case}"):
+        store = manager.get_daily_logs_store()
+        first = date.today() - timedelta(days=days)
+        store.replace_all({
+            day: legacy_row(rng, day)
+            for day in sorted({(first + timedelta(days=rng.randint(0, days))).isoformat()
+                               for _ in range(rng.randint(1, days))})
+        })
+        with store.transaction() as conn:
+            conn.execute("PRAGMA user_version = 0")
+        # Derived from the legacy rows, as a server running before the migration had it
+        rebuild_daily_stats(store)
+        reindex_daily_logs(store.iter_rows())
+
+        run_migrations(store, backup=False)
+        if schema_version(store) != LATEST_VERSION:
+            problems.append(("version", schema_version(store), LATEST_VERSION))
+
+        rows = list(store.iter_rows())
+        fills = manager.get_daily_summary()["field_fill_counts"]
+        if fills != expected_fill_counts(rows):
+            problems.append(("fill counts", fills, expected_fill_counts(rows)))
+
+        index = get_search_index()
+        for row in rows:
+            for field, text in daily_documents(row).items():
+                word = re.findall(r"\w+", text)[0]
+                found = index.search(f"{field}:{word}", date_from=row["date"], date_to=row["date"],
+                                     kind="daily")["total"]
+                if found != 1:
+                    problems.append((f"search {row['date']} {field}:{word}", found, 1))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Derived state after a migration run against the migrated rows")
+    parser.add_argument("--cases", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--days", type=int, default=60, help="date range of each case's rows")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-bench-"))
+    os.environ["READ_CACHE_ENABLED"] = "0"
+
+    rng = random.Random(args.seed)
+    failures = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for case in range(args.cases):
+            failures.extend(check_case(rng, case, args.days))
+
+    print(f"Cases: {args.cases}, differences from the migrated rows: {len(failures)}")
+    for check, got, expected in failures[:5]:
+        print(f"  {check}\n    got:      {got}\n    expected: {expected}")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
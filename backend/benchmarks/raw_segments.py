@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Compare the segmented raw log with the single logs.csv it replaces, over a synthetic
+history: size on disk, reading a date range (the last 30 days and one month five years
+back), a page deep into the log, the last 10 messages, the full download, and appends.
+
+Usage: python benchmarks/raw_segments.py [--years 10] [--messages-per-day 20] [--repeat 10]
+Runs in a temporary data directory.
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MESSAGES = [
+    "had oatmeal with berries for breakfast", "2 coffees this morning", "slept 7 hours",
+    "chicken salad for lunch", "walked 8000 steps", "feeling good this afternoon",
+    "drank 2L of water", "took vitamin d and magnesium", "pasta for dinner",
+]
+
+def generate(path: str, years: float, messages_per_day: int) -> int:
+    first = date.today() - timedelta(days=int(years * 365.25) - 1)
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "message"])
+        for n in range(int(years * 365.25)):
+            day = datetime.combine(first + timedelta(days=n), datetime.min.time())
+            for m in range(messages_per_day):
+                writer.writerow([(day + timedelta(minutes=7 * 60 + m * 45)).isoformat(),
+                                 MESSAGES[(n + m) % len(MESSAGES)]])
+                rows += 1
+    return rows
+
+def timed_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def file_rows(path: str, date_from=None, date_to=None, start=0, limit=None):
+    """The single-file reads: a scan from the first row"""
+    from services.raw_segments import _in_range
+
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row_number, row in enumerate(csv.DictReader(f)):
+            if row_number < start or not _in_range(row["timestamp"], date_from, date_to):
+                continue
+            rows.append(row)
+            if limit is not None and len(rows) == limit:
+                break
+    return rows
+
+def segment_rows(date_from=None, date_to=None, start=0, limit=None):
+    from services.raw_logger import iter_raw_messages
+
+    rows = []
+    for _, row in iter_raw_messages(date_from, date_to, start=start):
+        rows.append(row)
+        if limit is not None and len(rows) == limit:
+            break
+    return rows
+
+def read_file(path: str):
+    with open(path, "rb") as f:
+        while f.read(64 * 1024):
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented raw log against a single logs.csv")
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--messages-per-day", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-bench-"))
+    os.environ["SEARCH_INDEX_ENABLED"] = "0"
+    os.makedirs("data")
+    rows = generate("data/logs.csv", args.years, args.messages_per_day)
+    single = "single.csv"
+    shutil.copy("data/logs.csv", single)
+
+    from services.raw_logger import get_raw_log, get_raw_logs_dir, save_raw_message
+    from services.raw_tail import read_last_messages
+
+    start = time.perf_counter()
+    raw_log = get_raw_log()  # splits data/logs.csv into segments
+    import_s = time.perf_counter() - start
+    segments = raw_log.segments()
+    segments_mb = sum(os.path.getsize(os.path.join(get_raw_logs_dir(), s.file)) for s in segments) / 1e6
+
+    recent = (date.today() - timedelta(days=30)).isoformat()
+    old_month = (date.today() - timedelta(days=5 * 365)).isoformat()[:7]
+    cases = [
+        ("last 30 days", {"date_from": recent}),
+        (f"month {old_month}", {"date_from": old_month, "date_to": old_month}),
+        ("page of 100 at the end", {"start": rows - 100, "limit": 100}),
+    ]
+
+    print(f"Raw messages: {rows} over {args.years:g} years, {len(segments)} segments "
+          f"imported in {import_s:.2f}s")
+    print(f"On disk: single file {os.path.getsize(single) / 1e6:.1f} MB, segments {segments_mb:.1f} MB")
+    print(f"{'':>28} {'single file':>12} {'segments':>10}")
+    for label, kwargs in cases:
+        assert file_rows(single, **kwargs) == segment_rows(**kwargs)
+        print(f"{label:>28} {timed_ms(lambda: file_rows(single, **kwargs), args.repeat):9.2f} ms "
+              f"{timed_ms(lambda: segment_rows(**kwargs), args.repeat):7.2f} ms")
+
+    assert read_last_messages(single, 10) == raw_log.read_last(10)
+    print(f"{'last 10 messages':>28} {timed_ms(lambda: read_last_messages(single, 10), args.repeat):9.2f} ms "
+          f"{timed_ms(lambda: raw_log.read_last(10), args.repeat):7.2f} ms")
+
+    with open(single, "rb") as f:
+        assert b"".join(raw_log.iter_csv()) == f.read()
+    print(f"{'download':>28} {timed_ms(lambda: read_file(single), args.repeat):9.2f} ms "
+          f"{timed_ms(lambda: sum(map(len, raw_log.iter_csv())), args.repeat):7.2f} ms")
+
+    append_ms = timed_ms(lambda: save_raw_message("had a coffee"), 200)
+    print(f"Append (save_raw_message): {append_ms:.3f} ms")
+
+if __name__ == "__main__":
+    main()
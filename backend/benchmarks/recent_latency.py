@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare /recent latency with the read cache disabled and enabled, over a synthetic
+history of daily logs and raw messages.
+
+Usage: python benchmarks/recent_latency.py [--years 5] [--messages-per-day 5] [--requests 200]
+Runs in a temporary data directory.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def generate(years: int, messages_per_day: int):
+    from services.daily_logs_manager import save_daily_logs
+    from services.raw_logger import get_raw_logs_path
+
+    end = date.today()
+    days = [end - timedelta(days=n) for n in range(int(years * 365.25))]
+
+    daily_logs = {}
+    for day in days:
+        key = day.isoformat()
+        daily_logs[key] = {
+            "date": key,
+            "breakfast_description": "oatmeal with berries",
+            "lunch_description": "chicken salad",
+            "snack_description": "apple, almonds",
+            "mood_afternoon": "good",
+            "sleep": "7 hours",
+            "hydration": "2L water",
+            "caffeine": "190",
+            "last_updated": datetime.now().isoformat(),
+        }
+    save_daily_logs(daily_logs)
+
+    raw_path = get_raw_logs_path()
+    os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+    with open(raw_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["timestamp", "message"])
+        writer.writeheader()
+        for day in reversed(days):
+            for n in range(messages_per_day):
+                stamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=8 + n)
+                writer.writerow({"timestamp": stamp.isoformat(), "message": f"had a coffee and felt fine #{n}"})
+
+    return len(days), len(days) * messages_per_day
+
+def measure(client, requests: int) -> dict:
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get("/recent")
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    timings.sort()
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="/recent latency with and without the read cache")
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--messages-per-day", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-bench-"))
+    daily_rows, raw_rows = generate(args.years, args.messages_per_day)
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+
+    client = TestClient(app_module.app)
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for label, enabled in (("uncached", "0"), ("cached", "1")):
+            os.environ["READ_CACHE_ENABLED"] = enabled
+            client.get("/recent")  # warm up (and fill the cache when enabled)
+            results[label] = measure(client, args.requests)
+
+    print(f"Daily rows: {daily_rows}, raw messages: {raw_rows}, requests: {args.requests}")
+    for label, stats in results.items():
+        print(f"{label:>9}: mean {stats['mean_ms']} ms, p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms")
+
+if __name__ == "__main__":
+    main()
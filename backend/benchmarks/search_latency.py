@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Measure /search over a synthetic decade of daily logs and raw messages: the full index
+build, query latency for common, rare, scoped, phrase and prefix queries, and the cost
+of the incremental updates made on every /log.
+
+Usage: python benchmarks/search_latency.py [--years 10] [--messages-per-day 5] [--queries 200]
+Runs in a temporary data directory.
+"""
+
+import argparse
+import csv
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MESSAGES = [
+    "had oatmeal with berries for breakfast", "2 coffees this morning", "slept 7 hours",
+    "chicken salad for lunch", "walked 8000 steps", "feeling good this afternoon",
+    "drank 2L of water", "took vitamin d and magnesium", "pasta for dinner",
+    "bad headache after lunch", "felt anxious in the evening", "ran 5k before work",
+]
+NOTES = ["headache in the afternoon", "tired all day", "great focus", "stomach ache after dinner", ""]
+
+QUERIES = [
+    "coffee",                      # common: in a sixth of the messages
+    "headaches",                   # stemmed to headache
+    "supplements:magnesium",       # field scope
+    "notes:headache",
+    "mood:anxious",                # prompt group scope
+    '"vitamin d"',                 # phrase
+    "magn*",                       # prefix
+    "headache afternoon",          # two terms in the same day or message
+    "zinc",                        # rare
+]
+
+def generate(years: int, messages_per_day: int, rng: random.Random):
+    from services.daily_logs_manager import save_daily_logs
+    from services.raw_logger import get_raw_logs_path
+
+    end = date.today()
+    days = [end - timedelta(days=n) for n in range(int(years * 365.25))]
+
+    daily_logs = {}
+    for day in days:
+        key = day.isoformat()
+        daily_logs[key] = {
+            "date": key,
+            "breakfast_description": "oatmeal with berries",
+            "lunch_description": rng.choice(["chicken salad", "pasta", "sushi", "soup and bread"]),
+            "mood_night": rng.choice(["good", "anxious", "calm", "tired"]),
+            "sleep": f"{rng.randint(5, 9)} hours",
+            "caffeine": "190",
+            "supplements": rng.choice(['["Magnesium"]', '["Vitamin D", "Magnesium"]', '["Zinc"]', ""]),
+            "notes": rng.choice(NOTES),
+            "last_updated": datetime.now().isoformat(),
+        }
+    save_daily_logs(daily_logs)
+
+    raw_path = get_raw_logs_path()
+    os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+    with open(raw_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["timestamp", "message"])
+        writer.writeheader()
+        for day in reversed(days):
+            for n in range(messages_per_day):
+                stamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=8 + n)
+                writer.writerow({"timestamp": stamp.isoformat(), "message": rng.choice(MESSAGES)})
+
+    return len(days), len(days) * messages_per_day
+
+def timed_ms(fn, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Search index build, query and update latency")
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--messages-per-day", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200, help="repetitions of each query")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-bench-"))
+    os.environ["SEARCH_INDEX_ENABLED"] = "0"  # build once below, not while generating
+    rng = random.Random(0)
+    daily_rows, raw_rows = generate(args.years, args.messages_per_day, rng)
+
+    from services.search_index import get_search_index, rebuild_search_index
+
+    counts = rebuild_search_index()
+    index = get_search_index()
+    print(f"Daily rows: {daily_rows}, raw messages: {raw_rows}, documents: {counts['documents']}, "
+          f"index built in {counts['seconds']:.2f}s ({os.path.getsize(index.path) / 1e6:.1f} MB)")
+
+    last_year = (date.today() - timedelta(days=365)).isoformat()
+    for query in QUERIES:
+        for label, kwargs in (("", {}), (" (last year)", {"date_from": last_year})):
+            total = index.search(query, **kwargs)["total"]
+            timings = timed_ms(lambda: index.search(query, **kwargs), args.queries)
+            print(f"{query + label:>36}: {total:>6} matches, p50 {statistics.median(timings):.2f} ms, "
+                  f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+
+    now = datetime.now()
+    raw = timed_ms(lambda: index.add_raw_message(now.isoformat(), "took magnesium before bed"), 200)
+    row = {"date": date.today().isoformat(), "notes": ["headache"], "supplements": '["Magnesium"]'}
+    daily = timed_ms(lambda: index.update_daily_log(row), 200)
+    print(f"Incremental update: raw message p50 {statistics.median(raw):.2f} ms, "
+          f"daily log p50 {statistics.median(daily):.2f} ms")
+
+if __name__ == "__main__":
+    main()
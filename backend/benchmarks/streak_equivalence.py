@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Check the incrementally maintained streaks and rollups (services/daily_stats.py)
+against recomputing them from the stored rows, with the previous sort-and-walk
+calculate_streak from /recent kept below verbatim as the reference.
+
+Each case merges a random set of dates (runs, gaps, today, dates after today) in
+random order through merge_daily_entry, then compares the summary and the week and
+month rollups with the reference, before and after rebuild_daily_stats. It also
+times the /recent streak both ways over a multi-year history.
+
+Usage: python benchmarks/streak_equivalence.py [--cases 300] [--seed 1] [--years 5]
+Runs in a temporary data directory; exits 1 if any case differs.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIELDS = ["breakfast_description", "snack_description", "sleep", "mood_morning", "caffeine", "notes"]
+
+def legacy_calculate_streak(logs):
+    """calculate_streak from /recent before the derived state"""
+    if not logs:
+        return 0
+
+    # Sort logs by date in descending order
+    sorted_logs = sorted(logs, key=lambda x: x.get("date", ""), reverse=True)
+
+    streak = 0
+    current_date = datetime.now().date()
+
+    for log in sorted_logs:
+        log_date_str = log.get("date")
+        if not log_date_str:
+            continue
+
+        try:
+            log_date = datetime.strptime(log_date_str, "%Y-%m-%d").date()
+
+            # If this is today or the expected previous day, count it
+            if log_date == current_date or (streak > 0 and log_date == current_date - timedelta(days=1)):
+                streak += 1
+                current_date = log_date
+            else:
+                # Streak is broken
+                break
+        except ValueError:
+            continue
+
+    return streak
+
+def reference_summary(rows) -> dict:
+    """Everything daily_stats maintains, recomputed from the rows"""
+    days = sorted(datetime.strptime(row["date"], "%Y-%m-%d").date() for row in rows)
+    longest = run = 0
+    for previous, day in zip([None] + days, days):
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+
+    today = datetime.now().date()
+    year, week, _ = today.isocalendar()
+    weeks = Counter("%d-W%02d" % day.isocalendar()[:2] for day in days)
+    months = Counter(day.strftime("%Y-%m") for day in days)
+    fills = Counter(field for row in rows for field, value in row.items()
+                    if field not in ("date", "last_updated") and value)
+    return {
+        "summary": {
+            "current_streak": legacy_calculate_streak(rows),
+            "longest_streak": longest,
+            "days_logged": len(days),
+            "days_logged_this_week": weeks.get(f"{year}-W{week:02d}", 0),
+            "days_logged_this_month": months.get(today.strftime("%Y-%m"), 0),
+            "field_fill_counts": dict(fills),
+        },
+        "rollups": {"days_per_week": dict(weeks), "days_per_month": dict(months)},
+    }
+
+def sample_dates(rng: random.Random) -> list:
+    """Runs of consecutive days with gaps, often ending today, sometimes past it"""
+    today = date.today()
+    day = today - timedelta(days=rng.randint(0, 60))
+    dates = set()
+    while day <= today + timedelta(days=rng.choice([0, 0, 0, 3])):
+        for _ in range(rng.randint(1, 6)):
+            dates.add(day)
+            day += timedelta(days=1)
+        day += timedelta(days=rng.randint(1, 4))
+    if rng.random() < 0.5:
+        dates.add(today)
+    return [d.isoformat() for d in dates]
+
+def actual(manager) -> dict:
+    return {"summary": manager.get_daily_summary(), "rollups": manager.get_daily_rollups()}
+
+def check_case(rng: random.Random, case: int) -> list:
+    from services import daily_logs_manager as manager
+    from services.daily_stats import rebuild_daily_stats
+    from services.data_paths import as_user
+
+    problems = []
+    with as_user(f"case{case}"):
+        merges = [(day, rng.choice(FIELDS)) for day in sample_dates(rng)
+                  for _ in range(rng.randint(1, 3))]
+        rng.shuffle(merges)
+        for day, field in merges:
+            value = "7 hours" if field == "sleep" else "190" if field == "caffeine" else f"item {rng.randint(1, 9)}"
+            manager.merge_daily_entry({"date": day, field: value})
+
+        expected = reference_summary(list(manager.get_daily_logs_store().iter_rows()))
+        if actual(manager) != expected:
+            problems.append(("incremental", actual(manager), expected))
+        rebuild_daily_stats(manager.get_daily_logs_store())
+        if actual(manager) != expected:
+            problems.append(("rebuilt", actual(manager), expected))
+    return problems
+
+def timed_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def time_streak(years: float) -> tuple:
+    from services import daily_logs_manager as manager
+    from services.data_paths import as_user
+
+    with as_user("history"):
+        first = date.today() - timedelta(days=int(years * 365.25) - 1)
+        manager.save_daily_logs({
+            day: {"date": day, "breakfast_description": "oatmeal"}
+            for day in ((first + timedelta(days=n)).isoformat() for n in range(int(years * 365.25)))
+        })
+        assert manager.get_daily_summary()["current_streak"] == legacy_calculate_streak(
+            list(manager.read_daily_logs().values()))
+        legacy_ms = timed_ms(lambda: legacy_calculate_streak(list(manager.read_daily_logs().values())), 10)
+        summary_ms = timed_ms(manager.get_daily_summary, 100)
+    return legacy_ms, summary_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental streaks and rollups against recomputation")
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--years", type=float, default=5, help="history length in the timing run")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-bench-"))
+    os.environ["SEARCH_INDEX_ENABLED"] = "0"
+    os.environ["READ_CACHE_ENABLED"] = "0"
+
+    rng = random.Random(args.seed)
+    failures = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for case in range(args.cases):
+            failures.extend(check_case(rng, case))
+
+    print(f"Cases: {args.cases}, differences from the reference: {len(failures)}")
+    for stage, got, expected in failures[:5]:
+        print(f"  {stage}\n    got:      {got}\n    expected: {expected}")
+
+    legacy_ms, summary_ms = time_streak(args.years)
+    print(f"Streak over {args.years:g} years: read and sort-and-walk {legacy_ms:.2f} ms, "
+          f"precomputed summary {summary_ms:.3f} ms")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
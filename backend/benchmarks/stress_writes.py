@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Stress the write path: many threads in several processes merge into the same few
+dates and append raw messages at once, while one thread per process keeps rewriting
+the whole daily logs store under the file lock as bulk saves do, then check that no
+merge or row was lost.
+
+Usage: python benchmarks/stress_writes.py [--processes 4] [--threads 8] [--merges 25] [--dates 3]
+                                          [--rewrites 20]
+Runs in a temporary data directory; exits non-zero if anything was dropped.
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATES = ["2025-01-%02d" % day for day in range(1, 29)]
+
+def _item(process_id: int, thread_id: int, n: int) -> str:
+    # Fixed width so no item is a substring of another and merge dedupe keeps them all
+    return f"p{process_id:02d}t{thread_id:02d}n{n:04d}"
+
+def _worker(args):
+    process_id, threads, merges, dates, rewrites, workdir = args
+    os.chdir(workdir)
+
+    from services.daily_logs_manager import get_daily_logs_store, merge_daily_entry
+    from services.raw_logger import save_raw_message
+    from services.write_coordinator import file_lock
+
+    def run_thread(thread_id: int):
+        for n in range(merges):
+            item = _item(process_id, thread_id, n)
+            date = DATES[(thread_id + n) % dates]
+            save_raw_message(f"snack {item}")
+            merge_daily_entry({"date": date, "snack_description": item})
+
+    def rewrite_all():
+        # Read everything and write it back under the file lock: a merge slipping in
+        # between the read and the replace would be lost
+        store = get_daily_logs_store()
+        for _ in range(rewrites):
+            with file_lock(store.path):
+                rows = store.all()
+                time.sleep(0.001)
+                store.replace_all(rows)
+            time.sleep(0.005)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=threads + 1) as pool:
+            rewriter = pool.submit(rewrite_all)
+            list(pool.map(run_thread, range(threads)))
+            rewriter.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent writer stress test")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--merges", type=int, default=25, help="merges per thread")
+    parser.add_argument("--dates", type=int, default=3, help="distinct dates written to")
+    parser.add_argument("--rewrites", type=int, default=20, help="whole-store rewrites per process")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cal-stress-")
+    jobs = [(p, args.threads, args.merges, args.dates, args.rewrites, workdir) for p in range(args.processes)]
+
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        pool.map(_worker, jobs)
+
+    os.chdir(workdir)
+    from services.daily_logs_manager import read_daily_logs
+    from services.raw_logger import iter_raw_messages
+
+    expected = {
+        _item(p, t, n)
+        for p in range(args.processes) for t in range(args.threads) for n in range(args.merges)
+    }
+
+    merged = set()
+    for row in read_daily_logs().values():
+        merged.update(item.strip() for item in row["snack_description"].split(",") if item.strip())
+
+    raw = {row["message"].split(" ", 1)[1] for _, row in iter_raw_messages()}
+
+    lost_merges = expected - merged
+    lost_rows = expected - raw
+
+    print(f"Writes attempted: {len(expected)} merges, {len(expected)} raw rows, "
+          f"{args.processes * args.rewrites} whole-store rewrites")
+    print(f"Lost merges:      {len(lost_merges)}")
+    print(f"Lost raw rows:    {len(lost_rows)}")
+    print(f"Data directory:   {workdir}")
+
+    if lost_merges or lost_rows:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Compare a full scan of the raw log with the tail reader for fetching the last N messages.
+
+Usage: python benchmarks/tail_read.py [--rows 1000000] [--limit 10] [--logs existing.csv]
+Without --logs a synthetic file (with some quoted multi-line messages) is generated.
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.raw_tail import is_valid_message, read_last_messages
+
+def generate(path: str, rows: int):
+    start = datetime(2015, 1, 1, 8)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["timestamp", "message"])
+        writer.writeheader()
+        for n in range(rows):
+            message = f"had a coffee, slept {n % 9} hours"
+            if n % 50 == 0:
+                message = f'note:\n"long" day,\nstill fine #{n}'
+            writer.writerow({"timestamp": (start + timedelta(minutes=5 * n)).isoformat(), "message": message})
+
+def full_scan(path: str, limit: int):
+    all_messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if is_valid_message(row):
+                all_messages.append(row)
+    return all_messages[-limit:]
+
+def timed(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed * 1000, peak / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description="Full scan vs. tail read of the raw log")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--logs", help="use an existing raw log instead of generating one")
+    args = parser.parse_args()
+
+    path = args.logs
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(prefix="cal-bench-"), "logs.csv")
+        generate(path, args.rows)
+
+    scanned, scan_ms, scan_mb = timed(full_scan, path, args.limit)
+    tailed, tail_ms, tail_mb = timed(read_last_messages, path, args.limit)
+    assert scanned == tailed, "tail reader disagrees with full scan"
+
+    print(f"File: {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB), last {args.limit} messages")
+    print(f"Full scan: {scan_ms:10.2f} ms, peak {scan_mb:8.2f} MB")
+    print(f"Tail read: {tail_ms:10.2f} ms, peak {tail_mb:8.2f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Measure /trends over synthetic multi-year daily logs: parsing the numeric columns once,
+computing trends from them (full history and the last 90 days), the per-merge column
+update, and the same rolling averages, monthly means and correlation done with
+per-row Python loops over the stored rows, for comparison.
+
+Usage: python benchmarks/trends_latency.py [--years 10] [--repeat 20]
+Runs in a temporary data directory.
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def generate(years: float, rng: random.Random) -> int:
+    from services.daily_logs_manager import save_daily_logs
+
+    first = date.today() - timedelta(days=int(years * 365.25) - 1)
+    daily_logs = {}
+    caffeine = 0
+    for n in range(int(years * 365.25)):
+        # The night's sleep (logged the next day) is shorter after more caffeine
+        sleep = 8.5 - caffeine / 190 + rng.uniform(-1, 1)
+        caffeine = rng.choice([0, 95, 190, 285])
+        if rng.random() < 0.1:
+            continue  # days without a log
+        key = (first + timedelta(days=n)).isoformat()
+        daily_logs[key] = {
+            "date": key,
+            "caffeine": str(caffeine),
+            "sleep": f"{sleep:.1f} hours",
+            "hydration": [f"{rng.choice([1, 1.5, 2])}L water", f"{rng.choice([250, 500])}ml tea"],
+            "alcohol": rng.choice(["True", "False", "False"]),
+            "last_updated": datetime.now().isoformat(),
+        }
+    save_daily_logs(daily_logs)
+    return len(daily_logs)
+
+def timed_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def per_row_trends(rows, window: int):
+    """Rolling means, monthly means and the caffeine/next-day sleep correlation, row by row"""
+    from services.analytics import numeric_fields
+
+    fields = numeric_fields()
+    by_date = {}
+    for row in rows:
+        by_date[row["date"]] = {field: parse(row.get(field)) if row.get(field) not in (None, "", []) else None
+                                for field, (parse, _) in fields.items()}
+    first = date.fromisoformat(min(by_date))
+    days = [(first + timedelta(days=n)).isoformat()
+            for n in range((date.fromisoformat(max(by_date)) - first).days + 1)]
+
+    rolling = {}
+    monthly = {}
+    for field in fields:
+        values = [by_date.get(day, {}).get(field) for day in days]
+        rolling[field] = []
+        for i in range(len(values)):
+            recent = [value for value in values[max(0, i - window + 1):i + 1] if value is not None]
+            rolling[field].append(sum(recent) / len(recent) if recent else None)
+        months = {}
+        for day, value in zip(days, values):
+            if value is not None:
+                months.setdefault(day[:7], []).append(value)
+        monthly[field] = {month: sum(v) / len(v) for month, v in months.items()}
+
+    pairs = [(by_date.get(day, {}).get("caffeine"), by_date.get(next_day, {}).get("sleep"))
+             for day, next_day in zip(days, days[1:])]
+    pairs = [(x, y) for x, y in pairs if x is not None and y is not None]
+    mean_x = sum(x for x, _ in pairs) / len(pairs)
+    mean_y = sum(y for _, y in pairs) / len(pairs)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in pairs)
+    r = covariance / math.sqrt(sum((x - mean_x) ** 2 for x, _ in pairs) * sum((y - mean_y) ** 2 for _, y in pairs))
+    return rolling, monthly, r
+
+def main():
+    parser = argparse.ArgumentParser(description="Trends computation, vectorized and per row")
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-bench-"))
+    os.environ["SEARCH_INDEX_ENABLED"] = "0"
+    days = generate(args.years, random.Random(0))
+
+    from services.analytics import DailySeries
+    from services.daily_logs_manager import get_daily_logs_store, get_daily_trends
+
+    store = get_daily_logs_store()
+    series = DailySeries(store.path)
+    start = time.perf_counter()
+    series.snapshot(store.iter_rows)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    recent = (date.today() - timedelta(days=90)).isoformat()
+    full_ms = timed_ms(lambda: get_daily_trends(lag=1), args.repeat)
+    recent_ms = timed_ms(lambda: get_daily_trends(date_from=recent, lag=1), args.repeat)
+    row = {"date": date.today().isoformat(), "caffeine": "190", "sleep": "7 hours"}
+    update_ms = timed_ms(lambda: series.update(row), 1000)
+    per_row_ms = timed_ms(lambda: per_row_trends(store.iter_rows(), 7), max(1, args.repeat // 4))
+
+    result = get_daily_trends(lag=1)
+    r = next(c["r"] for c in result["correlations"] if c["x"] == "caffeine" and c["y"] == "sleep")
+    _, _, per_row_r = per_row_trends(store.iter_rows(), 7)
+    print(f"Daily rows: {days} over {args.years:g} years, caffeine vs next-day sleep r = {r} (per row {per_row_r:.3f})")
+    print(f"Load and parse columns:   {load_ms:8.2f} ms (once, then on changes by other processes)")
+    print(f"Trends, full history:     {full_ms:8.2f} ms (including JSON-ready lists)")
+    print(f"Trends, last 90 days:     {recent_ms:8.2f} ms")
+    print(f"Column update per merge:  {update_ms * 1000:8.2f} µs")
+    print(f"Per-row loops over rows:  {per_row_ms:8.2f} ms (rolling, monthly, one correlation)")
+
+if __name__ == "__main__":
+    main()
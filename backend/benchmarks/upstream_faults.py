@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Drive /log against the fault-injecting fake Claude through a healthy phase, a degraded
+phase, a full outage and recovery, and report what callers saw in each: responses by
+status, latency, retries and circuit breaker state. Before recovering, the half-open
+trial request is cancelled mid-call (as a client disconnect or a queue shutdown would),
+which must leave the circuit able to admit the next trial.
+
+Usage: python benchmarks/upstream_faults.py [--requests 40] [--concurrency 8] [--deadline 3]
+Runs in a temporary data directory with the fake server on a local port; exits 1 if the
+cancelled trial is left running or the circuit does not close again.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PHASES = [
+    ("healthy", {}),
+    ("degraded", {"429": 0.2, "529": 0.2}),
+    ("hung", {"timeout": 0.3}),
+    ("outage", {"529": 1.0}),
+    ("recovered", {}),
+]
+
+def start_fake_claude() -> str:
+    import uvicorn
+    from stubs.fake_claude import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+async def run_phase(client, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = {}
+    timings = []
+
+    async def one(n: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/log", json={"input": f"had lunch #{n}"})
+            timings.append((time.perf_counter() - start) * 1000)
+            body = response.json()
+            key = f"{response.status_code} {body.get('status', '')}".strip()
+            outcomes[key] = outcomes.get(key, 0) + 1
+
+    await asyncio.gather(*(one(n) for n in range(requests)))
+    timings.sort()
+    return {
+        "outcomes": outcomes,
+        "p50_ms": round(timings[len(timings) // 2], 1),
+        "p99_ms": round(timings[max(0, int(len(timings) * 0.99) - 1)], 1),
+    }
+
+async def cancel_trial(client, fake, breaker_reset: float) -> bool:
+    """Cancel the half-open trial while Claude hangs; True if the next call may try again"""
+    from services.upstream_guard import get_upstream_guard
+
+    breaker = get_upstream_guard().breaker
+    await asyncio.sleep(breaker_reset)
+    await fake.post("/fake/faults", json={"timeout": 1.0})
+    trial = asyncio.create_task(client.post("/log", json={"input": "had lunch, cancelled"}))
+    await asyncio.sleep(0.3)
+    running = breaker.trial_running
+    trial.cancel()
+    await asyncio.gather(trial, return_exceptions=True)
+    print(f"{'cancelled':>10}: trial running {running}, after cancel {breaker.trial_running}, "
+          f"circuit {breaker.state}")
+    return running and not breaker.trial_running
+
+async def main(args):
+    import httpx
+
+    base_url = start_fake_claude()
+    os.environ.update({
+        "ANTHROPIC_API_KEY": "fake",
+        "ANTHROPIC_BASE_URL": base_url,
+        "CLAUDE_CACHE_ENABLED": "0",
+        "FAST_PATH_ENABLED": "0",
+        "CLAUDE_DEADLINE_SECONDS": str(args.deadline),
+        "CLAUDE_ATTEMPT_TIMEOUT_SECONDS": str(args.deadline / 3),
+        "CLAUDE_BREAKER_RESET_SECONDS": str(args.breaker_reset),
+        "FAKE_CLAUDE_HANG_SECONDS": str(args.deadline * 2),
+    })
+
+    import main as app_module
+    from services.upstream_guard import get_upstream_guard
+
+    failed = False
+    async with httpx.AsyncClient(base_url=base_url) as fake, \
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://app") as client:
+        for name, faults in PHASES:
+            await fake.post("/fake/faults", json=faults)
+            if name == "recovered":
+                if not await cancel_trial(client, fake, args.breaker_reset):
+                    failed = True
+                await fake.post("/fake/faults", json=faults)
+                # Give the breaker time to let a trial request through
+                await asyncio.sleep(args.breaker_reset)
+
+            before = dict(get_upstream_guard().stats())
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = await run_phase(client, args.requests, args.concurrency)
+            after = get_upstream_guard().stats()
+
+            print(f"{name:>10}: {result['outcomes']}  p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                  f"retries {after['retries'] - before['retries']}, "
+                  f"fast-failed {after['rejected_open'] - before['rejected_open']}, circuit {after['circuit']}")
+
+    if failed or after["circuit"] != "closed":
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/log behaviour under injected upstream faults")
+    parser.add_argument("--requests", type=int, default=40, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--deadline", type=float, default=3.0, help="CLAUDE_DEADLINE_SECONDS")
+    parser.add_argument("--breaker-reset", type=float, default=2.0, help="CLAUDE_BREAKER_RESET_SECONDS")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="cal-faults-"))
+    asyncio.run(main(args))
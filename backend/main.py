@@ -1,12 +1,41 @@
+import asyncio
+import logging
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from api.log import router as log_router
+from services.claude_service import init_client, close_client
+from services.prompt_builder import get_prompt
+from services.ingest_queue import get_ingest_queue, log_queue_enabled
+from services.data_paths import UserMiddleware, as_user, list_users
+from services.logs_validator import check_on_startup, startup_check
+from services.daily_logs_manager import get_daily_logs_store
+from services.migrations import check_schema_version
+from services.result_cache import close_result_cache
+from services.metrics import (
+    INGEST_QUEUE_DEPTH, UPSTREAM_CIRCUIT_OPEN, UPSTREAM_IN_FLIGHT, MetricsMiddleware, render,
+)
+from services.upstream_guard import get_upstream_guard
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Messages below LOG_LEVEL are dropped before they are formatted
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(levelname)s %(name)s: %(message)s",
+)
+# The Claude client logs every HTTP request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Cal - Nutrition & Wellness Tracker")
 
+# Innermost, so CORS preflights are answered without a user and errors get CORS headers
+app.add_middleware(UserMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:5173"],  # Vite dev server ports
@@ -15,8 +44,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(log_router)
 
+@app.on_event("startup")
+async def startup():
+    # Load and compile the prompt template and schema once
+    get_prompt()
+    
+    # One pooled async Claude client for the whole process
+    try:
+        init_client()
+    except ValueError as e:
+        # Keep serving read endpoints; /log will report the missing key
+        logger.warning("%s", e)
+    
+    for user in list_users():
+        with as_user(user):
+            # Warn if stored daily logs predate the current schema (new stores are stamped current)
+            check_schema_version(get_daily_logs_store())
+            
+            # Report problems in the raw log early; the check only reads it
+            if check_on_startup():
+                report = await asyncio.to_thread(startup_check)
+                logger.info("Checked the raw log%s: %d records in %.2fs",
+                            f" of {user}" if user else "", report.records, report.seconds)
+    
+    # Background workers for /log, replaying anything left unprocessed by the last run
+    if log_queue_enabled():
+        await get_ingest_queue().start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if log_queue_enabled():
+        await get_ingest_queue().stop()
+    await close_client()
+    close_result_cache()
+
 @app.get("/")
 async def root():
-    return {"message": "Cal API is running"}
\ No newline at end of file
+    return {"message": "Cal API is running"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    guard = get_upstream_guard().stats()
+    UPSTREAM_IN_FLIGHT.set(guard["in_flight"])
+    UPSTREAM_CIRCUIT_OPEN.set(1 if guard["circuit"] == "open" else 0)
+    if log_queue_enabled():
+        INGEST_QUEUE_DEPTH.set(get_ingest_queue().depth())
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -1,92 +1,81 @@
 #!/usr/bin/env python3
 """
-Migration script to convert existing daily logs to the new schema format.
-This adds the new fields and ensures backward compatibility.
+Migration script to bring the stored daily logs up to the current schema.
+
+Pending steps from services/migrations.py are applied in one streaming pass and the
+schema version is recorded in the database. A timestamped backup is written to
+data/backups first. A legacy daily_logs.csv is imported into the store (and kept as a
+timestamped backup) before migrating.
+
+Usage: python migrate_data.py [--dry-run] [--to VERSION] [--status] [--no-backup] [--user ID]
 """
 
-import csv
-import json
+import argparse
 import os
-from datetime import datetime
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from services.data_paths import set_current_user
+from services.daily_logs_manager import get_daily_logs_store
+from services.migrations import LATEST_VERSION, MIGRATIONS, pending_migrations, run_migrations, schema_version
+from services.raw_logger import get_raw_log
 
-def migrate_daily_logs():
-    """Migrate existing daily_logs.csv to include new fields"""
-    
-    daily_logs_path = "data/daily_logs.csv"
-    backup_path = "data/daily_logs_backup.csv"
-    
-    if not os.path.exists(daily_logs_path):
-        print("No daily_logs.csv found, nothing to migrate")
+def migrate_daily_logs(dry_run: bool = False, target: int = None, backup: bool = True):
+    """Apply pending migrations to the daily logs store and print what changed"""
+    store = get_daily_logs_store()
+    pending = pending_migrations(store, target)
+    if not pending:
+        print(f"Daily logs are at schema version {schema_version(store)}, nothing to migrate")
         return
-    
-    # Create backup
-    if os.path.exists(daily_logs_path):
-        os.rename(daily_logs_path, backup_path)
-        print(f"Created backup at {backup_path}")
-    
-    # Read old data
-    old_data = []
-    with open(backup_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        old_data = list(reader)
-    
-    # New field names with expanded schema
-    new_fieldnames = [
-        "date", "breakfast_description", "lunch_description", 
-        "dinner_description", "snack_description", "mood", 
-        "hydration", "sleep", "activity", "notes", "alcohol",
-        "caffeine", "marijuana", "exercise_type", "supplements", "last_updated"
-    ]
-    
-    # Write migrated data
-    with open(daily_logs_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=new_fieldnames)
-        writer.writeheader()
-        
-        for old_row in old_data:
-            # Start with old data
-            new_row = {field: old_row.get(field, "") for field in new_fieldnames}
-            
-            # Set default values for new fields
-            if not new_row.get("alcohol"):
-                new_row["alcohol"] = ""
-            if not new_row.get("caffeine"):
-                new_row["caffeine"] = ""
-            if not new_row.get("marijuana"):
-                new_row["marijuana"] = ""
-            if not new_row.get("exercise_type"):
-                new_row["exercise_type"] = ""
-            if not new_row.get("supplements"):
-                new_row["supplements"] = ""
-            
-            # Update last_updated if missing
-            if not new_row.get("last_updated"):
-                new_row["last_updated"] = datetime.now().isoformat()
-            
-            writer.writerow(new_row)
-    
-    print(f"Migration complete! Updated {len(old_data)} entries")
-    print("New fields added: alcohol, caffeine, marijuana, exercise_type, supplements")
+
+    report = run_migrations(store, dry_run=dry_run, target=target, backup=backup)
+
+    verb = "Would migrate" if dry_run else "Migrated"
+    print(f"{verb} {report['rows']} daily logs from version {report['from_version']} "
+          f"to {report['to_version']} in {report['seconds']:.2f}s")
+    for step in pending:
+        print(f"  {step.version}: {step.name} - {report['changed'][step.name]} rows changed")
+    print(f"  {report['rewritten']} rows {'would be ' if dry_run else ''}rewritten")
+    if report["backup"]:
+        print(f"Backup at {report['backup']}")
+
+def print_status():
+    store = get_daily_logs_store()
+    current = schema_version(store)
+    print(f"Schema version {current} (latest {LATEST_VERSION}), {store.count()} daily logs")
+    for step in MIGRATIONS:
+        print(f"  {'✓' if step.version <= current else ' '} {step.version}: {step.name}")
 
 def analyze_missing_sleep():
     """Check why the recent sleep entry might not have been processed"""
-    
+
     # Look at recent raw logs
-    raw_logs_path = "data/logs.csv"
-    if os.path.exists(raw_logs_path):
+    recent = get_raw_log().read_last(3)
+    if recent:
         print("\nAnalyzing recent raw logs:")
-        with open(raw_logs_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            logs = list(reader)
-            
-            # Show last 3 entries
-            for log in logs[-3:]:
-                timestamp = log.get('timestamp', 'No timestamp')
-                message = log.get('message', 'No message')
-                print(f"  {timestamp}: {message}")
+        # Show last 3 entries, read from the end of the newest segment
+        for log in recent:
+            timestamp = log.get('timestamp', 'No timestamp')
+            message = log.get('message', 'No message')
+            print(f"  {timestamp}: {message}")
 
 if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Migrate stored daily logs to the current schema")
+    parser.add_argument("--dry-run", action="store_true", help="report row counts and timing without writing")
+    parser.add_argument("--to", type=int, default=None, help="migrate up to this version (default: latest)")
+    parser.add_argument("--status", action="store_true", help="show the schema version and steps")
+    parser.add_argument("--no-backup", action="store_true", help="skip the backup copy")
+    parser.add_argument("--user", default=None, help="whose data to use (X-User-Id; default: the default user)")
+    args = parser.parse_args()
+    set_current_user(args.user)
+
+    if args.status:
+        print_status()
+        sys.exit(0)
+
     print("🔄 Starting data migration...")
-    migrate_daily_logs()
+    migrate_daily_logs(dry_run=args.dry_run, target=args.to, backup=not args.no_backup)
     analyze_missing_sleep()
-    print("✅ Migration complete!")
\ No newline at end of file
+    print("✅ Migration complete!" if not args.dry_run else "✅ Dry run complete")
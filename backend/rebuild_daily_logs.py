@@ -1,80 +1,80 @@
 #!/usr/bin/env python3
-"""Script to rebuild daily logs from raw messages using the new merging logic"""
+"""
+Script to rebuild daily logs from raw messages using the new merging logic.
 
-import csv
+Messages are processed concurrently and the result replaces the daily logs in one write
+at the end. Progress is checkpointed to data/rebuild_checkpoint.jsonl, so running the
+script again after an interruption only processes the messages that were not finished.
+It can run beside the server: messages logged during the rebuild are extracted too, and
+the final replace holds out the server's merges (see services/rebuild_engine.py).
+
+With --batch, messages are sent through the Message Batches API instead (cheaper and
+faster for full-history reprocessing, e.g. after a prompt change); submitted batches are
+checkpointed too, so an interrupted run picks up their results rather than resubmitting.
+
+Usage: python rebuild_daily_logs.py [--concurrency 4] [--rate 5] [--fresh] [--allow-partial] [--user ID]
+       python rebuild_daily_logs.py --batch [--batch-size 10000] [--poll-interval 30] [--user ID]
+"""
+
+import argparse
 import os
 import sys
-from datetime import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from services.raw_logger import get_raw_logs_path
-from services.daily_logs_manager import merge_daily_entry, save_daily_logs
-from services.claude_service import process_user_input
+from dotenv import load_dotenv
+from services.data_paths import set_current_user
+from services.daily_logs_store import get_store_path
+from services.raw_logger import has_raw_messages
+from services.claude_service import close_client
+from services.result_cache import cache_enabled, get_result_cache
+from services.rebuild_engine import rebuild_daily_logs
 import asyncio
 
-async def rebuild_daily_logs():
+async def main(args):
     """Rebuild daily logs from raw messages with new merging logic"""
     print("Rebuilding daily logs from raw messages...")
-    
-    # Clear existing daily logs
-    daily_logs_path = "data/daily_logs.csv"
-    if os.path.exists(daily_logs_path):
-        os.remove(daily_logs_path)
-        print("Cleared existing daily logs")
-    
-    # Read raw messages
-    raw_logs_path = get_raw_logs_path()
-    if not os.path.exists(raw_logs_path):
+
+    if not has_raw_messages():
         print("No raw logs found")
         return
-    
-    processed_count = 0
-    
+
     try:
-        with open(raw_logs_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            
-            for row in reader:
-                timestamp = row.get("timestamp", "")
-                message = row.get("message", "")
-                
-                if not message or not message.strip():
-                    continue
-                
-                try:
-                    # Get date from timestamp
-                    if timestamp:
-                        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                        date = dt.strftime("%Y-%m-%d")
-                    else:
-                        date = datetime.now().strftime("%Y-%m-%d")
-                    
-                    print(f"\nProcessing: '{message}' for {date}")
-                    
-                    # Process message with Claude
-                    structured_data, is_meaningful = await process_user_input(message)
-                    
-                    if is_meaningful:
-                        # Merge into daily logs
-                        success = merge_daily_entry(structured_data, date)
-                        if success:
-                            processed_count += 1
-                            print(f"✅ Merged successfully")
-                        else:
-                            print(f"❌ Failed to merge")
-                    else:
-                        print(f"⏭️  Skipped - no meaningful wellness data")
-                        
-                except Exception as e:
-                    print(f"❌ Error processing message: {e}")
-                    continue
-    
-    except Exception as e:
-        print(f"Error reading raw logs: {e}")
-        return
-    
-    print(f"\n✅ Rebuild complete! Processed {processed_count} meaningful messages.")
-    print("Check data/daily_logs.csv for the rebuilt logs.")
+        stats = await rebuild_daily_logs(
+            concurrency=args.concurrency,
+            rate=args.rate,
+            resume=not args.fresh,
+            allow_partial=args.allow_partial,
+            batch=args.batch,
+            batch_size=args.batch_size,
+            poll_seconds=args.poll_interval,
+        )
+    finally:
+        await close_client()
+
+    if stats["written"]:
+        print(f"\n✅ Rebuild complete! {stats['days']} days from {stats['messages']} messages "
+              f"({stats['resumed']} resumed, {stats['extracted']} extracted, {stats['failed']} failed).")
+        print(f"Download the rebuilt logs from /view or check {get_store_path()}.")
+    if cache_enabled():
+        cache_stats = get_result_cache().stats()
+        print(f"Claude result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
 if __name__ == "__main__":
-    asyncio.run(rebuild_daily_logs())
\ No newline at end of file
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Rebuild daily logs from the raw message log")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("REBUILD_CONCURRENCY", "4")),
+                        help="messages processed at once")
+    parser.add_argument("--rate", type=float, default=float(os.getenv("REBUILD_RATE_PER_SECOND", "0")) or None,
+                        help="maximum Claude requests per second (default: unlimited)")
+    parser.add_argument("--fresh", action="store_true", help="ignore any checkpoint from an earlier run")
+    parser.add_argument("--allow-partial", action="store_true",
+                        help="write the daily logs even if some messages failed")
+    parser.add_argument("--batch", action="store_true", help="use the Message Batches API")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="messages per batch (default: CLAUDE_BATCH_MAX_REQUESTS or 10000)")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="seconds between batch status checks (default: CLAUDE_BATCH_POLL_SECONDS or 30)")
+    parser.add_argument("--user", default=None, help="whose data to use (X-User-Id; default: the default user)")
+    args = parser.parse_args()
+    set_current_user(args.user)
+    asyncio.run(main(args))
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""Script to recompute streaks and rollups from the stored daily logs"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from services.data_paths import set_current_user
+from services.daily_logs_manager import get_daily_logs_store, get_daily_summary
+from services.daily_stats import rebuild_daily_stats
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Recompute streaks and rollups")
+    parser.add_argument("--user", default=None, help="whose data to use (X-User-Id; default: the default user)")
+    args = parser.parse_args()
+    set_current_user(args.user)
+
+    print("Rebuilding daily stats from daily logs...")
+    rows = rebuild_daily_stats(get_daily_logs_store())
+    summary = get_daily_summary()
+    print(f"✅ Rebuilt stats over {rows} days")
+    print(f"Current streak: {summary['current_streak']}, longest streak: {summary['longest_streak']}")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the search index from the raw log and the stored daily logs.
+
+The index is kept up to date as messages are logged; rebuild it after restoring or
+editing the logs by hand, or to try a query from the command line.
+
+Usage: python rebuild_search_index.py [--user ID]
+       python rebuild_search_index.py --query "supplements:magnesium" [--order date] [--user ID]
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from services.data_paths import set_current_user
+from services.search_index import ensure_search_index, get_search_index_path, rebuild_search_index
+
+def print_results(query: str, order: str, limit: int):
+    results = ensure_search_index().search(query, order=order, limit=limit)
+    print(f"{results['total']} matches for {query!r} in {results['took_ms']:.2f} ms")
+    for result in results["results"]:
+        when = result.get("timestamp") or result["date"]
+        for field, text in result["fields"].items():
+            print(f"  {when} [{result['kind']}] {field}: {text[:100]}")
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Rebuild or query the search index")
+    parser.add_argument("--query", help="search the index instead of rebuilding it")
+    parser.add_argument("--order", choices=("rank", "date"), default="rank", help="result order for --query")
+    parser.add_argument("--limit", type=int, default=10, help="results listed for --query")
+    parser.add_argument("--user", default=None, help="whose data to use (X-User-Id; default: the default user)")
+    args = parser.parse_args()
+    set_current_user(args.user)
+
+    if args.query:
+        print_results(args.query, args.order, args.limit)
+        sys.exit(0)
+
+    print("Rebuilding the search index...")
+    counts = rebuild_search_index()
+    print(f"✅ Indexed {counts['messages']} messages and {counts['days']} days "
+          f"({counts['documents']} documents) in {counts['seconds']:.2f}s into {get_search_index_path()}")
@@ -0,0 +1,359 @@
+"""
+Numeric time series over the daily logs, for /trends.
+
+Number and boolean fields, and the free-text fields that hold a quantity (sleep in hours,
+hydration in liters), are parsed once into NumPy columns with one slot per calendar day
+(NaN where nothing was logged). Merges update a day in place; rolling averages,
+weekly/monthly aggregates and correlations are then whole-array operations.
+"""
+
+import re
+import threading
+from datetime import date as date_type, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.metrics import CACHE_LOOKUPS
+from services.read_cache import file_signature
+from services.schema_registry import BOOLEAN, NUMBER, get_schema_registry
+
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_HOURS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hrs?|hours?|m|mins?|minutes?)\b")
+_COMPACT_HOURS_RE = re.compile(r"\b(\d{1,2})h(\d{2})\b")  # 7h30
+_BARE_NUMBER_RE = re.compile(r"\s*\d+(?:\.\d+)?\s*")  # the whole value is a number
+_CLOCK_RANGE_RE = re.compile(
+    r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*(?:-|to|until|till)\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?"
+)
+_VOLUME_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(ml|milliliters?|millilitres?|l|liters?|litres?|oz|ounces?|cups?|glasses|glass|bottles?)\b"
+)
+
+# Liters per unit; a glass or cup of water is taken as the usual 250 ml
+_LITERS = {"ml": 0.001, "l": 1.0, "oz": 0.0295735, "cup": 0.25, "glass": 0.25, "bottle": 0.5}
+
+def _as_text(value) -> str:
+    # Append fields are stored as item lists
+    return ", ".join(str(item) for item in value) if isinstance(value, list) else str(value)
+
+def parse_number(value) -> Optional[float]:
+    """The first number in a value ("200mg" -> 200)"""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(_as_text(value))
+    return float(match.group()) if match else None
+
+def parse_bool(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    text = _as_text(value).strip().lower()
+    if text in ("true", "yes", "1"):
+        return 1.0
+    if text in ("false", "no", "0"):
+        return 0.0
+    return None
+
+def _clock_hour(hour: str, minute: Optional[str], meridiem: Optional[str]) -> float:
+    value = int(hour) % 12 if meridiem else int(hour)
+    if meridiem == "pm":
+        value += 12
+    return value + int(minute or 0) / 60
+
+def parse_hours(value) -> Optional[float]:
+    """Hours from "7.5 hours", "7h 30m", "7h30", "450 minutes", "11pm to 7am" or a bare "7" """
+    text = _as_text(value).lower()
+    compact = _COMPACT_HOURS_RE.search(text)
+    if compact:
+        return int(compact.group(1)) + int(compact.group(2)) / 60
+    total = 0.0
+    found = False
+    for amount, unit in _HOURS_RE.findall(text):
+        total += float(amount) / (60 if unit.startswith("m") else 1)
+        found = True
+    if found:
+        return total
+
+    match = _CLOCK_RANGE_RE.search(text)
+    if match and (match.group(3) or match.group(6)):
+        start = _clock_hour(match.group(1), match.group(2), match.group(3) or match.group(6))
+        end = _clock_hour(match.group(4), match.group(5), match.group(6) or match.group(3))
+        return (end - start) % 24
+
+    # Only a value that is just a number; "woke at 3am" is not 3 hours of sleep
+    if not _BARE_NUMBER_RE.fullmatch(text):
+        return None
+    number = float(text)
+    return number if 0 < number <= 24 else None
+
+def parse_liters(value) -> Optional[float]:
+    """Total liters over every quantity in a value ("2L water, 500ml tea" -> 2.5)"""
+    total = 0.0
+    found = False
+    for amount, unit in _VOLUME_RE.findall(_as_text(value).lower()):
+        unit = unit.rstrip("s") if unit not in ("glasses", "glass") else "glass"
+        if unit.startswith("milli"):
+            unit = "ml"
+        elif unit.startswith("lit"):
+            unit = "l"
+        elif unit.startswith("ounce"):
+            unit = "oz"
+        total += float(amount) * _LITERS[unit]
+        found = True
+    return round(total, 3) if found else None
+
+# Free-text fields that hold a quantity: parser and unit
+TEXT_QUANTITIES: Dict[str, Tuple[Callable, str]] = {
+    "sleep": (parse_hours, "hours"),
+    "hydration": (parse_liters, "liters"),
+}
+
+# Units of the built-in number fields
+UNITS = {"caffeine": "mg"}
+
+def numeric_fields() -> Dict[str, Tuple[Callable, str]]:
+    """Field -> (parser, unit) for every field that has a numeric series"""
+    fields = {}
+    for spec in get_schema_registry().fields():
+        if spec.name in TEXT_QUANTITIES:
+            fields[spec.name] = TEXT_QUANTITIES[spec.name]
+        elif spec.type == NUMBER:
+            fields[spec.name] = (parse_number, UNITS.get(spec.name, ""))
+        elif spec.type == BOOLEAN:
+            fields[spec.name] = (parse_bool, "share of days")
+    return fields
+
+def _nan_to_none(values: np.ndarray, digits: int = 3) -> List[Optional[float]]:
+    rounded = np.round(values, digits)
+    return [None if value != value else value for value in rounded.tolist()]
+
+class DailySeries:
+    """One float64 column per numeric field, indexed by day from the first logged date"""
+
+    GROWTH = 64  # spare days allocated after the last date, so merges rarely reallocate
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._fields: Optional[Dict[str, Tuple[Callable, str]]] = None
+        self._start = 0   # ordinal of the first slot
+        self._length = 0  # slots in use, up to the last logged date
+        self._columns: Dict[str, np.ndarray] = {}
+        self._signature = None
+
+    def _current_signature(self) -> Tuple:
+        # The schema version too: an added number field is a new column
+        return file_signature(self.store_path, self.store_path + "-wal") + (get_schema_registry().version,)
+
+    def _ensure_loaded(self, loader: Callable[[], Iterable[Dict]]):
+        signature = self._current_signature()
+        if self._fields is not None and signature == self._signature:
+            CACHE_LOOKUPS.inc(cache="trends", result="hit")
+            return
+
+        CACHE_LOOKUPS.inc(cache="trends", result="miss")
+        self._fields = numeric_fields()
+        self._columns = {}
+        self._length = 0
+        for row in loader():
+            self._apply(row)
+        self._signature = signature
+
+    def _reserve(self, day: int):
+        """Make room for a slot at day ordinal `day`, growing either end"""
+        if not self._columns or self._length == 0:
+            capacity = self.GROWTH
+            self._start = day
+            self._length = 1
+            self._columns = {field: np.full(capacity, np.nan) for field in [*self._fields, "_logged"]}
+            return
+
+        if day < self._start:
+            shift = self._start - day
+            self._columns = {
+                field: np.concatenate([np.full(shift, np.nan), column])
+                for field, column in self._columns.items()
+            }
+            self._start = day
+            self._length += shift
+        end = day - self._start + 1
+        if end > self._length:
+            capacity = len(next(iter(self._columns.values())))
+            if end > capacity:
+                extra = max(end - capacity, self.GROWTH, capacity // 2)
+                self._columns = {
+                    field: np.concatenate([column, np.full(extra, np.nan)])
+                    for field, column in self._columns.items()
+                }
+            self._length = end
+
+    def _apply(self, row: Dict):
+        try:
+            day = date_type.fromisoformat(row["date"]).toordinal()
+        except (KeyError, TypeError, ValueError):
+            return
+        self._reserve(day)
+        index = day - self._start
+        self._columns["_logged"][index] = 1.0
+        for field, (parse, _) in self._fields.items():
+            value = row.get(field)
+            parsed = parse(value) if value not in (None, "", []) else None
+            self._columns[field][index] = np.nan if parsed is None else parsed
+
+    def update(self, row: Dict):
+        """Apply a row just written by this process"""
+        with self._lock:
+            if self._fields is None:
+                return
+            self._apply(row)
+            self._signature = self._current_signature()
+
+    def invalidate(self):
+        with self._lock:
+            self._fields = None
+            self._columns = {}
+            self._signature = None
+
+    def snapshot(self, loader: Callable[[], Iterable[Dict]], fields: Optional[List[str]] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None, context: int = 0):
+        """
+        (first ordinal, {field: copy of its column}, units, context days) over a date
+        range, with up to `context` earlier days first (for windows reaching back)
+        """
+        with self._lock:
+            self._ensure_loaded(loader)
+            if self._length == 0:
+                return self._start, {}, {}, 0
+            first = self._start
+            last = self._start + self._length - 1
+            if date_from:
+                first = max(first, date_type.fromisoformat(date_from[:10]).toordinal())
+            if date_to:
+                last = min(last, date_type.fromisoformat(date_to[:10]).toordinal())
+            selected = [field for field in (fields or self._fields) if field in self._fields]
+            lo, hi = first - self._start, max(first, last + 1) - self._start
+            context = min(context, lo)
+            columns = {field: self._columns[field][lo - context:hi].copy() for field in selected}
+            columns["_logged"] = self._columns["_logged"][lo - context:hi].copy()
+            units = {field: self._fields[field][1] for field in selected}
+            return first, columns, units, context
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the logged values in the `window` days ending on each day (NaN if none)"""
+    present = ~np.isnan(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(present)])
+    window_sums = sums[window:] - sums[:-window] if len(values) >= window else np.empty(0)
+    window_counts = counts[window:] - counts[:-window] if len(values) >= window else np.empty(0, dtype=int)
+    # The first days have a shorter window
+    head = min(window - 1, len(values))
+    window_sums = np.concatenate([sums[1:head + 1], window_sums])
+    window_counts = np.concatenate([counts[1:head + 1], window_counts])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, window_sums / np.maximum(window_counts, 1), np.nan)
+
+def _period_keys(first: int, length: int, period: str) -> np.ndarray:
+    """Ordinal of the Monday (week) or the 1st (month) starting each day's period"""
+    days = np.arange(first, first + length)
+    if period == "week":
+        # date.fromordinal(1) is a Monday
+        return days - (days - 1) % 7
+    # datetime64 days count from 1970-01-01, ordinal 719163
+    epoch = date_type(1970, 1, 1).toordinal()
+    months = (days - epoch).astype("datetime64[D]").astype("datetime64[M]")
+    return months.astype("datetime64[D]").astype(np.int64) + epoch
+
+def _period_label(start: int, period: str) -> str:
+    day = date_type.fromordinal(start)
+    if period == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.strftime("%Y-%m")
+
+def aggregate(first: int, values: np.ndarray, period: str) -> List[Dict]:
+    """Mean, total and days logged of a column per week or month"""
+    if len(values) == 0:
+        return []
+    keys = _period_keys(first, len(values), period)
+    starts, inverse = np.unique(keys, return_inverse=True)
+    present = ~np.isnan(values)
+    totals = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=len(starts))
+    days = np.bincount(inverse, weights=present, minlength=len(starts)).astype(int)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(days > 0, totals / np.maximum(days, 1), np.nan)
+    return [
+        {"period": _period_label(start, period), "mean": mean, "total": round(total, 3), "days": count}
+        for start, mean, total, count in zip(starts.tolist(), _nan_to_none(means), totals.tolist(), days.tolist())
+        if count
+    ]
+
+def correlation(x: np.ndarray, y: np.ndarray, lag: int = 0) -> Dict:
+    """Pearson r between x on a day and y `lag` days later, over days with both logged"""
+    if lag:
+        x, y = x[:-lag], y[lag:]
+    both = ~np.isnan(x) & ~np.isnan(y)
+    n = int(both.sum())
+    if n < 3:
+        return {"r": None, "n": n}
+    xs, ys = x[both], y[both]
+    if xs.std() == 0 or ys.std() == 0:
+        return {"r": None, "n": n}
+    return {"r": round(float(np.corrcoef(xs, ys)[0, 1]), 3), "n": n}
+
+def trends(series: DailySeries, loader: Callable[[], Iterable[Dict]], fields: Optional[List[str]] = None,
+           date_from: Optional[str] = None, date_to: Optional[str] = None, window: int = 7,
+           lag: int = 0) -> Dict:
+    """
+    Daily values with their rolling mean over `window` days, weekly and monthly
+    aggregates and the correlation of each pair of fields (y taken `lag` days after x)
+    """
+    first, columns, units, context = series.snapshot(loader, fields, date_from, date_to, window - 1)
+    length = len(columns.pop("_logged", np.empty(context))) - context
+    # Rolling means over the range see the days before it; everything else does not
+    rolling = {field: rolling_mean(values, window)[context:] for field, values in columns.items()}
+    columns = {field: values[context:] for field, values in columns.items()}
+    dates = [(date_type.fromordinal(first) + timedelta(days=n)).isoformat() for n in range(length)]
+
+    summary = {}
+    for field, values in columns.items():
+        present = values[~np.isnan(values)]
+        summary[field] = {
+            "unit": units[field],
+            "days": int(len(present)),
+            "mean": round(float(present.mean()), 3) if len(present) else None,
+            "min": round(float(present.min()), 3) if len(present) else None,
+            "max": round(float(present.max()), 3) if len(present) else None,
+        }
+
+    # Lagged correlations are not symmetric: x leads y, so both orders are reported
+    names = list(columns)
+    pairs = [(x, y) for x in names for y in names if x != y] if lag else \
+        [(x, y) for i, x in enumerate(names) for y in names[i + 1:]]
+    return {
+        "from": dates[0] if dates else None,
+        "to": dates[-1] if dates else None,
+        "window": window,
+        "fields": summary,
+        "daily": {
+            "dates": dates,
+            "values": {field: _nan_to_none(values) for field, values in columns.items()},
+            "rolling": {field: _nan_to_none(values) for field, values in rolling.items()},
+        },
+        "weekly": {field: aggregate(first, values, "week") for field, values in columns.items()},
+        "monthly": {field: aggregate(first, values, "month") for field, values in columns.items()},
+        "correlations": [
+            {"x": x, "y": y, "lag": lag, **correlation(columns[x], columns[y], lag)}
+            for x, y in pairs if lag < length
+        ],
+    }
+
+_series: Dict[str, DailySeries] = {}
+_series_lock = threading.Lock()
+
+def get_daily_series(store_path: str) -> DailySeries:
+    with _series_lock:
+        series = _series.get(store_path)
+        if series is None:
+            series = _series[store_path] = DailySeries(store_path)
+        return series
@@ -0,0 +1,93 @@
+"""
+Client for the Message Batches API, used for bulk re-extraction of the raw log.
+
+The installed anthropic SDK predates batches, so this talks to the HTTP API directly
+with the same key, base URL and timeouts as the shared client.
+"""
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from services.claude_service import PROMPT_CACHING_BETA
+
+API_VERSION = "2023-06-01"
+MESSAGE_BATCHES_BETA = "message-batches-2024-09-24"
+
+# API limit is 100,000 requests (and 256 MB) per batch
+DEFAULT_MAX_REQUESTS = 10000
+DEFAULT_POLL_SECONDS = 30.0
+
+def batch_max_requests() -> int:
+    return int(os.getenv("CLAUDE_BATCH_MAX_REQUESTS", DEFAULT_MAX_REQUESTS))
+
+def batch_poll_seconds() -> float:
+    return float(os.getenv("CLAUDE_BATCH_POLL_SECONDS", DEFAULT_POLL_SECONDS))
+
+class BatchError(Exception):
+    pass
+
+class BatchClient:
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+
+        base_url = base_url or os.getenv("ANTHROPIC_BASE_URL") or "https://api.anthropic.com"
+        timeout = httpx.Timeout(
+            float(os.getenv("CLAUDE_TIMEOUT", 60.0)),
+            connect=float(os.getenv("CLAUDE_CONNECT_TIMEOUT", 5.0)),
+        )
+        self._http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers={
+                "x-api-key": api_key,
+                "anthropic-version": API_VERSION,
+                "anthropic-beta": f"{MESSAGE_BATCHES_BETA},{PROMPT_CACHING_BETA}",
+            },
+        )
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict:
+        response = await self._http.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise BatchError(f"{method} {url} failed with {response.status_code}: {response.text}")
+        return response.json()
+
+    async def create(self, requests: List[Dict]) -> Dict:
+        """Submit [{"custom_id": ..., "params": <Messages API arguments>}, ...]"""
+        return await self._request("POST", "/v1/messages/batches", json={"requests": requests})
+
+    async def retrieve(self, batch_id: str) -> Dict:
+        return await self._request("GET", f"/v1/messages/batches/{batch_id}")
+
+    async def wait(self, batch_id: str, poll_seconds: Optional[float] = None) -> Dict:
+        """Poll until processing has ended and return the final batch"""
+        poll_seconds = batch_poll_seconds() if poll_seconds is None else poll_seconds
+        while True:
+            batch = await self.retrieve(batch_id)
+            if batch.get("processing_status") == "ended":
+                return batch
+            counts = batch.get("request_counts", {})
+            print(f"Batch {batch_id}: {counts.get('processing', '?')} requests still processing")
+            await asyncio.sleep(poll_seconds)
+
+    async def iter_results(self, batch: Dict) -> AsyncIterator[Dict]:
+        """Stream the JSONL results of an ended batch, one result at a time"""
+        results_url = batch.get("results_url")
+        if not results_url:
+            raise BatchError(f"Batch {batch.get('id')} has no results")
+
+        async with self._http.stream("GET", results_url) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise BatchError(f"Fetching results failed with {response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+    async def close(self):
+        await self._http.aclose()
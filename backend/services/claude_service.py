@@ -1,49 +1,201 @@
 import os
 import json
-from anthropic import Anthropic
-from datetime import datetime, timedelta
+import httpx
+from anthropic import AsyncAnthropic
+from datetime import datetime
+from typing import Optional
+from services.prompt_builder import CompiledPrompt, get_prompt
+from services.fast_extractor import extract_locally, fast_path_enabled, min_confidence
+from services.result_cache import cache_enabled, get_result_cache, make_cache_key
+from services.rate_limiter import RateLimiter
+from services.schema_registry import MULTI_SELECT, get_schema_registry
+from services.upstream_guard import get_upstream_guard
+from services.metrics import CACHE_LOOKUPS, EXTRACTIONS, UPSTREAM_TOKENS, stage
 
-async def process_user_input(user_input: str) -> tuple[dict, bool]:
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+# Process-wide client shared by every request so connections are pooled and reused
+_client: Optional[AsyncAnthropic] = None
+
+# Token usage reported by the API since process start
+_usage = {
+    "requests": 0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "cache_read_input_tokens": 0,
+}
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+def init_client() -> AsyncAnthropic:
+    """Create the shared async Claude client (called once at app startup)"""
+    global _client
+    
+    if _client is not None:
+        return _client
+    
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+    
+    # Pool size and timeouts are configurable through the environment
+    limits = httpx.Limits(
+        max_connections=_env_int("CLAUDE_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=_env_int("CLAUDE_MAX_KEEPALIVE_CONNECTIONS", 10),
+        keepalive_expiry=_env_float("CLAUDE_KEEPALIVE_EXPIRY", 30.0),
+    )
+    timeout = httpx.Timeout(
+        _env_float("CLAUDE_TIMEOUT", 60.0),
+        connect=_env_float("CLAUDE_CONNECT_TIMEOUT", 5.0),
+    )
+    
+    _client = AsyncAnthropic(
+        api_key=api_key,
+        base_url=os.getenv("ANTHROPIC_BASE_URL") or None,
+        # Retries are done by the upstream guard, within its deadline
+        max_retries=_env_int("CLAUDE_MAX_RETRIES", 0),
+        timeout=timeout,
+        http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+    )
+    return _client
+
+def get_model() -> str:
+    return os.getenv("CLAUDE_MODEL", DEFAULT_MODEL)
+
+def get_client() -> AsyncAnthropic:
+    """Return the shared client, creating it lazily for scripts that skip app startup"""
+    return _client if _client is not None else init_client()
+
+async def close_client():
+    """Close the shared client and its connection pool (called at app shutdown)"""
+    global _client
+    
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+def build_message_request(prompt_template: CompiledPrompt, user_input: str, current_date: datetime) -> dict:
+    """
+    Build the Messages API arguments. The instructions and schema go in a cacheable
+    system block so only the short per-message suffix is processed fresh each call.
+    """
+    return {
+        "model": get_model(),
+        "max_tokens": 1024,
+        "temperature": 0,
+        "system": [
+            {
+                "type": "text",
+                "text": prompt_template.prefix,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt_template.render_suffix(user_input, current_date)
+            }
+        ],
+        "extra_headers": {"anthropic-beta": PROMPT_CACHING_BETA},
+    }
+
+def record_usage(usage):
+    """Accumulate token usage, split into cached and uncached input tokens"""
+    if usage is None:
+        return
+    
+    _usage["requests"] += 1
+    for field in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+        # SDK responses carry an object; batch results are plain JSON
+        value = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+        _usage[field] += value or 0
+        if value:
+            UPSTREAM_TOKENS.inc(value, type=field[:-len("_tokens")])
+
+def get_usage_stats() -> dict:
+    return dict(_usage)
+
+async def process_user_input(user_input: str, reference_time: Optional[datetime] = None,
+                             rate_limiter: Optional[RateLimiter] = None) -> tuple[dict, bool]:
     """
     Process user input with Claude and return (structured_data, is_meaningful).
     is_meaningful indicates if the data contains wellness information worth logging.
+    reference_time is the moment the message was written (defaults to now); it sets
+    the current/yesterday dates Claude resolves relative references against.
+    rate_limiter, if given, paces the requests that actually reach Claude.
     """
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+    # Provide current date, yesterday, and timestamp for Claude to use
+    current_date = reference_time or datetime.now()
+    prompt_template = get_prompt()
     
-    client = Anthropic(api_key=api_key)
+    with stage("resolve_local"):
+        local = resolve_locally(user_input, current_date, prompt_template)
+    if local is not None:
+        return local
     
-    with open("prompt_template.txt", "r") as f:
-        prompt_template = f.read()
+    client = get_client()
+    if rate_limiter is not None:
+        await rate_limiter.acquire()
     
-    with open("prompt_schema.json", "r") as f:
-        schema = json.load(f)
+    # Concurrency and rate limits, retries and the circuit breaker; raises UpstreamUnavailable
+    with stage("prompt"):
+        request = build_message_request(prompt_template, user_input, current_date)
+    with stage("claude"):
+        response = await get_upstream_guard().call(
+            lambda timeout: client.messages.create(**request, timeout=timeout)
+        )
+    record_usage(response.usage)
     
-    prompt = prompt_template.replace("{USER_INPUT}", user_input)
-    prompt = prompt.replace("{JSON_SCHEMA}", json.dumps(schema, indent=2))
+    with stage("parse"):
+        structured_data, is_meaningful = parse_claude_response(response.content[0].text, current_date)
+    EXTRACTIONS.inc(source="claude", meaningful=str(is_meaningful).lower())
+    remember_result(user_input, current_date, prompt_template, structured_data, is_meaningful)
     
-    # Provide current date, yesterday, and timestamp for Claude to use
-    current_date = datetime.now()
-    yesterday_date = current_date - timedelta(days=1)
-    prompt = prompt.replace("{CURRENT_DATE}", current_date.strftime("%Y-%m-%d"))
-    prompt = prompt.replace("{YESTERDAY_DATE}", yesterday_date.strftime("%Y-%m-%d"))
-    prompt = prompt.replace("{CURRENT_TIMESTAMP}", current_date.isoformat())
+    return structured_data, is_meaningful
+
+def resolve_locally(user_input: str, current_date: datetime,
+                    prompt_template: CompiledPrompt) -> Optional[tuple[dict, bool]]:
+    """The result without calling Claude (fast path or result cache), or None"""
+    # Short formulaic messages are structured locally without a round-trip
+    if fast_path_enabled():
+        structured_data, is_meaningful, confidence = extract_locally(user_input, current_date)
+        if structured_data and confidence >= min_confidence():
+            CACHE_LOOKUPS.inc(cache="fast_path", result="hit")
+            EXTRACTIONS.inc(source="fast_path", meaningful=str(is_meaningful).lower())
+            return structured_data, is_meaningful
+        CACHE_LOOKUPS.inc(cache="fast_path", result="miss")
     
-    response = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=1024,
-        temperature=0,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
+    # Identical input with the same date context, prompt and model gives the same answer
+    if cache_enabled():
+        cache_key = make_cache_key(user_input, current_date, prompt_template.hash, get_model())
+        cached = get_result_cache().get(cache_key)
+        if cached is not None:
+            structured_data, is_meaningful = cached
+            structured_data["timestamp"] = current_date.isoformat()
+            CACHE_LOOKUPS.inc(cache="result", result="hit")
+            EXTRACTIONS.inc(source="cache", meaningful=str(is_meaningful).lower())
+            return structured_data, is_meaningful
+        CACHE_LOOKUPS.inc(cache="result", result="miss")
     
+    return None
+
+def remember_result(user_input: str, current_date: datetime, prompt_template: CompiledPrompt,
+                    structured_data: dict, is_meaningful: bool):
+    """Store a parsed Claude result in the result cache"""
+    if cache_enabled():
+        cache_key = make_cache_key(user_input, current_date, prompt_template.hash, get_model())
+        get_result_cache().put(cache_key, structured_data, is_meaningful)
+
+def parse_claude_response(text: str, current_date: datetime) -> tuple[dict, bool]:
+    """Parse Claude's JSON reply into the flattened structure and a meaningful flag"""
     try:
-        result = json.loads(response.content[0].text)
+        result = json.loads(text)
         
         # Ensure required fields exist
         if "date" not in result:
@@ -53,23 +205,7 @@ async def process_user_input(user_input: str) -> tuple[dict, bool]:
         
         # Extract fields for backward compatibility and meaningful check
         fields = result.get("fields", {})
-        
-        # Check if the result contains meaningful wellness data
-        meaningful_fields = [
-            "breakfast_description", "lunch_description", "dinner_description", 
-            "snack_description", "hydration", "sleep", "activity", "alcohol",
-            "caffeine", "marijuana", "exercise_type", "supplements"
-        ]
-        
-        # Check mood subfields
-        mood_data = fields.get("mood", {})
-        has_mood = any(mood_data.get(time) for time in ["morning", "afternoon", "night"])
-        
-        is_meaningful = has_mood or any(
-            fields.get(field) and str(fields.get(field)).strip() and 
-            str(fields.get(field)).strip() not in ["-", "n/a", "none", "null"]
-            for field in meaningful_fields
-        )
+        registry = get_schema_registry()
         
         # Flatten the structure for backward compatibility with existing code
         flattened_result = {
@@ -79,17 +215,20 @@ async def process_user_input(user_input: str) -> tuple[dict, bool]:
         
         # Add all fields from the nested structure to the flat structure
         for key, value in fields.items():
-            if key == "mood" and isinstance(value, dict):
-                # Split mood into separate time-based fields
-                flattened_result["mood_morning"] = value.get("morning", "")
-                flattened_result["mood_afternoon"] = value.get("afternoon", "")
-                flattened_result["mood_night"] = value.get("night", "")
-            elif key == "supplements" and isinstance(value, list):
-                # Store supplements as JSON string
-                flattened_result["supplements"] = json.dumps(value) if value else "[]"
+            group = registry.group(key)
+            if group and isinstance(value, dict):
+                # Split grouped fields, e.g. mood into mood_morning/afternoon/night
+                for sub_key, field in group.items():
+                    flattened_result[field] = value.get(sub_key, "")
+            elif registry.field_type(key) == MULTI_SELECT and isinstance(value, list):
+                # Store multi-select options (supplements) as a JSON string
+                flattened_result[key] = json.dumps(value) if value else "[]"
             else:
                 flattened_result[key] = value
         
+        # Check if the result contains meaningful wellness data
+        is_meaningful = registry.has_wellness_data(flattened_result)
+        
         return flattened_result, is_meaningful
     except json.JSONDecodeError:
         raise ValueError("Failed to parse Claude's response as JSON")
\ No newline at end of file
@@ -1,68 +1,112 @@
 import csv
+import io
 import json
+import logging
 import os
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
+from services.daily_logs_store import DailyLogsStore, get_store, get_store_path
+from services.merge_engine import ItemList, acquire_item_list, release_item_list
+from services.schema_registry import APPEND, OVERWRITE, UNION, as_list, get_schema_registry
+from services.daily_stats import get_rollups, get_summary, rebuild_daily_stats, record_merge
+from services.read_cache import get_daily_logs_cache, read_cache_enabled
+from services.write_coordinator import date_lock, file_lock
+from services.metrics import DAILY_LOG_MERGES, stage
+from services.search_index import index_daily_log, reindex_daily_logs
+from services.analytics import get_daily_series, trends
+from services.data_paths import user_path
+
+logger = logging.getLogger(__name__)
 
 def get_daily_logs_path():
-    return "data/daily_logs.csv"
+    """Legacy CSV location; imported into the store on first use"""
+    return user_path("daily_logs.csv")
+
+def daily_log_fields():
+    """Column order of the daily logs CSV export, custom fields included"""
+    return get_schema_registry().columns()
+
+def get_daily_logs_store() -> DailyLogsStore:
+    return get_store(legacy_csv_path=get_daily_logs_path())
+
+def _as_text(value) -> str:
+    # Append fields are stored as item lists; the CSV and API show them comma-joined
+    return ", ".join(value) if isinstance(value, list) else value
+
+def _complete_row(row: Dict) -> Dict:
+    """Expand a stored (sparse) row to every CSV column, as the CSV reader used to return"""
+    return {field: _as_text(row.get(field, "")) for field in daily_log_fields()}
+
+def _stored_row(row: Dict) -> Dict:
+    """Keep only the non-empty CSV columns of a row for storage, append fields as item lists"""
+    stored = {}
+    for field in daily_log_fields():
+        value = row.get(field)
+        if should_append_field(field) and value:
+            value = ItemList.from_value(value).items
+        if value not in (None, "", []):
+            stored[field] = value
+    return stored
 
 def read_daily_logs() -> Dict[str, Dict]:
     """Read existing daily logs and return as dict keyed by date"""
-    logs_path = get_daily_logs_path()
     daily_logs = {}
     
-    if not os.path.exists(logs_path):
-        return daily_logs
-    
     try:
-        with open(logs_path, "r", newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                date = row.get("date")
-                if date:
-                    daily_logs[date] = row
+        for date, row in get_daily_logs_store().all().items():
+            daily_logs[date] = _complete_row(row)
     except Exception as e:
-        print(f"Error reading daily logs: {e}")
+        logger.error("Error reading daily logs: %s", e)
     
     return daily_logs
 
+def daily_logs_lock():
+    """Hold out every merge into the daily logs, from this and other processes"""
+    return file_lock(get_daily_logs_store().path)
+
 def save_daily_logs(daily_logs: Dict[str, Dict]):
-    """Save daily logs dict back to CSV"""
-    logs_path = get_daily_logs_path()
-    
-    os.makedirs(os.path.dirname(logs_path), exist_ok=True)
-    
-    fieldnames = [
-        "date", "breakfast_description", "lunch_description", 
-        "dinner_description", "snack_description", "mood_morning", "mood_afternoon", "mood_night",
-        "hydration", "sleep", "activity", "notes", "alcohol",
-        "caffeine", "marijuana", "exercise_type", "supplements", "last_updated"
-    ]
-    
-    with open(logs_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        # Sort by date for consistent output
-        for date in sorted(daily_logs.keys()):
-            row = daily_logs[date]
-            # Ensure all fields exist
-            complete_row = {field: row.get(field, "") for field in fieldnames}
-            writer.writerow(complete_row)
+    """Replace all daily logs with the given dict (bulk operations only)"""
+    with daily_logs_lock():
+        replace_daily_logs(daily_logs)
+
+def replace_daily_logs(daily_logs: Dict[str, Dict]):
+    """save_daily_logs for callers already holding daily_logs_lock()"""
+    store = get_daily_logs_store()
+    store.replace_all(
+        {date: _stored_row(row) for date, row in sorted(daily_logs.items())}
+    )
+    rebuild_daily_stats(store)
+    reindex_daily_logs(store.iter_rows())
+    get_daily_logs_cache(store.path).invalidate()
+    get_daily_series(store.path).invalidate()
+
+def iter_daily_logs(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    after: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+    """Stream daily logs in date order without loading them all"""
+    for row in get_daily_logs_store().iter_rows(date_from, date_to, after, limit):
+        yield _complete_row(row)
+
+def has_daily_logs() -> bool:
+    return get_daily_logs_store().count() > 0
+
+def iter_daily_logs_csv() -> Iterator[str]:
+    """Generate the daily logs CSV export on demand, one chunk per row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=daily_log_fields())
+    writer.writeheader()
+    
+    for row in get_daily_logs_store().iter_rows():
+        writer.writerow(_complete_row(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    if buffer.tell():
+        yield buffer.getvalue()
 
 def should_append_field(field: str) -> bool:
     """Determine if a field should append new values or overwrite"""
-    # Fields that should append (accumulative throughout the day)
-    append_fields = [
-        "breakfast_description", "lunch_description", "dinner_description", 
-        "snack_description", "hydration", "activity", "notes"
-    ]
-    
-    # Fields that should overwrite (latest value takes precedence)
-    overwrite_fields = ["sleep", "mood_morning", "mood_afternoon", "mood_night", "alcohol", "caffeine", "marijuana", "exercise_type"]
-    
-    return field in append_fields
+    return get_schema_registry().merge_policy(field) == APPEND
 
 def merge_field_value(existing_value: str, new_value: str, field: str) -> str:
     """Smart merge of field values based on field type"""
@@ -72,45 +116,20 @@ def merge_field_value(existing_value: str, new_value: str, field: str) -> str:
     if not new_value or not new_value.strip():
         return existing_value
     
-    # Clean up values
-    existing_clean = existing_value.strip()
-    new_clean = new_value.strip()
-    
     # For overwrite fields (sleep, mood), always use the new value
     if not should_append_field(field):
-        return new_clean
-    
-    # For append fields, check for duplicates more intelligently
-    existing_lower = existing_clean.lower()
-    new_lower = new_clean.lower()
-    
-    # Check if the new value is already contained in existing (avoid duplicates)
-    if new_lower in existing_lower:
-        return existing_clean  # Keep existing since it already contains the new value
-    
-    if existing_lower in new_lower:
-        return new_clean  # New value is more detailed, use it
-    
-    # Check if they're similar items (for snacks/drinks)
-    # Split existing values by commas to check individual items
-    existing_items = [item.strip().lower() for item in existing_clean.split(',')]
-    
-    # If the new value is very similar to any existing item, don't add it
-    for existing_item in existing_items:
-        if (len(new_lower) > 3 and new_lower in existing_item) or \
-           (len(existing_item) > 3 and existing_item in new_lower):
-            # Similar items found, keep the longer/more detailed one
-            if len(new_clean) > len(existing_item):
-                # Replace the existing item with the new one
-                existing_items_original = [item.strip() for item in existing_clean.split(',')]
-                for i, orig_item in enumerate(existing_items_original):
-                    if orig_item.lower() == existing_item:
-                        existing_items_original[i] = new_clean
-                        return ', '.join(existing_items_original)
-            return existing_clean
-    
-    # No duplicates found, append the new value
-    return f"{existing_clean}, {new_clean}"
+        return new_value.strip()
+    
+    # For append fields, dedupe and keep the more detailed of similar items
+    items = acquire_item_list(existing_value)
+    items.merge(new_value)
+    merged_value = str(items)
+    release_item_list(items)
+    return merged_value
+
+def has_meaningful_data(parsed_data: Dict) -> bool:
+    """True if parsed data contains wellness information worth merging into a daily log"""
+    return get_schema_registry().has_meaningful_data(parsed_data)
 
 def merge_daily_entry(parsed_data: Dict, target_date: Optional[str] = None) -> bool:
     """
@@ -122,31 +141,58 @@ def merge_daily_entry(parsed_data: Dict, target_date: Optional[str] = None) -> b
         target_date = parsed_data.get("date", datetime.now().strftime("%Y-%m-%d"))
     
     # Check if parsed data contains meaningful wellness information
-    meaningful_fields = [
-        "breakfast_description", "lunch_description", "dinner_description", 
-        "snack_description", "mood_morning", "mood_afternoon", "mood_night", 
-        "hydration", "sleep", "activity", "notes",
-        "alcohol", "caffeine", "marijuana", "exercise_type", "supplements"
-    ]
-    
-    has_meaningful_data = any(
-        parsed_data.get(field) and str(parsed_data.get(field)).strip() 
-        for field in meaningful_fields
-    )
-    
-    if not has_meaningful_data:
-        print(f"Skipping daily log update - no meaningful wellness data found")
+    if not has_meaningful_data(parsed_data):
+        logger.debug("Skipping daily log update - no meaningful wellness data found")
+        DAILY_LOG_MERGES.inc(result="skipped")
         return False
     
-    # Read existing daily logs
-    daily_logs = read_daily_logs()
-    
-    # Get existing entry for this date or create new one
-    existing_entry = daily_logs.get(target_date, {"date": target_date})
-    
-    # Merge new data into existing entry with smart field merging
+    # Serialize merges of the same date (threads and processes); other dates run in parallel
+    store = get_daily_logs_store()
+    with stage("merge"), date_lock(store.path, target_date):
+        # Read only the entry for this date, or create a new one
+        previous_row = store.get(target_date)
+        existing_entry = previous_row or {"date": target_date}
+        updated_entry = merge_entry(existing_entry, parsed_data)
+        
+        # Write back just this day, with the derived stats in the same transaction
+        stored_row = _stored_row(updated_entry)
+        with store.transaction() as conn:
+            store.write_row(conn, target_date, stored_row)
+            record_merge(conn, previous_row, stored_row)
+        get_daily_logs_cache(store.path).update(_complete_row(stored_row))
+        get_daily_series(store.path).update(stored_row)
+        index_daily_log(stored_row)
+    
+    DAILY_LOG_MERGES.inc(result="merged")
+    logger.info("Updated daily log for %s", target_date)
+    return True
+
+def _merge_append(existing_value, value, field: str) -> list:
+    # Kept as an item list across merges; existing rows may still hold text
+    items = acquire_item_list(existing_value)
+    items.merge(str(value))
+    merged_value = items.items
+    release_item_list(items)
+    return merged_value
+
+def _merge_union(existing_value, value, field: str) -> str:
+    # Options stay in the order first logged; a message naming none keeps the day's
+    combined = list(dict.fromkeys(as_list(existing_value) + as_list(value)))
+    return json.dumps(combined) if combined else ""
+
+def _merge_overwrite(existing_value, value, field: str) -> str:
+    return merge_field_value(existing_value, str(value), field)
+
+# Merge function per policy; the registry maps each field to its policy
+_MERGERS = {APPEND: _merge_append, UNION: _merge_union, OVERWRITE: _merge_overwrite}
+
+def merge_entry(existing_entry: Dict, parsed_data: Dict) -> Dict:
+    """Merge parsed data into a copy of an existing daily entry with smart field merging"""
     updated_entry = existing_entry.copy()
     updated_entry["last_updated"] = datetime.now().isoformat()
+    merge_policy = get_schema_registry().merge_policy
+    # Checked once: formatting every field's values is the costly part of the message
+    debug = logger.isEnabledFor(logging.DEBUG)
     
     for field, value in parsed_data.items():
         if field == "date":
@@ -154,43 +200,43 @@ def merge_daily_entry(parsed_data: Dict, target_date: Optional[str] = None) -> b
         
         if value is not None:  # Process all non-None values (including False, 0, [])
             existing_value = existing_entry.get(field, "")
-            
-            # Special handling for different field types
-            if field == "supplements" and isinstance(value, list):
-                # Merge supplement arrays
-                existing_supplements = []
-                if existing_value:
-                    try:
-                        existing_supplements = json.loads(existing_value) if existing_value.startswith('[') else existing_value.split(', ')
-                    except:
-                        existing_supplements = existing_value.split(', ') if existing_value else []
-                
-                # Combine and deduplicate
-                combined_supplements = list(set(existing_supplements + value))
-                merged_value = json.dumps(combined_supplements) if combined_supplements else ""
-            else:
-                merged_value = merge_field_value(existing_value, str(value), field)
-            
+            merged_value = _MERGERS[merge_policy(field)](existing_value, value, field)
             updated_entry[field] = merged_value
             
-            print(f"Field '{field}': '{existing_value}' + '{value}' = '{merged_value}'")
+            if debug:
+                logger.debug("Field %r: %r + %r = %r", field, _as_text(existing_value), value,
+                             _as_text(merged_value))
     
-    # Update the daily logs dict
-    daily_logs[target_date] = updated_entry
-    
-    # Save back to CSV
-    save_daily_logs(daily_logs)
-    
-    print(f"Updated daily log for {target_date}")
-    return True
+    return updated_entry
+
+def _load_daily_logs() -> list:
+    return [_complete_row(row) for row in get_daily_logs_store().iter_rows()]
 
 def get_daily_logs_for_api() -> list:
     """Get daily logs formatted for API response"""
-    daily_logs = read_daily_logs()
-    
-    # Convert dict to list format expected by frontend
-    logs_list = []
-    for date, log_data in daily_logs.items():
-        logs_list.append(log_data)
+    # List format expected by frontend, in date order
+    if read_cache_enabled():
+        return get_daily_logs_cache(get_store_path()).get_all(_load_daily_logs)
+    return _load_daily_logs()
+
+def get_daily_log(date: str) -> Optional[Dict]:
+    """Get one day's log formatted for API response, or None"""
+    if read_cache_enabled():
+        return get_daily_logs_cache(get_store_path()).get(date, _load_daily_logs)
     
-    return logs_list
\ No newline at end of file
+    row = get_daily_logs_store().get(date)
+    return _complete_row(row) if row else None
+
+def get_daily_summary() -> Dict:
+    """Precomputed streaks and rollups for the UI"""
+    return get_summary(get_daily_logs_store())
+
+def get_daily_rollups() -> Dict:
+    """Days logged per week and per month"""
+    return get_rollups(get_daily_logs_store())
+
+def get_daily_trends(fields: Optional[List[str]] = None, date_from: Optional[str] = None,
+                     date_to: Optional[str] = None, window: int = 7, lag: int = 0) -> Dict:
+    """Rolling averages, weekly/monthly aggregates and correlations of the numeric fields"""
+    store = get_daily_logs_store()
+    return trends(get_daily_series(store.path), store.iter_rows, fields, date_from, date_to, window, lag)
@@ -0,0 +1,186 @@
+"""SQLite storage engine for daily logs: one row per date, updated in place"""
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from services.metrics import count_io
+from services.data_paths import user_path
+
+logger = logging.getLogger(__name__)
+
+def get_store_path():
+    return user_path("daily_logs.db")
+
+class DailyLogsStore:
+    """
+    Daily log rows keyed by date in a WAL-mode SQLite database.
+    Each row is stored as a JSON object so a single day is read or written by primary key.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS daily_logs (
+                date TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, date: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM daily_logs WHERE date = ?", (date,)).fetchone()
+        if row is None:
+            return None
+        count_io("daily_logs", "read", len(row[0]))
+        return json.loads(row[0])
+
+    def put(self, date: str, entry: Dict):
+        with self.transaction() as conn:
+            self.write_row(conn, date, entry)
+
+    @staticmethod
+    def write_row(conn: sqlite3.Connection, date: str, entry: Dict):
+        """Upsert one row on a connection inside transaction()"""
+        data = json.dumps(entry)
+        conn.execute("INSERT OR REPLACE INTO daily_logs (date, data) VALUES (?, ?)", (date, data))
+        count_io("daily_logs", "written", len(data))
+
+    @contextmanager
+    def reading(self) -> Iterator[sqlite3.Connection]:
+        """The shared connection, for short reads of tables kept beside the rows"""
+        with self._lock:
+            yield self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Write transaction that takes SQLite's write lock up front, so related writes
+        (a row and the stats derived from it) commit together across processes.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def iter_rows(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  after: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yield rows in date order, optionally limited to an inclusive date range.
+        after skips dates up to and including it (a pagination cursor).
+        """
+        query = "SELECT data FROM daily_logs WHERE date >= ? AND date <= ? AND date > ? ORDER BY date"
+        params = (date_from or "", date_to or "9999-12-31", after or "")
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+
+        # A separate connection streams rows without holding the writer's lock. Streaming
+        # responses resume the generator on whichever worker thread is free, so the
+        # connection may not stay on the thread that opened it
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        read = 0
+        try:
+            for (data,) in conn.execute(query, params):
+                read += len(data)
+                yield json.loads(data)
+        finally:
+            conn.close()
+            count_io("daily_logs", "read", read)
+
+    def all(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT date, data FROM daily_logs ORDER BY date").fetchall()
+        count_io("daily_logs", "read", sum(len(data) for _, data in rows))
+        return {date: json.loads(data) for date, data in rows}
+
+    def replace_all(self, daily_logs: Dict[str, Dict]):
+        """Swap in a complete set of rows in one transaction"""
+        written = [0]
+
+        def rows():
+            for date, entry in daily_logs.items():
+                data = json.dumps(entry)
+                written[0] += len(data)
+                yield date, data
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM daily_logs")
+                self._conn.executemany("INSERT INTO daily_logs (date, data) VALUES (?, ?)", rows())
+        count_io("daily_logs", "written", written[0])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM daily_logs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def import_csv(self, csv_path: str) -> int:
+        """Load rows from a daily_logs.csv file, overwriting dates already present"""
+        imported = 0
+        with open(csv_path, "r", newline="", encoding="utf-8") as csvfile:
+            reader = csv.DictReader(csvfile)
+            with self._lock:
+                with self._conn:
+                    for row in reader:
+                        date = row.get("date")
+                        if not date:
+                            continue
+                        entry = {field: value for field, value in row.items() if field and value}
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO daily_logs (date, data) VALUES (?, ?)",
+                            (date, json.dumps(entry)),
+                        )
+                        imported += 1
+        return imported
+
+_stores: Dict[str, DailyLogsStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(legacy_csv_path: Optional[str] = None) -> DailyLogsStore:
+    """
+    Return the store for the current data path, opening it on first use.
+    An existing daily_logs.csv is imported once and then renamed out of the way.
+    """
+    path = get_store_path()
+
+    store = _stores.get(path)
+    if store is not None:
+        return store
+
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = DailyLogsStore(path)
+            if legacy_csv_path and os.path.exists(legacy_csv_path):
+                migrate_csv(store, legacy_csv_path)
+            _stores[path] = store
+    return store
+
+def migrate_csv(store: DailyLogsStore, csv_path: str):
+    """Import a legacy daily_logs.csv into the store and keep the file as a backup"""
+    imported = store.import_csv(csv_path)
+
+    backup_path = f"{os.path.splitext(csv_path)[0]}_migrated_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+    os.rename(csv_path, backup_path)
+    logger.info("Migrated %d daily logs from %s (backup at %s)", imported, csv_path, backup_path)
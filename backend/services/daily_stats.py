@@ -0,0 +1,176 @@
+"""
+Derived state over daily logs, maintained incrementally on every merge:
+activity streaks, days logged per week/month and per-field fill counts.
+Stored next to the rows in the daily logs database so reads are a few key lookups.
+"""
+
+import sqlite3
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, Optional
+
+from services.daily_logs_store import DailyLogsStore
+
+STATS_VERSION = 1
+
+# Row keys that are bookkeeping rather than logged data
+_NOT_COUNTED = ("date", "last_updated")
+
+def ensure_schema(conn: sqlite3.Connection):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS daily_stats (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )"""
+    )
+    # Maximal runs of consecutive logged dates
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS date_runs (
+            start TEXT PRIMARY KEY,
+            end TEXT NOT NULL UNIQUE
+        )"""
+    )
+
+def _parse_date(value: str) -> Optional[date_type]:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+def _week_key(day: date_type) -> str:
+    year, week, _ = day.isocalendar()
+    return f"week:{year}-W{week:02d}"
+
+def _month_key(day: date_type) -> str:
+    return f"month:{day.strftime('%Y-%m')}"
+
+def _increment(conn: sqlite3.Connection, key: str, amount: int = 1):
+    conn.execute(
+        "INSERT INTO daily_stats (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+        (key, amount),
+    )
+
+def _get(conn: sqlite3.Connection, key: str) -> int:
+    row = conn.execute("SELECT value FROM daily_stats WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+def _add_date_to_runs(conn: sqlite3.Connection, day: date_type):
+    """Join the new date with the runs ending the day before and starting the day after"""
+    previous_day = (day - timedelta(days=1)).isoformat()
+    next_day = (day + timedelta(days=1)).isoformat()
+
+    left = conn.execute("SELECT start FROM date_runs WHERE end = ?", (previous_day,)).fetchone()
+    right = conn.execute("SELECT end FROM date_runs WHERE start = ?", (next_day,)).fetchone()
+
+    start = left[0] if left else day.isoformat()
+    end = right[0] if right else day.isoformat()
+
+    if left:
+        conn.execute("DELETE FROM date_runs WHERE start = ?", (start,))
+    if right:
+        conn.execute("DELETE FROM date_runs WHERE start = ?", (next_day,))
+    conn.execute("INSERT INTO date_runs (start, end) VALUES (?, ?)", (start, end))
+
+    length = (_parse_date(end) - _parse_date(start)).days + 1
+    if length > _get(conn, "longest_streak"):
+        conn.execute(
+            "INSERT OR REPLACE INTO daily_stats (key, value) VALUES ('longest_streak', ?)", (length,)
+        )
+
+def record_merge(conn: sqlite3.Connection, previous_row: Optional[Dict], row: Dict):
+    """Update the derived state for one stored row; call inside the row's write transaction"""
+    ensure_schema(conn)
+
+    if previous_row is None:
+        _increment(conn, "days_logged")
+        day = _parse_date(row.get("date"))
+        if day is not None:
+            _increment(conn, _week_key(day))
+            _increment(conn, _month_key(day))
+            _add_date_to_runs(conn, day)
+
+    previous_row = previous_row or {}
+    for field in set(previous_row) | set(row):
+        if field in _NOT_COUNTED:
+            continue
+        was_filled = bool(previous_row.get(field))
+        is_filled = bool(row.get(field))
+        if is_filled != was_filled:
+            _increment(conn, f"fill:{field}", 1 if is_filled else -1)
+
+def rebuild_daily_stats(store: DailyLogsStore) -> int:
+    """Recompute all derived state from the stored rows; returns the number of rows seen"""
+    rows = 0
+    with store.transaction() as conn:
+        ensure_schema(conn)
+        conn.execute("DELETE FROM daily_stats")
+        conn.execute("DELETE FROM date_runs")
+        for row in store.iter_rows():
+            record_merge(conn, None, row)
+            rows += 1
+        conn.execute(
+            "INSERT INTO daily_stats (key, value) VALUES ('version', ?)", (STATS_VERSION,)
+        )
+    return rows
+
+# Stores whose derived state is known to be current
+_built_paths = set()
+
+def _ensure_built(store: DailyLogsStore):
+    """Build the state once for databases created before it was maintained"""
+    if store.path in _built_paths:
+        return
+
+    with store.transaction() as conn:
+        ensure_schema(conn)
+        built = _get(conn, "version") == STATS_VERSION
+    if not built:
+        rebuild_daily_stats(store)
+    _built_paths.add(store.path)
+
+def current_streak(conn: sqlite3.Connection, today: date_type) -> int:
+    """
+    Consecutive logged days ending today, 0 if today is not logged.
+    Matches the previous sort-and-walk calculation, including returning 0 when a
+    date after today has been logged.
+    """
+    latest = conn.execute("SELECT MAX(end) FROM date_runs").fetchone()[0]
+    if latest != today.isoformat():
+        return 0
+
+    start = conn.execute("SELECT start FROM date_runs WHERE end = ?", (latest,)).fetchone()[0]
+    return (today - _parse_date(start)).days + 1
+
+def get_summary(store: DailyLogsStore, today: Optional[date_type] = None) -> Dict:
+    """Precomputed values for /recent: streaks, this week/month and field fill counts"""
+    today = today or datetime.now().date()
+    _ensure_built(store)
+
+    with store.reading() as conn:
+        fill_counts = {
+            key[len("fill:"):]: value
+            for key, value in conn.execute("SELECT key, value FROM daily_stats WHERE key LIKE 'fill:%'")
+            if value
+        }
+        return {
+            "current_streak": current_streak(conn, today),
+            "longest_streak": _get(conn, "longest_streak"),
+            "days_logged": _get(conn, "days_logged"),
+            "days_logged_this_week": _get(conn, _week_key(today)),
+            "days_logged_this_month": _get(conn, _month_key(today)),
+            "field_fill_counts": fill_counts,
+        }
+
+def get_rollups(store: DailyLogsStore) -> Dict:
+    """Days logged for every week and month"""
+    _ensure_built(store)
+
+    with store.reading() as conn:
+        rows = conn.execute(
+            "SELECT key, value FROM daily_stats WHERE key LIKE 'week:%' OR key LIKE 'month:%' ORDER BY key"
+        ).fetchall()
+
+    return {
+        "days_per_week": {key[len("week:"):]: value for key, value in rows if key.startswith("week:")},
+        "days_per_month": {key[len("month:"):]: value for key, value in rows if key.startswith("month:")},
+    }
@@ -0,0 +1,106 @@
+"""
+Where the data files live, per user.
+
+DATA_ROOT (default "data") holds the files shared by everyone (custom fields, the Claude
+result cache) and the default user's data, as a single-user install always had. Requests
+with an X-User-Id header use DATA_ROOT/users/<id> instead. The user is kept in a context
+variable for the request, and the threads it runs code in, so every get_*_path() function
+returns the current user's file. The locks, stores, caches and indexes are all keyed by
+those paths, so each user gets their own and one user's writes never wait on another's.
+"""
+
+import contextvars
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import List, Optional
+
+_USER_ID_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+USER_HEADER = b"x-user-id"
+
+_current_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_user", default=None)
+
+def get_data_root() -> str:
+    return os.getenv("DATA_ROOT", "data")
+
+def require_user_id() -> bool:
+    return os.getenv("REQUIRE_USER_ID", "0").lower() in ("1", "true", "yes")
+
+def validate_user_id(user_id: str) -> str:
+    """User ids become directory names: letters, digits, '_', '.' and '-' only"""
+    if not _USER_ID_RE.fullmatch(user_id or "") or user_id in (".", ".."):
+        raise ValueError(f"Invalid user id {user_id!r}")
+    return user_id
+
+def current_user() -> Optional[str]:
+    """The user for the current request or script, or None for the default user"""
+    return _current_user.get()
+
+@contextmanager
+def as_user(user_id: Optional[str]):
+    """Run a block with user_id's data (None for the default user)"""
+    token = _current_user.set(validate_user_id(user_id) if user_id is not None else None)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+def set_current_user(user_id: Optional[str]):
+    """Use user_id's data from here on in this context; for scripts (--user)"""
+    _current_user.set(validate_user_id(user_id) if user_id is not None else None)
+
+def get_user_dir(user_id: Optional[str] = None) -> str:
+    user_id = user_id if user_id is not None else current_user()
+    if user_id is None:
+        return get_data_root()
+    return os.path.join(get_data_root(), "users", user_id)
+
+def user_path(name: str) -> str:
+    """A data file of the current user"""
+    return os.path.join(get_user_dir(), name)
+
+def shared_path(name: str) -> str:
+    """A data file shared by all users"""
+    return os.path.join(get_data_root(), name)
+
+def list_users() -> List[Optional[str]]:
+    """The default user (None), then every user with a data directory"""
+    users_dir = os.path.join(get_data_root(), "users")
+    names = sorted(os.listdir(users_dir)) if os.path.isdir(users_dir) else []
+    return [None] + [name for name in names
+                     if _USER_ID_RE.fullmatch(name) and os.path.isdir(os.path.join(users_dir, name))]
+
+class UserMiddleware:
+    """ASGI middleware binding each HTTP request to the user in its X-User-Id header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        user_id = next((value.decode("latin-1").strip() for name, value in scope["headers"]
+                        if name == USER_HEADER), None) or None
+        error = None
+        if user_id is None and require_user_id() and scope["path"] not in ("/", "/metrics"):
+            error = "The X-User-Id header is required"
+        elif user_id is not None:
+            try:
+                validate_user_id(user_id)
+            except ValueError as e:
+                error = str(e)
+
+        if error is not None:
+            body = json.dumps({"detail": error}).encode("utf-8")
+            await send({"type": "http.response.start", "status": 400,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        with as_user(user_id):
+            await self.app(scope, receive, send)
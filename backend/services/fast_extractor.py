@@ -0,0 +1,168 @@
+"""
+Deterministic local extractor for short, formulaic messages ("2 coffees", "slept 7 hours").
+Produces the same flattened structure as claude_service so Claude can be skipped when
+every part of the message is understood.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from services.schema_registry import MULTI_SELECT, get_schema_registry
+
+# Caffeine estimates from the prompt: coffee ≈ 95mg, energy drink ≈ 150mg, tea ≈ 50mg
+CAFFEINE_MG = {
+    "coffee": 95, "espresso": 95, "latte": 95, "cappuccino": 95, "americano": 95,
+    "cold brew": 95, "energy drink": 150, "red bull": 150, "monster": 150,
+    "tea": 50, "green tea": 50, "black tea": 50, "matcha": 50,
+}
+
+ALCOHOL_DRINKS = (
+    "beer", "beers", "wine", "wines", "glass of wine", "glasses of wine", "cocktail", "cocktails",
+    "shot", "shots", "drink", "drinks", "seltzer", "seltzers", "margarita", "margaritas",
+)
+
+SUPPLEMENTS = {
+    "vitamin a", "vitamin b", "vitamin b12", "b12", "vitamin c", "vitamin d", "vitamin d3",
+    "vitamin e", "vitamin k", "multivitamin", "magnesium", "zinc", "iron", "calcium",
+    "fish oil", "omega 3", "omega-3", "creatine", "melatonin", "probiotic", "probiotics",
+    "ashwagandha", "collagen", "electrolytes", "protein powder", "biotin", "turmeric",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "a couple of": 2, "couple of": 2,
+}
+
+# Anything that changes the target date or needs interpretation goes to Claude
+_DEFER_RE = re.compile(
+    r"\b(yesterday|last night|tonight|this morning|this afternoon|this evening|tomorrow|"
+    r"ago|feel|feeling|felt|mood|breakfast|lunch|dinner|ate|eat|snack|not|no|didn't|don't|"
+    r"skipped|instead|but|maybe|think)\b"
+)
+
+_CLAUSE_SPLIT_RE = re.compile(r"\s*(?:,|;|\.(?!\d)|\band\b|\bplus\b|&)\s*")
+
+_COUNT = r"(?P<count>\d+|a couple of|couple of|" + "|".join(
+    sorted((w for w in NUMBER_WORDS if "couple" not in w), key=len, reverse=True)
+) + r")"
+
+_CAFFEINE_MG_RE = re.compile(r"^(?:had |took )?(?P<mg>\d+)\s?mg (?:of )?caffeine$")
+_CAFFEINE_DRINK_RE = re.compile(
+    r"^(?:had |drank |drink )?" + _COUNT + r"?\s*(?:cups? of |mugs? of |cans? of )?"
+    r"(?P<drink>" + "|".join(sorted(CAFFEINE_MG, key=len, reverse=True)) + r")(?:e?s)?$"
+)
+_SLEEP_RE = re.compile(
+    r"^(?:i )?(?:slept|got|had) (?P<hours>\d+(?:\.\d+)?)\s?(?:hours?|hrs?|h)(?: of sleep)?$"
+)
+_WATER_RE = re.compile(
+    r"^(?:had |drank |drink )?(?P<amount>(?:\d+(?:\.\d+)?\s?(?:ml|l|liters?|litres?|oz)|"
+    + _COUNT + r" (?:glass(?:es)?|bottles?|cups?)) (?:of )?water)$"
+)
+_ALCOHOL_RE = re.compile(
+    r"^(?:had |drank )?" + _COUNT + r"?\s*(?P<drink>" + "|".join(ALCOHOL_DRINKS) + r")$"
+)
+_SUPPLEMENT_RE = re.compile(r"^(?:took|take|taking)\s+(?:my\s+)?(?P<item>.+?)(?: pills?| supplements?)?$")
+_STEPS_RE = re.compile(r"^(?:walked |did )?(?P<steps>\d[\d,]*\s?k? steps)$")
+
+def _count(value: Optional[str]) -> int:
+    if not value:
+        return 1
+    if value.isdigit():
+        return int(value)
+    return NUMBER_WORDS.get(value, 1)
+
+def _title(item: str) -> str:
+    return " ".join(word if word.isupper() else word.capitalize() for word in item.split())
+
+def _match_clause(clause: str, found: Dict) -> bool:
+    """Apply the rules to one clause, recording extracted values in found"""
+    match = _CAFFEINE_MG_RE.match(clause)
+    if match:
+        found["caffeine"] = found.get("caffeine", 0) + int(match.group("mg"))
+        return True
+
+    match = _CAFFEINE_DRINK_RE.match(clause)
+    if match:
+        mg = CAFFEINE_MG[match.group("drink")] * _count(match.group("count"))
+        found["caffeine"] = found.get("caffeine", 0) + int(mg)
+        return True
+
+    match = _SLEEP_RE.match(clause)
+    if match:
+        found["sleep"] = f"{match.group('hours')} hours"
+        return True
+
+    match = _WATER_RE.match(clause)
+    if match:
+        found.setdefault("hydration", []).append(match.group("amount"))
+        return True
+
+    match = _ALCOHOL_RE.match(clause)
+    if match:
+        found["alcohol"] = True
+        return True
+
+    match = _STEPS_RE.match(clause)
+    if match:
+        found.setdefault("activity", []).append(f"Walked {match.group('steps')}")
+        return True
+
+    match = _SUPPLEMENT_RE.match(clause)
+    if match and match.group("item") in SUPPLEMENTS:
+        found.setdefault("supplements", []).append(_title(match.group("item")))
+        return True
+
+    if clause in SUPPLEMENTS and "supplements" in found:
+        # "took vitamin d and magnesium": later items inherit the verb
+        found["supplements"].append(_title(clause))
+        return True
+
+    return False
+
+def extract_locally(user_input: str, reference_time: Optional[datetime] = None) -> Tuple[Dict, bool, float]:
+    """
+    Try to structure the input without Claude.
+    Returns (structured_data, is_meaningful, confidence); confidence is 1.0 only when
+    every clause of the message was recognized.
+    """
+    now = reference_time or datetime.now()
+    text = user_input.strip().lower().rstrip("!")
+
+    if not text or _DEFER_RE.search(text):
+        return {}, False, 0.0
+
+    clauses: List[str] = [c.strip() for c in _CLAUSE_SPLIT_RE.split(text) if c and c.strip()]
+    if not clauses:
+        return {}, False, 0.0
+
+    found: Dict = {}
+    matched = sum(1 for clause in clauses if _match_clause(clause, found))
+    confidence = matched / len(clauses)
+
+    if not found:
+        return {}, False, 0.0
+
+    # Same keys Claude's flattened reply carries, unmentioned fields left as None
+    registry = get_schema_registry()
+    structured_data = {
+        "date": now.strftime("%Y-%m-%d"),
+        "timestamp": now.isoformat(),
+    }
+    for spec in registry.fields():
+        value = found.get(spec.name)
+        if spec.type == MULTI_SELECT:
+            structured_data[spec.name] = json.dumps(value) if value else "[]"
+        else:
+            structured_data[spec.name] = ", ".join(value) if isinstance(value, list) else value
+
+    # Same meaningful test claude_service applies to Claude's fields
+    return structured_data, registry.has_wellness_data(structured_data), confidence
+
+def fast_path_enabled() -> bool:
+    return os.getenv("FAST_PATH_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def min_confidence() -> float:
+    return float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 1.0))
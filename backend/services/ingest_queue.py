@@ -0,0 +1,348 @@
+"""
+Write-behind ingestion for /log: the raw message is appended and a job id returned at
+once, while a pool of background workers does the Claude extraction and the daily log
+merge. Jobs are recorded in each user's ingest_jobs.db so unfinished ones (and raw rows
+appended without a job, e.g. by a crash in between) are replayed after a restart. The
+workers are shared; each job carries its user, whose data it is merged into.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from services.raw_segments import RawLog
+from services.raw_tail import is_valid_message
+from services.upstream_guard import UpstreamUnavailable
+from services.data_paths import as_user, current_user, list_users, user_path
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("done", "failed")
+
+def get_jobs_path() -> str:
+    return user_path("ingest_jobs.db")
+
+def log_queue_enabled() -> bool:
+    return os.getenv("LOG_QUEUE_ENABLED", "0").lower() in ("1", "true", "yes")
+
+def queue_workers() -> int:
+    return int(os.getenv("LOG_QUEUE_WORKERS", 4))
+
+def queue_max_size() -> int:
+    return int(os.getenv("LOG_QUEUE_MAX_SIZE", 100))
+
+def _parse_timestamp(timestamp: str) -> Optional[datetime]:
+    """A raw row timestamp as naive local time, so ISO variants (Z, offsets) order correctly"""
+    try:
+        parsed = datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def _state_timestamp(parsed: datetime) -> str:
+    # One fixed format, so the stored timestamps also compare correctly as text
+    return parsed.isoformat(timespec="microseconds")
+
+class JobStore:
+    """
+    Job rows plus the timestamp of the newest raw row known to have a job. A new store
+    starts that timestamp at its creation, so raw rows saved from then on without a job
+    are replayed, while older history (which went through the sync path) is not.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                result TEXT,
+                error TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO ingest_state (key, value) VALUES ('last_timestamp', ?)",
+            (_state_timestamp(datetime.now()),),
+        )
+        self._conn.commit()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            try:
+                yield self._conn
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def add(self, timestamp: str, message: str, status: str = "queued") -> str:
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        parsed = _parse_timestamp(timestamp)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, timestamp, message, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, timestamp, message, status, now, now),
+            )
+            if parsed is not None:
+                conn.execute(
+                    "INSERT INTO ingest_state (key, value) VALUES ('last_timestamp', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (_state_timestamp(parsed),),
+                )
+        return job_id
+
+    def update(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, result = ?, error = ? WHERE id = ?",
+                (status, datetime.now().isoformat(),
+                 json.dumps(result) if result is not None else None, error, job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, timestamp, message, status, created_at, updated_at, result, error "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[6]) if row[6] else {}
+        return {
+            "job_id": row[0],
+            "timestamp": row[1],
+            "message": row[2],
+            "status": row[3],
+            "created_at": row[4],
+            "updated_at": row[5],
+            "data": result.get("data"),
+            "daily_log_updated": result.get("daily_log_updated", False),
+            "error": row[7],
+        }
+
+    def unfinished(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, timestamp, message FROM jobs WHERE status NOT IN (?, ?) ORDER BY timestamp",
+                FINISHED,
+            ).fetchall()
+        return [{"job_id": row[0], "timestamp": row[1], "message": row[2]} for row in rows]
+
+    def last_timestamp(self) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM ingest_state WHERE key = 'last_timestamp'"
+            ).fetchone()
+        return row[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def raw_rows_after(raw_log: RawLog, timestamp: str) -> List[Dict]:
+    """Valid raw rows newer than timestamp, oldest first, reading only the tail of the log"""
+    after = _parse_timestamp(timestamp)
+    rows = []
+    for row in raw_log.iter_rows_reversed():
+        parsed = _parse_timestamp(row["timestamp"])
+        if parsed is None:
+            continue
+        if parsed <= after:
+            break
+        if is_valid_message(row):
+            rows.append(row)
+    rows.reverse()
+    return rows
+
+_stores: Dict[str, JobStore] = {}
+_stores_lock = threading.Lock()
+
+def get_job_store() -> JobStore:
+    """The current user's job store"""
+    path = get_jobs_path()
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = JobStore(path)
+        return store
+
+class IngestQueue:
+    """Bounded in-memory queue of job ids in front of a pool of extraction workers"""
+
+    def __init__(self, workers: int, max_size: int):
+        self.workers = max(1, workers)
+        self.max_size = max(1, max_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._changed: Optional[asyncio.Condition] = None
+
+    @property
+    def store(self) -> JobStore:
+        return get_job_store()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        from services.raw_logger import get_raw_log
+
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._changed = asyncio.Condition()
+        # Collected before any new message is accepted, so none is picked up twice
+        backlog = []
+        for user in list_users():
+            with as_user(user):
+                backlog.extend((user, *job) for job in self._backlog(get_raw_log()))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if backlog:
+            logger.info("Replaying %d unprocessed log messages", len(backlog))
+            self._tasks.append(asyncio.create_task(self._replay(backlog)))
+
+    async def stop(self):
+        # Jobs still queued or in progress stay unfinished in the store and are replayed
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def prepare(self):
+        """
+        Open the current user's job store before a raw row is saved for the queue: a new
+        store marks where replay starts, so a crash before submit() is still replayed
+        """
+        get_job_store()
+
+    def submit(self, timestamp: str, message: str) -> str:
+        """Queue a job for a raw row that has just been appended; check has_room() first"""
+        job_id = self.store.add(timestamp, message)
+        self._queue.put_nowait((current_user(), job_id, timestamp, message))
+        return job_id
+
+    def has_room(self) -> bool:
+        return not self._queue.full()
+
+    def record(self, timestamp: str, message: str, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None) -> str:
+        """Record a message processed synchronously, so it is not replayed"""
+        job_id = self.store.add(timestamp, message, status)
+        if result is not None or error is not None:
+            self.store.update(job_id, status, result, error)
+        return job_id
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _backlog(self, raw_log: RawLog) -> List[tuple]:
+        """Unfinished jobs, then raw rows appended after the newest job or the store's creation"""
+        backlog = [(job["job_id"], job["timestamp"], job["message"]) for job in self.store.unfinished()]
+
+        for row in raw_rows_after(raw_log, self.store.last_timestamp()):
+            message = row["message"].strip()
+            backlog.append((self.store.add(row["timestamp"], message), row["timestamp"], message))
+        return backlog
+
+    async def _replay(self, backlog: List[tuple]):
+        # The backlog may be larger than the queue; feed it in as workers make room
+        for job in backlog:
+            await self._queue.put(job)
+
+    async def _worker(self):
+        while True:
+            user, job_id, timestamp, message = await self._queue.get()
+            try:
+                with as_user(user):
+                    await self._process(job_id, timestamp, message)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str, timestamp: str, message: str):
+        # Imported here so the queue module does not pull in the Claude client
+        from services.claude_service import process_user_input
+        from services.daily_logs_manager import merge_daily_entry
+
+        try:
+            while True:
+                await self._set_status(job_id, "processing")
+                try:
+                    structured_data, is_meaningful = await process_user_input(
+                        message, _parse_timestamp(timestamp) or datetime.now()
+                    )
+                    break
+                except UpstreamUnavailable as e:
+                    # Hold the job (and this worker) until Claude is back; the queue
+                    # filling up meanwhile pushes back on /log with 429s
+                    await self._set_status(job_id, "queued", error=str(e))
+                    await asyncio.sleep(e.retry_after)
+            daily_log_updated = False
+            if is_meaningful:
+                daily_log_updated = await asyncio.to_thread(merge_daily_entry, structured_data)
+            await self._set_status(job_id, "done", result={
+                "data": structured_data,
+                "daily_log_updated": daily_log_updated,
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error processing queued message %s: %s", job_id, e)
+            await self._set_status(job_id, "failed", error=str(e))
+
+    async def _set_status(self, job_id: str, status: str, result: Optional[Dict] = None,
+                          error: Optional[str] = None):
+        await asyncio.to_thread(self.store.update, job_id, status, result, error)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait until any job changes status; False on timeout"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.running,
+            "depth": self.depth(),
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "jobs": self.store.counts(),
+        }
+
+_queue: Optional[IngestQueue] = None
+
+def get_ingest_queue() -> IngestQueue:
+    global _queue
+    if _queue is None:
+        _queue = IngestQueue(queue_workers(), queue_max_size())
+    return _queue
@@ -2,19 +2,18 @@ import csv
 import os
 from datetime import datetime
 
+from services.schema_registry import get_schema_registry
+from services.data_paths import user_path
+
 def get_logs_path():
-    return "data/logs.csv"
+    return user_path("logs.csv")
 
 def save_log_entry(data: dict):
     logs_path = get_logs_path()
     
     os.makedirs(os.path.dirname(logs_path), exist_ok=True)
     
-    fieldnames = [
-        "date", "breakfast_description", "lunch_description", 
-        "dinner_description", "snack_description", "mood", 
-        "hydration", "sleep", "activity", "notes", "timestamp"
-    ]
+    fieldnames = ["date"] + [spec.name for spec in get_schema_registry().fields()] + ["timestamp"]
     
     data["timestamp"] = datetime.now().isoformat()
     
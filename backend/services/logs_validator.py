@@ -1,104 +1,341 @@
-"""Utility to validate and fix logs.csv format"""
+"""
+Validate and repair the raw log (its monthly segments, or a single logs.csv file) in one
+streaming pass.
+
+Rows are read one at a time and checked as they go, so every problem is reported with
+its segment and line number and memory use does not grow with the log. A repair writes
+the fixed rows of a segment to a temporary file that replaces it only once it is
+complete, and only if something needed fixing; rows that cannot be fixed are moved to a
+rejects file instead of being dropped.
+"""
 
 import csv
+import logging
 import os
+import re
 from datetime import datetime, timezone
-from typing import List, Dict
-
-def validate_logs_csv() -> bool:
-    """Check if logs.csv has valid format and timestamps"""
-    logs_path = "data/logs.csv"
-    
-    if not os.path.exists(logs_path):
-        return True  # No file is valid (will be created on first write)
-    
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from services.raw_logger import get_raw_log, get_raw_logs_path
+from services.read_cache import get_recent_messages_cache
+from services.write_coordinator import atomic_write, file_lock
+
+logger = logging.getLogger(__name__)
+
+HEADER = ["timestamp", "message"]
+
+# Bytes that are not UTF-8 are read as lone surrogates (errors="surrogateescape")
+_UNDECODABLE_RE = re.compile("[\udc80-\udcff]")
+
+# Problems per check that are printed; the rest are only counted
+MAX_PRINTED_PROBLEMS = 20
+
+def get_rejects_path(logs_path: str) -> str:
+    root, ext = os.path.splitext(logs_path)
+    return f"{root}.rejected{ext or '.csv'}"
+
+def check_on_startup() -> bool:
+    return os.getenv("LOGS_CHECK_ON_STARTUP", "1").lower() not in ("0", "false", "no")
+
+class LogProblem(NamedTuple):
+    line: int
+    kind: str
+    detail: str
+    action: str  # "fixed", "rejected" or "kept"
+    file: str = ""  # the segment (or CSV file) the line is in
+
+    def __str__(self) -> str:
+        where = f"{self.file} line {self.line}" if self.file else f"line {self.line}"
+        return f"{where}: {self.kind} ({self.detail}) - {self.action}"
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
     try:
-        with open(logs_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            
-            # Check header
-            if reader.fieldnames != ["timestamp", "message"]:
-                print("Invalid header in logs.csv")
-                return False
-            
-            # Check each row
-            for row in reader:
-                # Validate timestamp
-                ts = row.get("timestamp", "")
-                if not ts:
-                    print("Missing timestamp found")
-                    return False
-                    
-                try:
-                    dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                    # Check if timezone aware
-                    if dt.tzinfo is None:
-                        print(f"Timestamp without timezone: {ts}")
-                        return False
-                except:
-                    print(f"Invalid timestamp format: {ts}")
-                    return False
-                
-                # Validate message
-                msg = row.get("message", "")
-                if not msg or not msg.strip():
-                    print("Empty message found")
-                    return False
-        
-        return True
-        
-    except Exception as e:
-        print(f"Error validating logs.csv: {e}")
-        return False
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
 
-def regenerate_logs_csv(entries: List[Dict[str, str]] = None):
-    """Regenerate logs.csv with proper format"""
-    logs_path = "data/logs.csv"
-    
-    # If no entries provided, try to read and fix existing file
-    if entries is None:
-        entries = []
+def _check_record(line: int, record: List[str], previous: Optional[str]) -> Tuple[Optional[List[str]], List[LogProblem]]:
+    """The row to keep for one record (None to reject it) and what was wrong with it"""
+    problems = []
+
+    if len(record) > 2:
+        # An unquoted comma in the message split it into extra columns
+        record = [record[0], ",".join(record[1:])]
+        problems.append(LogProblem(line, "extra columns", "message rejoined", "fixed"))
+    elif len(record) < 2:
+        problems.append(LogProblem(line, "missing message", repr(",".join(record))[:60], "rejected"))
+        return None, problems
+
+    timestamp, message = record
+    if not message.isascii() and _UNDECODABLE_RE.search(message):
+        message = _UNDECODABLE_RE.sub("\ufffd", message)
+        problems.append(LogProblem(line, "invalid UTF-8", "undecodable bytes replaced", "fixed"))
+
+    stripped_timestamp = timestamp.strip()
+    if not stripped_timestamp:
+        problems.append(LogProblem(line, "missing timestamp", repr(message[:40]), "rejected"))
+        return None, problems
+
+    if _parse_timestamp(stripped_timestamp) is None:
+        # Older writers used a "Z" suffix, which fromisoformat only reads from Python 3.11
+        fixed = _parse_timestamp(stripped_timestamp.replace("Z", "+00:00"))
+        if fixed is None:
+            problems.append(LogProblem(line, "invalid timestamp", repr(timestamp[:40]), "rejected"))
+            return None, problems
+        stripped_timestamp = fixed.isoformat()
+        problems.append(LogProblem(line, "timestamp format", repr(timestamp), "fixed"))
+    elif stripped_timestamp != timestamp:
+        problems.append(LogProblem(line, "timestamp whitespace", repr(timestamp), "fixed"))
+
+    stripped_message = message.strip()
+    if not stripped_message:
+        problems.append(LogProblem(line, "empty message", stripped_timestamp, "rejected"))
+        return None, problems
+    if stripped_message != message:
+        problems.append(LogProblem(line, "message whitespace", stripped_timestamp, "fixed"))
+
+    # Local timestamps without an offset are what save_raw_message writes, so only mixed
+    # offsets make ordering by text unreliable; out-of-order rows are reported, not moved
+    if previous is not None and stripped_timestamp < previous:
+        problems.append(LogProblem(line, "out of order", f"{stripped_timestamp} after {previous}", "kept"))
+
+    return [stripped_timestamp, stripped_message], problems
+
+def iter_checked_rows(f) -> Iterator[Tuple[int, List[str], Optional[List[str]], List[LogProblem]]]:
+    """
+    Yield (line, record, row, problems) for each record of an open raw log, header
+    excluded; row is the repaired [timestamp, message], or None if the record is rejected.
+    """
+    reader = csv.reader(f)
+    previous_line = 0
+    previous_timestamp = None
+    first = True
+
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            line = previous_line + 1
+            previous_line = reader.line_num
+            yield line, [], None, [LogProblem(line, "unreadable record", str(e), "rejected")]
+            continue
+
+        line = previous_line + 1
+        previous_line = reader.line_num
+
+        header_problems = []
+        if first:
+            first = False
+            if record == HEADER:
+                continue
+            if not record or _parse_timestamp(record[0].strip()) is None:
+                yield line, record, None, [LogProblem(line, "invalid header", repr(",".join(record))[:60], "fixed")]
+                continue
+            # The header is missing and this is already a row; a repair writes the header
+            header_problems.append(LogProblem(line, "missing header", "header added", "fixed"))
+
+        if not record or not any(field.strip() for field in record):
+            yield line, record, None, [LogProblem(line, "blank record", "", "rejected")]
+            continue
+        if record == HEADER:
+            yield line, record, None, [LogProblem(line, "repeated header", "", "rejected")]
+            continue
+
+        row, problems = _check_record(line, record, previous_timestamp)
+        if row is not None:
+            previous_timestamp = row[0]
+        yield line, record, row, header_problems + problems
+
+class ValidationReport:
+    """Counts from one pass over the raw log; problems themselves are streamed to a callback"""
+
+    def __init__(self):
+        self.records = 0
+        self.kept = 0
+        self.rejected = 0
+        self.problems: Dict[str, int] = {}
+        self.seconds = 0.0
+
+    def add(self, row: Optional[List[str]], problems: List[LogProblem]):
+        self.records += 1
+        if row is not None:
+            self.kept += 1
+        elif problems and problems[-1].action == "rejected":
+            self.rejected += 1
+        for problem in problems:
+            self.problems[problem.kind] = self.problems.get(problem.kind, 0) + 1
+
+    def merge(self, other: "ValidationReport"):
+        self.records += other.records
+        self.kept += other.kept
+        self.rejected += other.rejected
+        for kind, count in other.problems.items():
+            self.problems[kind] = self.problems.get(kind, 0) + count
+
+    @property
+    def valid(self) -> bool:
+        return not self.problems
+
+    @property
+    def needs_repair(self) -> bool:
+        # Out-of-order rows are only reported: a repair keeps them where they are
+        return any(kind != "out of order" for kind in self.problems)
+
+    def as_dict(self) -> Dict:
+        return {
+            "records": self.records,
+            "kept": self.kept,
+            "rejected": self.rejected,
+            "problems": self.problems,
+            "seconds": round(self.seconds, 3),
+        }
+
+def _print_problems(limit: Optional[int], emit: Callable[[str], None] = print) -> Callable[[LogProblem], None]:
+    printed = [0]
+
+    def on_problem(problem: LogProblem):
+        if limit is None or printed[0] < limit:
+            emit(f"Raw log {problem}")
+        elif printed[0] == limit:
+            emit("Raw log: further problems are counted but not listed")
+        printed[0] += 1
+
+    return on_problem
+
+def _open_csv(logs_path: str):
+    return open(logs_path, "r", encoding="utf-8", errors="surrogateescape", newline="")
+
+def _sources(logs_path: Optional[str]) -> Iterator[Tuple[str, Callable]]:
+    """(name, open) for a single CSV file if given, else for every segment of the raw log"""
+    if logs_path:
         if os.path.exists(logs_path):
-            try:
-                with open(logs_path, "r", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if row.get("message") and row["message"].strip():
-                            entries.append({
-                                "timestamp": row.get("timestamp", ""),
-                                "message": row["message"].strip()
-                            })
-            except:
+            yield os.path.basename(logs_path), lambda: _open_csv(logs_path)
+        return
+    raw_log = get_raw_log()
+    for segment in raw_log.segments():
+        yield segment.file, lambda segment=segment: raw_log.open(segment, errors="surrogateescape")
+
+def _checked(f, file: str, report: ValidationReport,
+             on_problem: Optional[Callable[[LogProblem], None]]) -> Iterator[Tuple[int, List[str], Optional[List[str]], List[LogProblem]]]:
+    """iter_checked_rows, with each record counted and its problems reported"""
+    for line, record, row, problems in iter_checked_rows(f):
+        problems = [problem._replace(file=file) for problem in problems]
+        report.add(row, problems)
+        if on_problem is not None:
+            for problem in problems:
+                on_problem(problem)
+        yield line, record, row, problems
+
+def check_logs_csv(logs_path: Optional[str] = None,
+                   on_problem: Optional[Callable[[LogProblem], None]] = None) -> ValidationReport:
+    """Validate the raw log (or the CSV file at logs_path) without changing it"""
+    report = ValidationReport()
+    started = datetime.now(timezone.utc)
+    # No file is valid (will be created on first write)
+    for file, open_source in _sources(logs_path):
+        with open_source() as f:
+            for _ in _checked(f, file, report, on_problem):
                 pass
-    
-    # Fix timestamps in all entries
-    fixed_entries = []
-    for entry in entries:
-        timestamp = entry.get("timestamp", "")
-        
-        # Parse and fix timestamp
-        try:
-            if timestamp:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                timestamp = dt.isoformat()
-            else:
-                timestamp = datetime.now(timezone.utc).isoformat()
-        except:
-            timestamp = datetime.now(timezone.utc).isoformat()
-        
-        fixed_entries.append({
-            "timestamp": timestamp,
-            "message": entry["message"]
-        })
-    
-    # Write clean file
-    os.makedirs(os.path.dirname(logs_path), exist_ok=True)
-    
-    with open(logs_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["timestamp", "message"])
-        writer.writeheader()
-        writer.writerows(fixed_entries)
-    
-    print(f"Regenerated logs.csv with {len(fixed_entries)} entries")
\ No newline at end of file
+    report.seconds = (datetime.now(timezone.utc) - started).total_seconds()
+    return report
+
+def validate_logs_csv(logs_path: Optional[str] = None) -> bool:
+    """Check if the raw log has valid format and timestamps, printing every problem found"""
+    return check_logs_csv(logs_path, _print_problems(None)).valid
+
+class _Rejects:
+    """The rejects file, opened on the first rejected record"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def add(self, where: str, kind: str, record: List[str]):
+        if self._file is None:
+            exists = os.path.exists(self.path)
+            self._file = open(self.path, "a", newline="", encoding="utf-8", errors="surrogateescape")
+            self._writer = csv.writer(self._file)
+            if not exists:
+                self._writer.writerow(["line", "problem", "record"])
+        self._writer.writerow([where, kind, ",".join(record)])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def _repaired_rows(f, file: str, report: ValidationReport, on_problem, rejects: _Rejects,
+                   segment: bool) -> Iterator[List[str]]:
+    for line, record, row, problems in _checked(f, file, report, on_problem):
+        if row is not None:
+            yield row
+        elif problems and problems[-1].action == "rejected":
+            rejects.add(f"{file}:{line}" if segment else str(line), problems[-1].kind, record)
+
+def repair_logs_csv(logs_path: Optional[str] = None,
+                    on_problem: Optional[Callable[[LogProblem], None]] = None) -> ValidationReport:
+    """
+    Rewrite every segment of the raw log (or the CSV file at logs_path) that has fixable
+    problems, in one pass. Rejected records are appended to the rejects file with their
+    segment, line number and reason.
+    """
+    report = ValidationReport()
+    started = datetime.now(timezone.utc)
+    rejects = _Rejects(get_rejects_path(logs_path or get_raw_logs_path()))
+    try:
+        if logs_path:
+            if not os.path.exists(logs_path):
+                return report
+            # Hold the file's lock across read and rewrite so no concurrent append is lost
+            with file_lock(logs_path), atomic_write(logs_path) as out, _open_csv(logs_path) as f:
+                writer = csv.writer(out)
+                writer.writerow(HEADER)
+                writer.writerows(_repaired_rows(f, os.path.basename(logs_path), report, on_problem,
+                                                rejects, segment=False))
+        else:
+            raw_log = get_raw_log()
+            with raw_log.lock():
+                for segment in raw_log.segments():
+                    # Segments with nothing to fix (or only rows out of order) are left alone
+                    segment_report = ValidationReport()
+                    with raw_log.open(segment, errors="surrogateescape") as f:
+                        rows = _repaired_rows(f, segment.file, segment_report, on_problem, rejects, segment=True)
+                        raw_log.rewrite_segment(segment, rows, keep=lambda: segment_report.needs_repair)
+                    report.merge(segment_report)
+                get_recent_messages_cache(raw_log.manifest_path).invalidate()
+    finally:
+        rejects.close()
+
+    report.seconds = (datetime.now(timezone.utc) - started).total_seconds()
+    return report
+
+def regenerate_logs_csv(entries: List[Dict[str, str]] = None):
+    """Regenerate the raw log with proper format, from entries or by repairing it"""
+    if entries is None:
+        report = repair_logs_csv(None, _print_problems(MAX_PRINTED_PROBLEMS))
+        print(f"Regenerated the raw log with {report.kept} entries ({report.rejected} rejected)")
+        return
+
+    def rows():
+        for line, entry in enumerate(entries, start=2):
+            row, problems = _check_record(line, [entry.get("timestamp", ""), entry.get("message", "")], None)
+            for problem in problems:
+                print(f"entry {problem}")
+            if row is not None:
+                yield row
+
+    raw_log = get_raw_log()
+    with raw_log.lock():
+        kept = raw_log.replace_all(rows())
+        get_recent_messages_cache(raw_log.manifest_path).invalidate()
+
+    print(f"Regenerated the raw log with {kept} entries")
+
+def startup_check(logs_path: Optional[str] = None) -> ValidationReport:
+    """Quick read-only check for server startup; logs a summary and the first problems"""
+    report = check_logs_csv(logs_path, _print_problems(MAX_PRINTED_PROBLEMS, logger.warning))
+    if report.needs_repair:
+        logger.warning("The raw log has problems in %d records: %s. "
+                       "Run `python validate_logs.py --repair` to fix them.", report.records, report.problems)
+    return report
@@ -0,0 +1,164 @@
+"""
+Append-field merging on item lists instead of comma-joined strings.
+
+A value such as "apple, almonds" is kept as an ordered list of items with an index from
+each normalized token to the items containing it, so each merge is a few hash lookups:
+  - an item whose tokens are all in one existing item is already logged (skipped),
+  - an item whose tokens cover existing items is more detailed and replaces them,
+  - anything else is appended.
+The text form is the items joined with ", ", as the CSV has always stored them.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+@lru_cache(maxsize=8192)
+def normalize_item(item: str) -> str:
+    """Case- and whitespace-insensitive form of an item, for exact duplicates"""
+    return " ".join(item.lower().split())
+
+def _stem(token: str) -> str:
+    # "apples" and "apple" are the same item; "glass" stays "glass"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+# A day's items are re-indexed on every merge into it, so tokenizing is memoized
+@lru_cache(maxsize=8192)
+def item_tokens(item: str) -> frozenset:
+    return frozenset(_stem(token) for token in _TOKEN_RE.findall(item.lower()))
+
+def split_items(text: str) -> List[str]:
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+class ItemList:
+    """Ordered, deduplicated items of one append field"""
+
+    def __init__(self, items: Iterable[str] = ()):
+        self._next_id = 0
+        self._items: Dict[int, str] = {}          # insertion-ordered
+        self._tokens: Dict[int, frozenset] = {}
+        self._by_key: Dict[str, int] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        for item in items:
+            self._append(item)
+
+    @classmethod
+    def from_value(cls, value: Union[str, List[str], None]) -> "ItemList":
+        """From a stored value: a list of items, or legacy comma-joined text"""
+        if not value:
+            return cls()
+        if isinstance(value, list):
+            # Already deduplicated when it was stored
+            return cls(item for item in value if item)
+        return cls(split_items(value))
+
+    @property
+    def items(self) -> List[str]:
+        return list(self._items.values())
+
+    def __str__(self) -> str:
+        return ", ".join(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _index(self, item_id: int, item: str):
+        tokens = item_tokens(item)
+        self._items[item_id] = item
+        self._tokens[item_id] = tokens
+        self._by_key[normalize_item(item)] = item_id
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(item_id)
+
+    def _unindex(self, item_id: int, keep_slot: bool = False):
+        item = self._items[item_id] if keep_slot else self._items.pop(item_id)
+        self._by_key.pop(normalize_item(item), None)
+        for token in self._tokens.pop(item_id):
+            postings = self._postings[token]
+            postings.discard(item_id)
+            if not postings:
+                del self._postings[token]
+
+    def _append(self, item: str):
+        item_id = self._next_id
+        self._next_id += 1
+        self._index(item_id, item)
+
+    def _containing(self, tokens: frozenset) -> Optional[int]:
+        """An existing item whose tokens include all of these, if any"""
+        postings = [self._postings.get(token) for token in tokens]
+        if not postings or not all(postings):
+            return None
+        common = set.intersection(*sorted(postings, key=len))
+        return min(common) if common else None
+
+    def _covered_by(self, tokens: frozenset) -> List[int]:
+        """Existing items whose tokens are all among these, in list order"""
+        counts: Dict[int, int] = {}
+        for token in tokens:
+            for item_id in self._postings.get(token, ()):
+                counts[item_id] = counts.get(item_id, 0) + 1
+        return sorted(item_id for item_id, count in counts.items() if count == len(self._tokens[item_id]))
+
+    def add(self, item: str) -> bool:
+        """Merge one item; returns True if the list changed"""
+        item = item.strip()
+        if not item or normalize_item(item) in self._by_key:
+            return False
+
+        tokens = item_tokens(item)
+        if tokens:
+            if self._containing(tokens) is not None:
+                return False  # already logged in at least as much detail
+
+            covered = self._covered_by(tokens)
+            if covered:
+                # More detailed: takes the place of the first item it covers
+                first, rest = covered[0], covered[1:]
+                self._unindex(first, keep_slot=True)
+                self._index(first, item)
+                for item_id in rest:
+                    self._unindex(item_id)
+                return True
+
+        self._append(item)
+        return True
+
+    def merge(self, value: str) -> bool:
+        """Merge a new value, which may itself be a comma-separated list"""
+        changed = False
+        for item in split_items(value):
+            changed = self.add(item) or changed
+        return changed
+
+# Lists merged into recently, keyed by their items: successive merges into the same day
+# pick up the built index instead of re-indexing every item
+_POOL_SIZE = 256
+_pool: "OrderedDict[Tuple[str, ...], ItemList]" = OrderedDict()
+_pool_lock = threading.Lock()
+
+def acquire_item_list(value: Union[str, List[str], None]) -> ItemList:
+    """The ItemList for a stored value, owned by the caller until released"""
+    if not value:
+        return ItemList()
+    key = tuple(value) if isinstance(value, list) else tuple(split_items(value))
+    with _pool_lock:
+        items = _pool.pop(key, None)
+    return items if items is not None else ItemList.from_value(list(key))
+
+def release_item_list(items: ItemList):
+    """Return a list after merging, for the next merge into the same value"""
+    if not len(items):
+        return
+    key = tuple(items.items)
+    with _pool_lock:
+        _pool[key] = items
+        _pool.move_to_end(key)
+        while len(_pool) > _POOL_SIZE:
+            _pool.popitem(last=False)
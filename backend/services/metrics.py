@@ -0,0 +1,197 @@
+"""
+In-process metrics, exposed at /metrics in the Prometheus text format.
+
+Counters and histograms are kept in memory with their label values. The /log pipeline
+times each stage (raw save, local resolution, prompt, Claude call, parsing, merge),
+and bytes read from and written to the data files are added up per request by
+MetricsMiddleware.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds, from sub-millisecond cache hits to upstream deadlines
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield from self._render_value(key, value)
+
+    def _render_value(self, key: Tuple[str, ...], value) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key: Tuple[str, ...], state) -> Iterator[str]:
+        counts, total, count = state
+        cumulative = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % (bound if bound == "+Inf" else _format_value(bound))
+            yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}"
+        yield f"{self.name}_count{_format_labels(self.label_names, key)} {count}"
+
+_registry: List[_Metric] = []
+
+STAGE_SECONDS = Histogram(
+    "cal_stage_seconds", "Time spent in each stage of processing a message", ["stage"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "cal_http_request_seconds", "HTTP request latency, until the last body byte", ["method", "route", "status"]
+)
+REQUEST_IO_BYTES = Histogram(
+    "cal_request_io_bytes", "Data file bytes read or written per HTTP request", ["route", "direction"],
+    buckets=BYTES_BUCKETS,
+)
+IO_BYTES = Counter("cal_io_bytes_total", "Data file bytes read or written", ["file", "direction"])
+EXTRACTIONS = Counter(
+    "cal_extractions_total", "Messages structured, by source and whether they held wellness data",
+    ["source", "meaningful"],
+)
+CACHE_LOOKUPS = Counter("cal_cache_lookups_total", "Fast path and result cache lookups", ["cache", "result"])
+DAILY_LOG_MERGES = Counter("cal_daily_log_merges_total", "Daily log merges, or skips for lack of data", ["result"])
+UPSTREAM_CALLS = Counter("cal_upstream_calls_total", "Claude calls by final outcome", ["outcome"])
+UPSTREAM_ERRORS = Counter("cal_upstream_errors_total", "Failed Claude attempts by status or error type", ["error"])
+UPSTREAM_TOKENS = Counter("cal_upstream_tokens_total", "Tokens reported by the Claude API", ["type"])
+UPSTREAM_IN_FLIGHT = Gauge("cal_upstream_in_flight", "Claude calls in progress")
+UPSTREAM_CIRCUIT_OPEN = Gauge("cal_upstream_circuit_open", "1 while the circuit breaker rejects calls")
+INGEST_QUEUE_DEPTH = Gauge("cal_ingest_queue_depth", "Messages waiting for a background worker")
+
+@contextmanager
+def stage(name: str):
+    """Time a block into cal_stage_seconds{stage=name}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+# Bytes read/written by the current HTTP request; the dict is shared with the worker
+# threads the request runs code in, since they start from a copy of this context
+_request_io: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("request_io", default=None)
+
+def count_io(file: str, direction: str, nbytes: int):
+    """Record bytes read from or written to a data file ("raw_log", "daily_logs")"""
+    IO_BYTES.inc(nbytes, file=file, direction=direction)
+    totals = _request_io.get()
+    if totals is not None:
+        totals[direction] += nbytes
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and adding up its data file I/O"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        totals = {"read": 0, "written": 0}
+        token = _request_io.set(totals)
+        start = time.perf_counter()
+        status = [500]
+        recorded = [False]
+
+        def record():
+            if recorded[0]:
+                return
+            recorded[0] = True
+            # The route template (/log/jobs/{job_id}), not the path, keeps label values few
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"],
+                                         route=route, status=str(status[0]))
+            for direction, nbytes in totals.items():
+                REQUEST_IO_BYTES.observe(nbytes, route=route, direction=direction)
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            record()
+            _request_io.reset(token)
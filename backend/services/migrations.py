@@ -0,0 +1,201 @@
+"""
+Versioned migrations of the stored daily log rows.
+
+Each migration is a numbered step that transforms one row at a time. The store's schema
+version is kept in SQLite's user_version, so only the steps newer than it run. All
+pending steps are applied in a single pass over the rows, read in date-ordered batches
+(constant memory), and committed together with the new version. A timestamped copy of
+the database is taken first.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from services.daily_logs_store import DailyLogsStore
+from services.merge_engine import ItemList
+from services.daily_stats import rebuild_daily_stats
+from services.read_cache import get_daily_logs_cache
+from services.search_index import reindex_daily_logs
+from services.analytics import get_daily_series
+from services.schema_registry import APPEND, MULTI_SELECT, as_list, get_schema_registry
+from services.data_paths import user_path
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+def get_backups_dir() -> str:
+    return user_path("backups")
+
+class Migration:
+    def __init__(self, version: int, name: str, transform: Callable[[Dict], Dict]):
+        self.version = version
+        self.name = name
+        self.transform = transform
+
+def _split_legacy_mood(row: Dict) -> Dict:
+    # Before moods were split by time of day there was a single "mood" column. The prompt
+    # files moods without a time of day under afternoon, so old values go there too
+    if "mood" not in row:
+        return row
+    row = dict(row)
+    mood = str(row.pop("mood") or "").strip()
+    if mood and not row.get("mood_afternoon"):
+        row["mood_afternoon"] = mood
+    elif mood and mood != row.get("mood_afternoon"):
+        notes = row.get("notes")
+        row["notes"] = (notes + [f"Mood: {mood}"]) if isinstance(notes, list) else \
+            ", ".join(filter(None, [notes, f"Mood: {mood}"]))
+    return row
+
+def _multi_select_as_json(row: Dict) -> Dict:
+    # Multi-select values were stored as JSON text, comma-joined text or "[]"
+    changed = dict(row)
+    for spec in get_schema_registry().fields():
+        if spec.type != MULTI_SELECT or spec.name not in row:
+            continue
+        options = list(dict.fromkeys(as_list(row[spec.name])))
+        if options:
+            changed[spec.name] = json.dumps(options)
+        else:
+            del changed[spec.name]
+    return changed
+
+def _append_fields_as_item_lists(row: Dict) -> Dict:
+    # Rows written before the merge engine (or imported from CSV) hold comma-joined text
+    changed = dict(row)
+    for spec in get_schema_registry().fields():
+        value = row.get(spec.name)
+        if spec.merge == APPEND and isinstance(value, str):
+            items = ItemList.from_value(value).items
+            if items:
+                changed[spec.name] = items
+            else:
+                del changed[spec.name]
+    return changed
+
+# Ordered by version; never renumber or remove a step once released
+MIGRATIONS: List[Migration] = [
+    Migration(1, "split legacy mood column", _split_legacy_mood),
+    Migration(2, "multi-select values as JSON arrays", _multi_select_as_json),
+    Migration(3, "append fields as item lists", _append_fields_as_item_lists),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def schema_version(store: DailyLogsStore) -> int:
+    with store.reading() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending_migrations(store: DailyLogsStore, target: Optional[int] = None) -> List[Migration]:
+    current = schema_version(store)
+    target = LATEST_VERSION if target is None else target
+    return [step for step in MIGRATIONS if current < step.version <= target]
+
+def backup_store(store: DailyLogsStore) -> str:
+    """Consistent copy of the database (taken with SQLite's online backup) under data/backups"""
+    os.makedirs(get_backups_dir(), exist_ok=True)
+    name = os.path.splitext(os.path.basename(store.path))[0]
+    backup_path = os.path.join(
+        get_backups_dir(), f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.db"
+    )
+    backup = sqlite3.connect(backup_path)
+    try:
+        with store.reading() as conn:
+            conn.backup(backup)
+    finally:
+        backup.close()
+    return backup_path
+
+def _iter_batches(conn: sqlite3.Connection, batch_size: int):
+    """Rows in date order, a batch at a time, by keyset so updates never disturb the scan"""
+    last_date = ""
+    while True:
+        batch = conn.execute(
+            "SELECT date, data FROM daily_logs WHERE date > ? ORDER BY date LIMIT ?",
+            (last_date, batch_size),
+        ).fetchall()
+        if not batch:
+            return
+        yield batch
+        last_date = batch[-1][0]
+
+def _migrate_rows(conn: sqlite3.Connection, steps: List[Migration], write: bool,
+                  batch_size: int) -> Dict:
+    rows = 0
+    changed = {step.name: 0 for step in steps}
+    rewritten = 0
+
+    for batch in _iter_batches(conn, batch_size):
+        updates = []
+        for date, data in batch:
+            rows += 1
+            row = original = json.loads(data)
+            for step in steps:
+                migrated = step.transform(row)
+                if migrated != row:
+                    changed[step.name] += 1
+                row = migrated
+            if row != original:
+                updates.append((json.dumps(row), date))
+        rewritten += len(updates)
+        if write and updates:
+            conn.executemany("UPDATE daily_logs SET data = ? WHERE date = ?", updates)
+
+    return {"rows": rows, "rewritten": rewritten, "changed": changed}
+
+def run_migrations(store: DailyLogsStore, dry_run: bool = False, target: Optional[int] = None,
+                   backup: bool = True, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Apply the pending migrations. A dry run makes the same pass and reports what would
+    change without writing (or backing up) anything.
+    """
+    started = time.perf_counter()
+    from_version = schema_version(store)
+    steps = pending_migrations(store, target)
+    report = {
+        "from_version": from_version,
+        "to_version": steps[-1].version if steps else from_version,
+        "steps": [f"{step.version}: {step.name}" for step in steps],
+        "dry_run": dry_run,
+        "backup": None,
+    }
+    if not steps:
+        return {**report, "rows": 0, "rewritten": 0, "changed": {}, "seconds": 0.0}
+
+    if dry_run:
+        with store.reading() as conn:
+            report.update(_migrate_rows(conn, steps, write=False, batch_size=batch_size))
+    else:
+        if backup and store.count():
+            report["backup"] = backup_store(store)
+        with store.transaction() as conn:
+            report.update(_migrate_rows(conn, steps, write=True, batch_size=batch_size))
+            # Committed with the rows, so a failed run leaves neither behind
+            conn.execute(f"PRAGMA user_version = {int(report['to_version'])}")
+
+        if report["rewritten"]:
+            # Fill counts, the search index and the series were derived from the old rows
+            rebuild_daily_stats(store)
+            reindex_daily_logs(store.iter_rows())
+            get_daily_logs_cache(store.path).invalidate()
+            get_daily_series(store.path).invalidate()
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+def check_schema_version(store: DailyLogsStore):
+    """At startup: stamp an empty store as current, or warn if stored rows need migrating"""
+    if not pending_migrations(store):
+        return
+    if store.count() == 0:
+        run_migrations(store, backup=False)
+        return
+    logger.warning("Daily logs are at schema version %d, latest is %d. "
+                   "Run `python migrate_data.py` (or --dry-run first) to migrate them.",
+                   schema_version(store), LATEST_VERSION)
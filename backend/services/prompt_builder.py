@@ -0,0 +1,117 @@
+"""Compiled Claude prompt: template and schema are loaded once and pre-rendered"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from services.schema_registry import get_schema_registry
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEMPLATE_PATH = os.path.join(BACKEND_DIR, "prompt_template.txt")
+SCHEMA_PATH = os.path.join(BACKEND_DIR, "prompt_schema.json")
+
+# Placeholders filled in per request; everything else is rendered at compile time
+DYNAMIC_PLACEHOLDERS = ("USER_INPUT", "CURRENT_DATE", "YESTERDAY_DATE", "CURRENT_TIMESTAMP")
+
+_PLACEHOLDER_RE = re.compile(r"\{(" + "|".join(DYNAMIC_PLACEHOLDERS) + r")\}")
+
+class CompiledPrompt:
+    """Prompt template split into static text and dynamic placeholder segments"""
+
+    def __init__(self, template: str, schema: dict, mtimes: tuple = (), fields_version: int = 0):
+        self.schema = schema
+        self.mtimes = mtimes
+        self.fields_version = fields_version
+
+        # The schema never changes between requests, so render it into the static text once
+        static_template = template.replace("{JSON_SCHEMA}", json.dumps(schema, indent=2))
+
+        # Alternating literal text and placeholder names: [text, name, text, name, ..., text]
+        self.segments: List[str] = _PLACEHOLDER_RE.split(static_template)
+
+        # Everything before the line holding the first dynamic placeholder is identical on
+        # every request and is sent as a cacheable system prefix; the rest is the suffix
+        head = self.segments[0]
+        cut = head.rfind("\n") + 1
+        self.prefix = head[:cut]
+        self._suffix_head = head[cut:]
+
+        self.hash = hashlib.sha256(
+            (template + "\0" + json.dumps(schema, sort_keys=True)).encode("utf-8")
+        ).hexdigest()
+
+    def render(self, user_input: str, now: Optional[datetime] = None) -> str:
+        """Fill in the per-request placeholders and return the whole prompt"""
+        return self.prefix + self.render_suffix(user_input, now)
+
+    def render_suffix(self, user_input: str, now: Optional[datetime] = None) -> str:
+        """Render only the dynamic part of the prompt that follows the static prefix"""
+        values = placeholder_values(user_input, now or datetime.now())
+
+        parts = [self._suffix_head] + self.segments[1:]
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
+        return "".join(parts)
+
+def placeholder_values(user_input: str, now: datetime) -> dict:
+    """Values for the dynamic placeholders given the reference time"""
+    return {
+        "USER_INPUT": user_input,
+        "CURRENT_DATE": now.strftime("%Y-%m-%d"),
+        "YESTERDAY_DATE": (now - timedelta(days=1)).strftime("%Y-%m-%d"),
+        "CURRENT_TIMESTAMP": now.isoformat(),
+    }
+
+def _source_mtimes() -> tuple:
+    return (os.path.getmtime(TEMPLATE_PATH), os.path.getmtime(SCHEMA_PATH))
+
+def load_prompt() -> CompiledPrompt:
+    """Read the template and schema from disk, add the custom fields and compile them"""
+    mtimes = _source_mtimes()
+    registry = get_schema_registry()
+
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        template = f.read()
+
+    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+
+    # Custom trackers change the schema, and with it the prompt hash cached results use
+    custom_fields = registry.prompt_fields()
+    if custom_fields:
+        schema.setdefault("fields", {}).update(custom_fields)
+
+    return CompiledPrompt(template, schema, mtimes, registry.version)
+
+_prompt: Optional[CompiledPrompt] = None
+
+def _hot_reload_enabled() -> bool:
+    return os.getenv("PROMPT_HOT_RELOAD", "").lower() in ("1", "true", "yes")
+
+def get_prompt() -> CompiledPrompt:
+    """
+    Return the compiled prompt, loading it on first use.
+    With PROMPT_HOT_RELOAD set, edits to the template or schema are picked up via mtime.
+    Custom fields added while running are always picked up.
+    """
+    global _prompt
+
+    if _prompt is None or _prompt.fields_version != get_schema_registry().version:
+        _prompt = load_prompt()
+    elif _hot_reload_enabled():
+        try:
+            if _source_mtimes() != _prompt.mtimes:
+                _prompt = load_prompt()
+                logger.info("Reloaded prompt template and schema")
+        except (OSError, ValueError) as e:
+            # Keep serving the last good prompt while a file is mid-edit
+            logger.error("Error reloading prompt: %s", e)
+
+    return _prompt
@@ -1,51 +1,79 @@
-import csv
-import os
+import logging
 from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+from services.raw_segments import RawLog, get_log
+from services.read_cache import get_recent_messages_cache, read_cache_enabled
+from services.metrics import stage
+from services.data_paths import user_path
+from services.search_index import index_raw_message
+
+logger = logging.getLogger(__name__)
 
 def get_raw_logs_path():
-    return "data/logs.csv"
+    """The single-file raw log used before segments; imported on first use"""
+    return user_path("logs.csv")
+
+def get_raw_logs_dir():
+    return user_path("raw")
+
+def get_raw_log() -> RawLog:
+    return get_log(get_raw_logs_dir(), legacy_csv_path=get_raw_logs_path())
+
+def has_raw_messages() -> bool:
+    return get_raw_log().count() > 0
 
-def save_raw_message(message: str):
-    """Save raw user message to logs.csv with timestamp"""
+def save_raw_message(message: str, timestamp: Optional[str] = None):
+    """
+    Save raw user message to its month's segment of the raw log with timestamp.
+    Callers that need to refer to the row afterwards pass the timestamp in.
+    """
     # Validate message content
     if not message or not isinstance(message, str):
-        print(f"Warning: Invalid message attempted to be saved: {repr(message)}")
+        logger.warning("Invalid message attempted to be saved: %r", message)
         return False
     
     # Clean and validate message
     cleaned_message = message.strip()
     if not cleaned_message:
-        print("Warning: Empty message attempted to be saved")
+        logger.warning("Empty message attempted to be saved")
         return False
     
-    logs_path = get_raw_logs_path()
-    
-    os.makedirs(os.path.dirname(logs_path), exist_ok=True)
-    
-    fieldnames = ["timestamp", "message"]
-    
     # Generate ISO 8601 timestamp in local time
-    try:
-        timestamp = datetime.now().isoformat()
-    except Exception as e:
-        print(f"Error generating timestamp: {e}")
-        timestamp = datetime.now().isoformat()  # Fallback
-    
-    file_exists = os.path.exists(logs_path)
+    if timestamp is None:
+        try:
+            timestamp = datetime.now().isoformat()
+        except Exception as e:
+            logger.error("Error generating timestamp: %s", e)
+            timestamp = datetime.now().isoformat()  # Fallback
     
     try:
-        with open(logs_path, "a", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            if not file_exists:
-                writer.writeheader()
-            
-            writer.writerow({
-                "timestamp": timestamp,
-                "message": cleaned_message
-            })
+        # Appends are serialized so rows never interleave and the header is written once
+        raw_log = get_raw_log()
+        with stage("save_raw"), raw_log.lock():
+            row = raw_log.append(timestamp, cleaned_message)
+            get_recent_messages_cache(raw_log.manifest_path).append(row, raw_log.signature())
         
+        index_raw_message(timestamp, cleaned_message)
         return True
     except Exception as e:
-        print(f"Error saving raw message: {e}")
-        return False
\ No newline at end of file
+        logger.error("Error saving raw message: %s", e)
+        return False
+
+def get_recent_messages(limit: int = 10) -> list:
+    """Return the last `limit` valid raw messages, oldest first"""
+    raw_log = get_raw_log()
+    
+    if read_cache_enabled():
+        return get_recent_messages_cache(raw_log.manifest_path).get_recent(
+            limit, raw_log.read_last, raw_log.signature())
+    
+    return raw_log.read_last(limit)
+
+def iter_raw_messages(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      start: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """
+    Stream (row_number, row) pairs from the raw log in log order, filtered by timestamp.
+    start skips the first rows (a pagination cursor); rows are never held in memory, and
+    segments outside the range or before the cursor are not read at all.
+    """
+    return get_raw_log().iter_rows(date_from, date_to, start)
@@ -0,0 +1,609 @@
+"""
+The raw message log, stored as monthly CSV segments under data/raw.
+
+Each message is appended to the segment for its timestamp's month (logs-2025-03.csv).
+Once a later month has been written to, earlier segments are closed: gzip-compressed in
+place of the CSV by a background thread. manifest.json records every segment's time
+range, row count and size, so a date range, a row offset or the last few messages only
+open the segments they need. It is rewritten when a segment is added, closed or replaced,
+not on every append: readers count the rows past an open segment's recorded size.
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.metrics import count_io
+from services.raw_tail import is_valid_message, iter_records_reversed
+from services.read_cache import file_signature
+from services.write_coordinator import file_lock
+
+logger = logging.getLogger(__name__)
+
+HEADER = ["timestamp", "message"]
+HEADER_LINE = (",".join(HEADER) + "\r\n").encode("utf-8")
+MANIFEST_VERSION = 1
+COPY_CHUNK = 64 * 1024
+
+_MONTH_RE = re.compile(r"\s*(\d{4}-\d{2})")
+_SEGMENT_RE = re.compile(r"logs-(\d{4}-\d{2})\.csv(\.gz)?")
+
+def segment_month(timestamp: str) -> Optional[str]:
+    """YYYY-MM of a timestamp, or None if it does not start with a date"""
+    match = _MONTH_RE.match(timestamp or "")
+    return match.group(1) if match else None
+
+class Segment:
+    """One month of raw messages, as recorded in the manifest"""
+
+    def __init__(self, month: str, file: str, rows: int = 0, first: Optional[str] = None,
+                 last: Optional[str] = None, size: int = 0):
+        self.month = month
+        self.file = file
+        self.rows = rows
+        # Smallest and largest timestamp text, compared the way iter_rows filters rows
+        self.first = first
+        self.last = last
+        self.size = size
+
+    @property
+    def closed(self) -> bool:
+        return self.file.endswith(".gz")
+
+    def overlaps(self, date_from: Optional[str], date_to: Optional[str]) -> bool:
+        """Whether any row of the segment can fall in the range"""
+        if not self.rows:
+            return False
+        if date_from and self.last < date_from:
+            return False
+        if date_to and self.first[:len(date_to)] > date_to:
+            return False
+        return True
+
+    def with_row(self, timestamp: str, size: int) -> "Segment":
+        first = timestamp if self.first is None else min(self.first, timestamp)
+        last = timestamp if self.last is None else max(self.last, timestamp)
+        return Segment(self.month, self.file, self.rows + 1, first, last, size)
+
+    def as_dict(self) -> Dict:
+        return {"month": self.month, "file": self.file, "rows": self.rows,
+                "first": self.first, "last": self.last, "bytes": self.size}
+
+def _bytes_read(f) -> int:
+    # On-disk bytes taken so far: compressed bytes for a closed segment
+    buffer = f.buffer
+    if isinstance(buffer, gzip.GzipFile):
+        return buffer.fileobj.tell() if buffer.fileobj is not None else 0
+    return buffer.tell()
+
+def _open_text(path: str, mode: str = "r", errors: str = "strict", compressed: Optional[bool] = None):
+    if compressed if compressed is not None else path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", errors=errors, newline="")
+    return open(path, mode, encoding="utf-8", errors=errors, newline="")
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _in_range(timestamp: str, date_from: Optional[str], date_to: Optional[str]) -> bool:
+    """Bounds are dates or timestamps; a date bound covers that whole day"""
+    if date_from and timestamp < date_from:
+        return False
+    if date_to and timestamp[:len(date_to)] > date_to:
+        return False
+    return True
+
+def _complete_rows(data: bytes) -> int:
+    """Length of the complete CSV records at the start of data (which starts at a record)"""
+    # A newline ends a record only outside quotes: with an even number of quotes before it
+    quotes = data.count(b'"')
+    end = len(data)
+    newline = data.rfind(b"\n")
+    while newline != -1:
+        quotes -= data.count(b'"', newline + 1, end)
+        if quotes % 2 == 0:
+            return newline + 1
+        end = newline
+        newline = data.rfind(b"\n", 0, newline)
+    return 0
+
+def _gzip_member(source_path: str, raw, start: int = 0) -> int:
+    """Append source_path from byte start on to raw as a gzip member; returns the end offset"""
+    with open(source_path, "rb") as source:
+        source.seek(start)
+        # mtime=0 keeps the output the same for the same rows
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+            shutil.copyfileobj(source, out, COPY_CHUNK)
+        return source.tell()
+
+def _compress(source_path: str, path: str):
+    """Write a gzip copy of source_path to path through a temporary file"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            _gzip_member(source_path, raw)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class RawLog:
+    """
+    Monthly segments and their manifest. Readers use the manifest as last written by any
+    process; writers hold lock() (shared across processes) around every change.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+        self._segments: Dict[str, Segment] = {}
+        self._signature = None
+        self._closer: Optional[threading.Thread] = None
+
+    def lock(self):
+        return file_lock(self.root)
+
+    def _path(self, file: str) -> str:
+        return os.path.join(self.root, file)
+
+    def _locate(self, segment: Segment) -> str:
+        # A reader holding an older manifest may look for a segment closed since
+        path = self._path(segment.file)
+        if not os.path.exists(path):
+            other = path[:-3] if segment.closed else path + ".gz"
+            if os.path.exists(other):
+                return other
+        return path
+
+    def _scan(self, month: str, file: str) -> Segment:
+        """Row count, time range and size of a segment, read from the file itself"""
+        segment = Segment(month, file)
+        path = self._path(file)
+        with _open_text(path) as f:
+            try:
+                for row in csv.DictReader(f):
+                    segment = segment.with_row(row.get("timestamp") or "", 0)
+            finally:
+                count_io("raw_log", "read", _bytes_read(f))
+        segment.size = os.path.getsize(path)
+        return segment
+
+    def _extend(self, segment: Segment) -> Segment:
+        """
+        Count the rows appended to an open segment past its recorded size, by another
+        process or before a crash; only the new bytes are read
+        """
+        path = self._path(segment.file)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return segment  # closed meanwhile; the manifest says so
+        if size == segment.size:
+            return segment
+        if segment.closed or segment.size <= 0 or size < segment.size:
+            return self._scan(segment.month, segment.file)
+
+        with open(path, "rb") as f:
+            f.seek(segment.size)
+            data = f.read()
+        count_io("raw_log", "read", len(data))
+        # A row still being written is left for the next look
+        end = _complete_rows(data)
+        extended = segment
+        for record in csv.reader(io.StringIO(data[:end].decode("utf-8"), newline="")):
+            if record:
+                extended = extended.with_row(record[0], 0)
+        extended.size = segment.size + end
+        return extended
+
+    def _load(self) -> Dict[str, Segment]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)["segments"]
+        except FileNotFoundError:
+            entries = None
+
+        if entries is None:
+            # No manifest (nothing written yet, or it was lost): list the segment files
+            files = os.listdir(self.root) if os.path.isdir(self.root) else []
+            entries = [{"month": m.group(1), "file": name, "bytes": -1}
+                       for m, name in ((_SEGMENT_RE.fullmatch(name), name) for name in sorted(files)) if m]
+
+        segments = {}
+        for entry in entries:
+            segment = Segment(entry["month"], entry["file"], entry.get("rows", 0),
+                              entry.get("first"), entry.get("last"), entry.get("bytes", 0))
+            path = self._locate(segment)
+            if not os.path.exists(path):
+                continue
+            if path != self._path(segment.file):
+                segment = self._scan(segment.month, os.path.basename(path))
+            else:
+                segment = self._extend(segment)
+            segments[segment.month] = segment
+        return segments
+
+    def _refresh(self):
+        """Reload the manifest if another process has changed it; call with self._lock held"""
+        signature = file_signature(self.manifest_path)
+        if signature != self._signature:
+            self._segments = self._load()
+            self._signature = signature
+            return
+        # Appends leave the manifest alone; pick up rows other processes added
+        for month, segment in list(self._segments.items()):
+            if not segment.closed:
+                self._segments[month] = self._extend(segment)
+
+    def _save(self):
+        """Write the manifest; call with lock() and self._lock held"""
+        os.makedirs(self.root, exist_ok=True)
+        # One line per segment; json.dumps of each is much faster than dump(indent=...)
+        entries = ",\n".join(json.dumps(self._segments[month].as_dict()) for month in sorted(self._segments))
+        fd, tmp_path = tempfile.mkstemp(prefix=".manifest.", suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f'{{"version": {MANIFEST_VERSION}, "segments": [\n{entries}\n]}}\n')
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._signature = file_signature(self.manifest_path)
+
+    def segments(self) -> List[Segment]:
+        """Segments in month order"""
+        with self._lock:
+            self._refresh()
+            return [self._segments[month] for month in sorted(self._segments)]
+
+    def count(self) -> int:
+        return sum(segment.rows for segment in self.segments())
+
+    def signature(self) -> Tuple:
+        """Changes on every write: the manifest and the open segments"""
+        with self._lock:
+            self._refresh()
+            open_paths = [self._path(segment.file) for segment in self._segments.values() if not segment.closed]
+        return file_signature(self.manifest_path, *sorted(open_paths))
+
+    def append(self, timestamp: str, message: str) -> Dict:
+        """Append one row to its month's segment; call with lock() held"""
+        with self._lock:
+            self._refresh()
+            month = (segment_month(timestamp) or max(self._segments, default=None)
+                     or datetime.now().strftime("%Y-%m"))
+            segment = self._segments.get(month) or Segment(month, f"logs-{month}.csv")
+
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(segment.file)
+        exists = os.path.exists(path)
+        # A late row for a closed month is added as another gzip member
+        with _open_text(path, "a") as f:
+            writer = csv.writer(f)
+            if not exists:
+                writer.writerow(HEADER)
+            writer.writerow([timestamp, message])
+        size = os.path.getsize(path)
+        count_io("raw_log", "written", size - segment.size)
+
+        with self._lock:
+            # Only a new segment, or a late row in a closed one, changes the manifest
+            changes_manifest = month not in self._segments or segment.closed
+            self._segments[month] = segment.with_row(timestamp, size)
+            if changes_manifest:
+                self._save()
+            self._close_later()
+        return {"timestamp": timestamp, "message": message}
+
+    def _past_open_segments(self) -> List[Segment]:
+        newest = max(self._segments, default=None)
+        return [segment for month, segment in sorted(self._segments.items())
+                if month != newest and not segment.closed]
+
+    def _close_later(self):
+        """Start the background closer if a past month is still open; call with self._lock held"""
+        if self._closer is None and self._past_open_segments():
+            self._closer = threading.Thread(target=self._close_past_months, name="raw-log-closer", daemon=True)
+            self._closer.start()
+
+    def _close_past_months(self):
+        try:
+            while True:
+                with self._lock:
+                    self._refresh()
+                    pending = self._past_open_segments()
+                    if not pending:
+                        self._closer = None
+                        return
+                for segment in pending:
+                    self._close(segment)
+        except Exception:
+            logger.exception("Could not close raw log segments in %s", self.root)
+            with self._lock:
+                self._closer = None
+
+    def _close(self, segment: Segment):
+        """
+        Compress a segment whose month has passed. The copy is made without the lock, so
+        appends carry on; rows appended meanwhile are added as another gzip member, and
+        the swap is made, under lock()
+        """
+        path = self._path(segment.file)
+        closed_path = path + ".gz"
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{segment.file}.gz.", suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                copied = _gzip_member(path, raw)
+                with self.lock():
+                    with self._lock:
+                        self._refresh()
+                        current = self._segments.get(segment.month)
+                    if (current is None or current.file != segment.file or not os.path.exists(path)
+                            or os.stat(path).st_ino != inode or os.path.getsize(path) < copied):
+                        # Closed or rewritten by someone else meanwhile
+                        os.remove(tmp_path)
+                        return
+                    if os.path.getsize(path) > copied:
+                        _gzip_member(path, raw, copied)
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    os.replace(tmp_path, closed_path)
+
+                    closed = Segment(current.month, current.file + ".gz", current.rows,
+                                     current.first, current.last, os.path.getsize(closed_path))
+                    count_io("raw_log", "read", current.size)
+                    count_io("raw_log", "written", closed.size)
+                    with self._lock:
+                        self._segments[segment.month] = closed
+                        self._save()
+                    os.remove(path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, segment: Segment, errors: str = "strict"):
+        """A segment as a text file, decompressed if closed"""
+        return _open_text(self._locate(segment), errors=errors)
+
+    def iter_rows(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  start: int = 0) -> Iterator:
+        """
+        (row_number, row) pairs in log order, numbered across segments and filtered by
+        timestamp. Segments before the start row or outside the range are not opened.
+        """
+        offset = 0
+        for segment in self.segments():
+            if offset + segment.rows <= start or not segment.overlaps(date_from, date_to):
+                offset += segment.rows
+                continue
+            with self.open(segment) as f:
+                try:
+                    for row_number, row in enumerate(csv.DictReader(f), start=offset):
+                        if row_number < start:
+                            continue
+                        if (date_from or date_to) and not _in_range(row.get("timestamp") or "", date_from, date_to):
+                            continue
+                        yield row_number, row
+                finally:
+                    count_io("raw_log", "read", _bytes_read(f))
+            offset += segment.rows
+
+    def iter_rows_reversed(self) -> Iterator[Dict]:
+        """Rows from the newest backwards; the open segment is read from its end"""
+        for segment in reversed(self.segments()):
+            path = self._locate(segment)
+            if path.endswith(".gz"):
+                # A closed month is small: decompress it whole
+                with self.open(segment) as f:
+                    try:
+                        records = list(csv.reader(f))
+                    finally:
+                        count_io("raw_log", "read", _bytes_read(f))
+                records.reverse()
+            else:
+                records = iter_records_reversed(path)
+            for record in records:
+                if record and record != HEADER:
+                    yield dict(zip(HEADER, record))
+
+    def read_last(self, limit: int) -> List[Dict]:
+        """The last `limit` valid messages, oldest first"""
+        messages = []
+        if limit > 0:
+            for row in self.iter_rows_reversed():
+                if is_valid_message(row):
+                    messages.append(row)
+                    if len(messages) >= limit:
+                        break
+        messages.reverse()
+        return messages
+
+    def iter_csv(self) -> Iterator[bytes]:
+        """The whole log as a single CSV, streamed segment by segment with one header"""
+        yield HEADER_LINE
+        for segment in self.segments():
+            path = self._locate(segment)
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rb") as f:
+                chunk = f.readline()
+                if chunk.rstrip(b"\r\n") == HEADER_LINE.rstrip(b"\r\n"):
+                    chunk = f.read(COPY_CHUNK)
+                while chunk:
+                    yield chunk
+                    last = chunk
+                    chunk = f.read(COPY_CHUNK)
+                    if not chunk and not last.endswith(b"\n"):
+                        yield b"\r\n"  # an unterminated last row must not run into the next segment
+            count_io("raw_log", "read", os.path.getsize(path))
+
+    def rewrite_segment(self, segment: Segment, records: Iterable[List[str]],
+                        keep: Callable[[], bool] = lambda: True) -> bool:
+        """
+        Replace a segment with records (header added). keep() is asked once all records
+        are written; if it returns False the segment is left as it was. Call with lock() held.
+        """
+        path = self._locate(segment)
+        file = os.path.basename(path)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{file}.", suffix=".tmp", dir=self.root)
+        os.close(fd)
+        try:
+            rewritten = Segment(segment.month, file)
+            with _open_text(tmp_path, "w", errors="surrogateescape", compressed=segment.closed) as f:
+                writer = csv.writer(f)
+                writer.writerow(HEADER)
+                for record in records:
+                    writer.writerow(record)
+                    rewritten = rewritten.with_row(record[0] if record else "", 0)
+            if not keep():
+                os.remove(tmp_path)
+                return False
+            _fsync(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        rewritten.size = os.path.getsize(path)
+        count_io("raw_log", "written", rewritten.size)
+        with self._lock:
+            self._segments[segment.month] = rewritten
+            self._save()
+        return True
+
+    def replace_all(self, records: Iterable[List[str]]) -> int:
+        """
+        Replace the whole log with records ([timestamp, message, ...] as read from a CSV),
+        split into monthly segments. records may stream from the current segments: they
+        are written aside and swapped in at the end. Call with lock() held.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".replace.", dir=self.root)
+        try:
+            segments: Dict[str, Segment] = {}
+            undated: List[List[str]] = []  # rows before the first dated one join its month
+            current = None  # (month, file, writer)
+
+            def write(month: str, record: List[str]):
+                nonlocal current
+                if current is None or current[0] != month:
+                    if current is not None:
+                        current[1].close()
+                    segment = segments.get(month)
+                    f = open(os.path.join(staging, f"logs-{month}.csv"), "a", newline="", encoding="utf-8",
+                             errors="surrogateescape")
+                    current = (month, f, csv.writer(f))
+                    if segment is None:
+                        current[2].writerow(HEADER)
+                        segments[month] = Segment(month, f"logs-{month}.csv")
+                current[2].writerow(record)
+                segments[month] = segments[month].with_row(record[0], 0)
+
+            for record in records:
+                if not record:
+                    continue
+                month = segment_month(record[0]) or (current[0] if current else None)
+                if month is None:
+                    undated.append(record)
+                    continue
+                for early in undated:
+                    write(month, early)
+                undated = []
+                write(month, record)
+            for early in undated:
+                write(datetime.now().strftime("%Y-%m"), early)
+            if current is not None:
+                current[1].close()
+
+            # Every month but the newest is closed
+            newest = max(segments, default=None)
+            for month, segment in segments.items():
+                path = os.path.join(staging, segment.file)
+                if month != newest:
+                    _compress(path, path + ".gz")
+                    os.remove(path)
+                    segment.file += ".gz"
+                segment.size = os.path.getsize(os.path.join(staging, segment.file))
+                count_io("raw_log", "written", segment.size)
+
+            with self._lock:
+                self._refresh()
+                for name in os.listdir(self.root):
+                    if _SEGMENT_RE.fullmatch(name):
+                        os.remove(self._path(name))
+                for segment in segments.values():
+                    os.replace(os.path.join(staging, segment.file), self._path(segment.file))
+                self._segments = segments
+                self._save()
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return sum(segment.rows for segment in segments.values())
+
+    def import_csv(self, csv_path: str) -> int:
+        """Add the rows of a single-file raw log (logs.csv) to the segments; call with lock() held"""
+        with open(csv_path, "r", newline="", encoding="utf-8", errors="surrogateescape") as f:
+            records = csv.reader(f)
+            first = next(records, None)
+            legacy = records if first in (None, HEADER) else _chain([first], records)
+            existing = ([row.get("timestamp") or "", row.get("message") or ""] for _, row in self.iter_rows())
+            before = self.count()
+            return self.replace_all(_chain(existing, legacy)) - before
+
+def _chain(*iterables: Iterable) -> Iterator:
+    for iterable in iterables:
+        yield from iterable
+
+_logs: Dict[str, RawLog] = {}
+_logs_lock = threading.Lock()
+
+def get_log(root: str, legacy_csv_path: Optional[str] = None) -> RawLog:
+    """
+    Return the segmented raw log under root, opening it on first use.
+    An existing single-file logs.csv is split into segments once and then renamed out of the way.
+    """
+    raw_log = _logs.get(root)
+    if raw_log is not None:
+        return raw_log
+
+    with _logs_lock:
+        raw_log = _logs.get(root)
+        if raw_log is None:
+            raw_log = RawLog(root)
+            if legacy_csv_path and os.path.exists(legacy_csv_path):
+                migrate_csv(raw_log, legacy_csv_path)
+            _logs[root] = raw_log
+    return raw_log
+
+def migrate_csv(raw_log: RawLog, csv_path: str):
+    """Split a legacy logs.csv into segments and keep the file as a backup"""
+    with raw_log.lock():
+        if not os.path.exists(csv_path):
+            return  # another process got there first
+        imported = raw_log.import_csv(csv_path)
+        backup_path = f"{os.path.splitext(csv_path)[0]}_migrated_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+        os.rename(csv_path, backup_path)
+    logger.info("Migrated %d raw messages from %s into %s (backup at %s)",
+                imported, csv_path, raw_log.root, backup_path)
@@ -0,0 +1,87 @@
+"""Read the last records of a CSV file by seeking from the end instead of scanning it all"""
+
+import csv
+import io
+import os
+from typing import Dict, Iterator, List
+
+from services.metrics import count_io
+
+BLOCK_SIZE = 64 * 1024
+
+def _parse_record(data: bytes) -> List[str]:
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+    return rows[0] if rows else []
+
+def iter_records_reversed(path: str, block_size: int = BLOCK_SIZE) -> Iterator[List[str]]:
+    """
+    Yield CSV records from the end of the file backwards (header last).
+
+    A newline ends a record only if it is outside quotes. Since the file ends outside
+    quotes, that holds exactly when the bytes after the newline contain an even number
+    of quote characters (escaped quotes come in pairs), so quoted multi-line messages
+    are kept whole without parsing from the start.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = pos = f.tell()
+        try:
+            pending = b""       # bytes after the scan point not yet emitted as a record
+            pending_quotes = 0  # quote characters in pending
+
+            while pos > 0:
+                read = min(block_size, pos)
+                pos -= read
+                f.seek(pos)
+                chunk = f.read(read)
+
+                scan_end = len(chunk)
+                newline = chunk.rfind(b"\n", 0, scan_end)
+                while newline != -1:
+                    segment = chunk[newline + 1:scan_end]
+                    pending = segment + pending
+                    pending_quotes += segment.count(b'"')
+
+                    if pending_quotes % 2 == 0:
+                        if pending.strip():
+                            yield _parse_record(pending)
+                        pending = b""
+                        pending_quotes = 0
+
+                    # The newline belongs to the record before it
+                    scan_end = newline + 1
+                    newline = chunk.rfind(b"\n", 0, newline)
+
+                segment = chunk[:scan_end]
+                pending = segment + pending
+                pending_quotes += segment.count(b'"')
+
+            if pending.strip():
+                yield _parse_record(pending)
+        finally:
+            count_io("raw_log", "read", size - pos)
+
+def is_valid_message(row: Dict) -> bool:
+    """Rows shown in the UI need both a timestamp and a non-empty message"""
+    return bool(
+        row.get("timestamp") and row.get("message") and
+        row["message"].strip() and row["timestamp"].strip()
+    )
+
+def read_last_messages(path: str, limit: int, fieldnames=("timestamp", "message")) -> List[Dict]:
+    """Return the last `limit` valid raw message rows, oldest first"""
+    if limit <= 0 or not os.path.exists(path):
+        return []
+
+    messages = []
+    for record in iter_records_reversed(path):
+        if tuple(record) == tuple(fieldnames):
+            continue  # header
+        row = dict(zip(fieldnames, record))
+        if is_valid_message(row):
+            messages.append(row)
+            if len(messages) >= limit:
+                break
+
+    messages.reverse()
+    return messages
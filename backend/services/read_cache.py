@@ -0,0 +1,183 @@
+"""
+Process-level cache of parsed daily logs and recent raw messages for the read endpoints.
+The write path updates it directly; files changed by another process are detected by
+their mtime and size and reloaded.
+"""
+
+import bisect
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+RECENT_MESSAGES_KEPT = 100
+
+def read_cache_enabled() -> bool:
+    return os.getenv("READ_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def file_signature(*paths: str) -> Tuple:
+    """(mtime, size) of each path, or None for paths that do not exist"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+class _Stats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def as_dict(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class DailyLogsCache:
+    """Parsed daily log rows in date order, with O(1) lookup by date"""
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self.stats = _Stats()
+        self._lock = threading.Lock()
+        self._dates: Optional[List[str]] = None
+        self._rows: Dict[str, Dict] = {}
+        self._signature = None
+
+    def _current_signature(self) -> Tuple:
+        # WAL mode: committed writes land in the -wal file until checkpointed
+        return file_signature(self.store_path, self.store_path + "-wal")
+
+    def _ensure_loaded(self, loader: Callable[[], List[Dict]]):
+        signature = self._current_signature()
+        if self._dates is not None and signature == self._signature:
+            self.stats.hits += 1
+            return
+
+        self.stats.misses += 1
+        if self._dates is not None:
+            self.stats.reloads += 1
+
+        rows = loader()
+        self._rows = {row["date"]: row for row in rows}
+        self._dates = sorted(self._rows)
+        self._signature = signature
+
+    def get_all(self, loader: Callable[[], List[Dict]]) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded(loader)
+            return [self._rows[date] for date in self._dates]
+
+    def get(self, date: str, loader: Callable[[], List[Dict]]) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_loaded(loader)
+            return self._rows.get(date)
+
+    def dates(self, loader: Callable[[], List[Dict]]) -> List[str]:
+        with self._lock:
+            self._ensure_loaded(loader)
+            return list(self._dates)
+
+    def update(self, row: Dict):
+        """Apply a row just written by this process"""
+        with self._lock:
+            if self._dates is None:
+                return
+
+            date = row["date"]
+            if date not in self._rows:
+                bisect.insort(self._dates, date)
+            self._rows[date] = row
+            self._signature = self._current_signature()
+
+    def invalidate(self):
+        with self._lock:
+            self._dates = None
+            self._rows = {}
+            self._signature = None
+
+class RecentMessagesCache:
+    """
+    The last few valid raw messages, kept as a ring buffer, keyed by the raw log's
+    manifest_path. The raw log's signature (manifest and open segments) changes on every
+    write, so it tells when to reload.
+    """
+
+    def __init__(self, manifest_path: str, size: int = RECENT_MESSAGES_KEPT):
+        self.manifest_path = manifest_path
+        self.size = size
+        self.stats = _Stats()
+        self._lock = threading.Lock()
+        self._messages: Optional[Deque[Dict]] = None
+        self._signature = None
+
+    def get_recent(self, limit: int, read_last: Callable[[int], List[Dict]], signature: Tuple) -> List[Dict]:
+        """read_last(n) returns the last n valid messages, reading only the newest segments"""
+        with self._lock:
+            if self._messages is not None and signature == self._signature:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+                if self._messages is not None:
+                    self.stats.reloads += 1
+                self._messages = deque(read_last(self.size), maxlen=self.size)
+                self._signature = signature
+
+            if limit <= 0:
+                return []
+            if limit > self.size:
+                return read_last(limit)
+            return list(self._messages)[-limit:]
+
+    def append(self, row: Dict, signature: Tuple):
+        """Apply a row just appended by this process; signature is the raw log's after it"""
+        with self._lock:
+            if self._messages is None:
+                return
+            self._messages.append(row)
+            self._signature = signature
+
+    def invalidate(self):
+        with self._lock:
+            self._messages = None
+            self._signature = None
+
+_daily_caches: Dict[str, DailyLogsCache] = {}
+_recent_caches: Dict[str, RecentMessagesCache] = {}
+_registry_lock = threading.Lock()
+
+def get_daily_logs_cache(store_path: str) -> DailyLogsCache:
+    with _registry_lock:
+        cache = _daily_caches.get(store_path)
+        if cache is None:
+            cache = _daily_caches[store_path] = DailyLogsCache(store_path)
+        return cache
+
+def invalidate_daily_logs_caches():
+    """Drop every user's cached daily logs (rows are expanded to the schema's columns)"""
+    with _registry_lock:
+        caches = list(_daily_caches.values())
+    for cache in caches:
+        cache.invalidate()
+
+def get_recent_messages_cache(manifest_path: str) -> RecentMessagesCache:
+    with _registry_lock:
+        cache = _recent_caches.get(manifest_path)
+        if cache is None:
+            cache = _recent_caches[manifest_path] = RecentMessagesCache(manifest_path)
+        return cache
+
+def read_cache_stats() -> Dict:
+    with _registry_lock:
+        return {
+            "daily_logs": {path: cache.stats.as_dict() for path, cache in _daily_caches.items()},
+            "recent_messages": {path: cache.stats.as_dict() for path, cache in _recent_caches.items()},
+        }
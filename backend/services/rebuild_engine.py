@@ -0,0 +1,372 @@
+"""
+Rebuild the daily logs from the raw message log.
+
+Messages are extracted concurrently (a fixed pool of workers plus an optional rate limit)
+or through the Message Batches API; each result is checkpointed as soon as it arrives so an interrupted rebuild resumes where
+it stopped, and the merged daily logs replace the stored ones in a single write at the end.
+Until then the existing daily logs are left untouched.
+
+The server may keep logging while a rebuild runs. Messages appended after the first read
+of the raw log are extracted in catch-up rounds, and the last of them under
+daily_logs_lock(), which holds out every merge until the replace is written: whatever
+the server merged before the lock is rebuilt from its raw message, and whatever it
+merges after is applied on top of the rebuilt rows. A message caught in between is
+merged twice, which the merge policies make harmless (appends and unions dedupe,
+overwrites repeat the value).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.raw_logger import iter_raw_messages
+from services.daily_logs_manager import daily_logs_lock, has_meaningful_data, merge_entry, replace_daily_logs
+from services.claude_service import (
+    build_message_request, get_model, parse_claude_response, process_user_input,
+    record_usage, remember_result, resolve_locally,
+)
+from services.batch_client import BatchClient, batch_max_requests
+from services.prompt_builder import get_prompt
+from services.rate_limiter import RateLimiter
+from services.data_paths import user_path
+
+# extract(message, reference_time) -> (structured_data, is_meaningful)
+Extractor = Callable[[str, datetime], Awaitable[Tuple[Dict, bool]]]
+
+# Rounds of extracting messages logged during the rebuild before taking the lock
+CATCH_UP_ROUNDS = 3
+
+def get_checkpoint_path() -> str:
+    return user_path("rebuild_checkpoint.jsonl")
+
+def message_time(timestamp: str) -> datetime:
+    """When a raw message was written, falling back to now for rows without a timestamp"""
+    if timestamp:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return datetime.now()
+
+def message_fingerprint(row: Dict) -> str:
+    """Identifies a raw row's content, so edited rows are not served from a stale checkpoint"""
+    content = f"{row.get('timestamp', '')}\x00{row.get('message', '')}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+def rebuild_signature() -> Dict:
+    """Results are only reusable with the same prompt and model"""
+    return {"prompt_hash": get_prompt().hash, "model": get_model()}
+
+class Checkpoint:
+    """
+    Append-only JSONL record of finished extractions, keyed by raw row number,
+    and of submitted batches
+    """
+
+    def __init__(self, path: str, signature: Dict):
+        self.path = path
+        self.signature = signature
+        self.batches: List[Dict] = []
+        self._file = None
+
+    def load(self) -> Dict[int, Dict]:
+        """Results from a previous run with the same signature; a mismatch starts over"""
+        if not os.path.exists(self.path):
+            return {}
+
+        results = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get("signature") != self.signature:
+                    print("Checkpoint was made with a different prompt or model; starting over")
+                    return {}
+            except json.JSONDecodeError:
+                return {}
+
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn final line from an interrupted run
+                if record.get("collected"):
+                    # Its results (including failures, to be resubmitted) are all recorded
+                    self.batches = [b for b in self.batches if b["batch"] != record["batch"]]
+                elif "batch" in record:
+                    self.batches.append(record)
+                else:
+                    results[record["row"]] = record
+        return results
+
+    def open(self, results: Dict[int, Dict]):
+        """Start the file afresh with the reusable results, then append new ones"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"signature": self.signature}) + "\n")
+            for batch in self.batches:
+                f.write(json.dumps(batch) + "\n")
+            for row_number in sorted(results):
+                f.write(json.dumps(results[row_number]) + "\n")
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, record: Dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def append_batch(self, batch_id: str, custom_ids: List[str]):
+        """Record a submitted batch before waiting on it"""
+        batch = {"batch": batch_id, "custom_ids": custom_ids}
+        self.batches.append(batch)
+        self.append(batch)
+
+    def collected_batch(self, batch_id: str):
+        """Record that every result of a batch has been taken"""
+        self.batches = [b for b in self.batches if b["batch"] != batch_id]
+        self.append({"batch": batch_id, "collected": True})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def merge_results(records: List[Dict]) -> Dict[str, Dict]:
+    """Merge extraction results per date, in the order the messages were written"""
+    by_date: Dict[str, List[Dict]] = {}
+    for record in records:
+        if record["meaningful"] and has_meaningful_data(record["data"]):
+            by_date.setdefault(record["date"], []).append(record)
+
+    daily_logs = {}
+    for date in sorted(by_date):
+        entry = {"date": date}
+        for record in sorted(by_date[date], key=lambda r: (r["sort_key"], r["row"])):
+            entry = merge_entry(entry, record["data"])
+        daily_logs[date] = entry
+    return daily_logs
+
+class _Run:
+    """Results of one rebuild run: checkpointed records and counters"""
+
+    def __init__(self, checkpoint: Checkpoint, records: Dict[int, Dict], pending: List[Tuple[int, Dict]]):
+        self.checkpoint = checkpoint
+        self.records = records
+        self.pending = pending
+        self.stats = {"messages": len(records) + len(pending), "resumed": len(records),
+                      "extracted": 0, "failed": 0, "days": 0, "written": False}
+
+    def succeeded(self, row_number: int, row: Dict, dt: datetime, data: Dict, is_meaningful: bool):
+        record = {
+            "row": row_number,
+            "fingerprint": message_fingerprint(row),
+            "date": dt.strftime("%Y-%m-%d"),
+            "sort_key": dt.isoformat(),
+            "meaningful": is_meaningful,
+            "data": data,
+        }
+        self.records[row_number] = record
+        self.checkpoint.append(record)
+        self.stats["extracted"] += 1
+        if self.stats["extracted"] % 50 == 0:
+            print(f"Extracted {self.stats['extracted']}/{len(self.pending)}")
+
+    def failed(self, row_number: int, error):
+        self.stats["failed"] += 1
+        print(f"❌ Error processing row {row_number}: {error}")
+
+async def _extract_concurrently(run: _Run, extract: Extractor, concurrency: int,
+                                pending: Optional[List[Tuple[int, Dict]]] = None):
+    queue = iter(run.pending if pending is None else pending)
+
+    async def worker():
+        # A fixed pool of workers bounds the requests in flight without a task per message
+        for row_number, row in queue:
+            try:
+                dt = message_time(row.get("timestamp", ""))
+                data, is_meaningful = await extract(row["message"], dt)
+            except Exception as e:
+                run.failed(row_number, e)
+                continue
+            run.succeeded(row_number, row, dt, data, is_meaningful)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+def _custom_id(row_number: int, row: Dict) -> str:
+    return f"row-{row_number}-{message_fingerprint(row)}"
+
+async def _extract_in_batches(run: _Run, batch_size: int, poll_seconds: Optional[float]):
+    """
+    Send every message that needs Claude through the Message Batches API. Submitted
+    batch ids are checkpointed, so an interrupted run collects them instead of resubmitting.
+    """
+    prompt_template = get_prompt()
+
+    # Fast-path and cached messages never leave the process
+    waiting: Dict[str, Tuple[int, Dict, datetime]] = {}
+    for row_number, row in run.pending:
+        try:
+            dt = message_time(row.get("timestamp", ""))
+        except ValueError as e:
+            run.failed(row_number, e)
+            continue
+        local = resolve_locally(row["message"], dt, prompt_template)
+        if local is not None:
+            run.succeeded(row_number, row, dt, *local)
+        else:
+            waiting[_custom_id(row_number, row)] = (row_number, row, dt)
+
+    if not waiting:
+        return
+
+    client = BatchClient()
+    try:
+        batch_ids = [
+            batch["batch"] for batch in run.checkpoint.batches
+            if any(custom_id in waiting for custom_id in batch["custom_ids"])
+        ]
+        submitted = {
+            custom_id for batch in run.checkpoint.batches
+            if batch["batch"] in batch_ids for custom_id in batch["custom_ids"]
+        }
+
+        unsent = [custom_id for custom_id in waiting if custom_id not in submitted]
+        for start in range(0, len(unsent), max(1, batch_size)):
+            chunk = unsent[start:start + batch_size]
+            requests = []
+            for custom_id in chunk:
+                _, row, dt = waiting[custom_id]
+                params = build_message_request(prompt_template, row["message"], dt)
+                params.pop("extra_headers", None)
+                requests.append({"custom_id": custom_id, "params": params})
+
+            batch = await client.create(requests)
+            run.checkpoint.append_batch(batch["id"], chunk)
+            batch_ids.append(batch["id"])
+            print(f"Submitted batch {batch['id']} with {len(chunk)} messages")
+
+        async def collect(batch_id: str):
+            batch = await client.wait(batch_id, poll_seconds)
+            async for result in client.iter_results(batch):
+                entry = waiting.pop(result.get("custom_id"), None)
+                if entry is None:
+                    continue  # the raw row changed since the batch was submitted
+                row_number, row, dt = entry
+
+                outcome = result.get("result", {})
+                if outcome.get("type") != "succeeded":
+                    run.failed(row_number, f"{outcome.get('type')}: {outcome.get('error')}")
+                    continue
+
+                message = outcome["message"]
+                record_usage(message.get("usage"))
+                data, is_meaningful = parse_claude_response(message["content"][0]["text"], dt)
+                remember_result(row["message"], dt, prompt_template, data, is_meaningful)
+                run.succeeded(row_number, row, dt, data, is_meaningful)
+            run.checkpoint.collected_batch(batch_id)
+
+        await asyncio.gather(*(collect(batch_id) for batch_id in batch_ids))
+    finally:
+        await client.close()
+
+    for row_number, _, _ in waiting.values():
+        run.failed(row_number, "no result returned by the batch")
+
+async def rebuild_daily_logs(concurrency: int = 4, rate: Optional[float] = None,
+                             resume: bool = True, allow_partial: bool = False,
+                             extract: Optional[Extractor] = None, batch: bool = False,
+                             batch_size: Optional[int] = None,
+                             poll_seconds: Optional[float] = None) -> Dict:
+    """
+    Rebuild the daily logs from the raw log and return counters for the run.
+    With batch set, messages go through the Message Batches API instead of one request each.
+    Messages that fail are left out of the checkpoint; unless allow_partial is set the
+    stored daily logs are then kept as they were, so a rerun can retry just those.
+    """
+    rate_limiter = RateLimiter(rate, burst=concurrency) if rate else None
+    if extract is None:
+        async def extract(message: str, reference_time: datetime) -> Tuple[Dict, bool]:
+            return await process_user_input(message, reference_time, rate_limiter=rate_limiter)
+
+    checkpoint = Checkpoint(get_checkpoint_path(), rebuild_signature())
+    previous = checkpoint.load() if resume else {}
+
+    # Work out what is already done; only the pending rows are held for extraction
+    records: Dict[int, Dict] = {}
+    pending: List[Tuple[int, Dict]] = []
+    next_row = 0
+    for row_number, row in iter_raw_messages():
+        next_row = row_number + 1
+        message = row.get("message", "")
+        if not message or not message.strip():
+            continue
+        record = previous.get(row_number)
+        if record is not None and record.get("fingerprint") == message_fingerprint(row):
+            records[row_number] = record
+        else:
+            pending.append((row_number, row))
+
+    run = _Run(checkpoint, records, pending)
+    stats = run.stats
+    print(f"{stats['messages']} messages: {len(records)} from checkpoint, {len(pending)} to extract")
+
+    checkpoint.open(records)
+    try:
+        if batch:
+            await _extract_in_batches(run, batch_size or batch_max_requests(), poll_seconds)
+        else:
+            await _extract_concurrently(run, extract, concurrency)
+
+        # Messages the server logged meanwhile, without holding up its merges yet
+        for _ in range(CATCH_UP_ROUNDS):
+            next_row, caught_up = await _catch_up(run, extract, concurrency, next_row)
+            if caught_up:
+                break
+
+        if not _failed(stats, allow_partial):
+            with daily_logs_lock():
+                # The last few, with every merge held out until the replace is written
+                await _catch_up(run, extract, concurrency, next_row)
+                if not _failed(stats, allow_partial):
+                    daily_logs = merge_results([records[row_number] for row_number in sorted(records)])
+                    replace_daily_logs(daily_logs)
+                    stats["days"] = len(daily_logs)
+                    stats["written"] = True
+    finally:
+        checkpoint.close()
+
+    if stats["written"]:
+        checkpoint.remove()
+    return stats
+
+def _rows_from(start: int) -> Tuple[List[Tuple[int, Dict]], int]:
+    """Raw rows with a message from row number start on, and the row number after the last"""
+    rows = []
+    next_row = start
+    for row_number, row in iter_raw_messages(start=start):
+        next_row = row_number + 1
+        message = row.get("message", "")
+        if message and message.strip():
+            rows.append((row_number, row))
+    return rows, next_row
+
+async def _catch_up(run: _Run, extract: Extractor, concurrency: int, start: int) -> Tuple[int, bool]:
+    """Extract the rows logged since start; returns where to look next and whether there were none"""
+    rows, next_row = _rows_from(start)
+    if rows:
+        print(f"Extracting {len(rows)} messages logged during the rebuild")
+        run.stats["messages"] += len(rows)
+        await _extract_concurrently(run, extract, concurrency, rows)
+    return next_row, not rows
+
+def _failed(stats: Dict, allow_partial: bool) -> bool:
+    if stats["failed"] and not allow_partial:
+        print(f"⚠️  {stats['failed']} messages failed; daily logs left unchanged. "
+              f"Run again to retry them (finished results are checkpointed).")
+        return True
+    return False
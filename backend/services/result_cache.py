@@ -0,0 +1,187 @@
+"""Persistent content-addressed cache for Claude structuring results"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from services.data_paths import shared_path
+
+# Access times of hits are kept in memory and written in one batch, so a lookup on the
+# event loop is a read. They are flushed with the next put (before evicting), once this
+# many are pending or once the oldest is this old, and on close.
+TOUCH_BATCH_SIZE = 256
+TOUCH_FLUSH_SECONDS = 60.0
+
+def get_cache_path():
+    return shared_path("claude_cache.db")
+
+def normalize_input(text: str) -> str:
+    """Normalize user input so trivially different phrasings share a cache entry"""
+    normalized = re.sub(r"\s+", " ", text.strip().lower())
+    return normalized.rstrip(".!?,; ")
+
+def make_cache_key(user_input: str, reference_time: datetime, prompt_hash: str, model: str) -> str:
+    """
+    Key on everything that can change Claude's answer: the normalized input,
+    the date context given in the prompt, the prompt version and the model.
+    """
+    current_date = reference_time.strftime("%Y-%m-%d")
+    yesterday_date = (reference_time - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    material = "\0".join([normalize_input(user_input), current_date, yesterday_date, prompt_hash, model])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """SQLite-backed LRU cache with TTL expiry and a size cap"""
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._touched_since = 0.0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                is_meaningful INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[Dict, bool]]:
+        """Return (structured_data, is_meaningful) for key, or None on a miss"""
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, is_meaningful, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            data, is_meaningful, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._touched.pop(key, None)
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                self._size -= 1
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            if not self._touched:
+                self._touched_since = now
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE or now - self._touched_since >= TOUCH_FLUSH_SECONDS:
+                self._flush_touches()
+                self._conn.commit()
+            self.hits += 1
+
+        return json.loads(data), bool(is_meaningful)
+
+    def _flush_touches(self):
+        """Write the pending access times (caller holds the lock and commits)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE results SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put(self, key: str, structured_data: Dict, is_meaningful: bool):
+        """Store a result, evicting the least recently used entries past the size cap"""
+        now = time.time()
+
+        with self._lock:
+            self._touched.pop(key, None)
+            self._flush_touches()
+            existed = self._conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, data, is_meaningful, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(structured_data), int(is_meaningful), now, now),
+            )
+            if not existed:
+                self._size += 1
+
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+                self.evictions += overflow
+
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+_cache: Optional[ResultCache] = None
+
+def cache_enabled() -> bool:
+    return os.getenv("CLAUDE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide result cache, opening it on first use"""
+    global _cache
+
+    if _cache is None:
+        _cache = ResultCache(
+            get_cache_path(),
+            max_entries=int(os.getenv("CLAUDE_CACHE_MAX_ENTRIES", 5000)),
+            ttl_seconds=float(os.getenv("CLAUDE_CACHE_TTL_SECONDS", 30 * 24 * 3600)),
+        )
+    return _cache
+
+def close_result_cache():
+    """Write the pending access times and close the cache, if it was opened"""
+    global _cache
+
+    if _cache is not None:
+        _cache.close()
+        _cache = None
@@ -0,0 +1,263 @@
+"""
+One declaration of the daily log fields: their type, how a new value merges into the
+day, and whether a value counts as data worth logging. Built-in fields are declared
+below; custom trackers (see DYNAMIC_COLUMNS.MD) are read from data/custom_fields.json.
+
+Rows are stored sparse (only the fields a day has), so adding a field changes no stored
+row: days logged before it simply have no value for it.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from services.data_paths import shared_path
+
+logger = logging.getLogger(__name__)
+
+TEXT = "text"
+NUMBER = "number"
+BOOLEAN = "boolean"
+MULTI_SELECT = "multi_select"
+FIELD_TYPES = (TEXT, NUMBER, BOOLEAN, MULTI_SELECT)
+
+APPEND = "append"        # accumulates through the day, deduplicated
+OVERWRITE = "overwrite"  # latest value wins
+UNION = "union"          # set union of the selected options
+MERGE_POLICIES = (APPEND, OVERWRITE, UNION)
+
+# Columns every row has that are not tracked fields
+RESERVED_NAMES = ("date", "timestamp", "last_updated", "fields")
+
+# What Claude sometimes returns for "not mentioned"
+PLACEHOLDER_VALUES = ("-", "n/a", "none", "null")
+
+_NAME_RE = re.compile(r"^[a-z][a-z0-9_]{0,49}$")
+
+def get_custom_fields_path() -> str:
+    return shared_path("custom_fields.json")
+
+class FieldSpec:
+    """
+    A tracked field. `meaningful` values make a message worth merging into the day;
+    `wellness` ones also make Claude's (or the fast path's) result count as wellness data.
+    `group` nests the field in the prompt schema, e.g. mood_morning is mood.morning.
+    """
+
+    def __init__(self, name: str, type: str = TEXT, merge: Optional[str] = None,
+                 description: str = "", meaningful: bool = True, wellness: Optional[bool] = None,
+                 group: Optional[str] = None, custom: bool = False):
+        self.name = name
+        self.type = type
+        self.merge = merge or (UNION if type == MULTI_SELECT else OVERWRITE)
+        self.description = description
+        self.meaningful = meaningful
+        self.wellness = meaningful if wellness is None else wellness
+        self.group = group
+        self.custom = custom
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FieldSpec":
+        return cls(
+            name=str(data.get("name", "")).strip(),
+            type=data.get("type", TEXT),
+            merge=data.get("merge"),
+            description=data.get("description", ""),
+            meaningful=bool(data.get("meaningful", True)),
+            wellness=data.get("wellness"),
+            custom=True,
+        )
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "type": self.type,
+            "merge": self.merge,
+            "description": self.description,
+            "meaningful": self.meaningful,
+            "wellness": self.wellness,
+            "custom": self.custom,
+        }
+
+    def prompt_value(self):
+        """How the field is described to Claude in the prompt schema"""
+        if self.type == MULTI_SELECT:
+            return [self.description or f"Array of {self.name.replace('_', ' ')}"]
+        description = self.description or self.name.replace("_", " ").capitalize()
+        if self.type == NUMBER:
+            return f"Number - {description}"
+        if self.type == BOOLEAN:
+            return f"Boolean - {description}"
+        return description
+
+BUILTIN_FIELDS = [
+    FieldSpec("breakfast_description", TEXT, APPEND),
+    FieldSpec("lunch_description", TEXT, APPEND),
+    FieldSpec("dinner_description", TEXT, APPEND),
+    FieldSpec("snack_description", TEXT, APPEND),
+    FieldSpec("mood_morning", TEXT, group="mood"),
+    FieldSpec("mood_afternoon", TEXT, group="mood"),
+    FieldSpec("mood_night", TEXT, group="mood"),
+    FieldSpec("hydration", TEXT, APPEND),
+    FieldSpec("sleep", TEXT),
+    FieldSpec("activity", TEXT, APPEND),
+    # Notes alone are kept with a day but do not make a message wellness data
+    FieldSpec("notes", TEXT, APPEND, wellness=False),
+    FieldSpec("alcohol", BOOLEAN),
+    FieldSpec("caffeine", NUMBER),
+    FieldSpec("marijuana", TEXT),
+    FieldSpec("exercise_type", TEXT),
+    FieldSpec("supplements", MULTI_SELECT),
+]
+
+def as_list(value) -> List[str]:
+    """Options of a multi-select value: a list, JSON array text or comma-joined text"""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value if item]
+    text = str(value).strip()
+    if text.startswith("["):
+        try:
+            return [str(item) for item in json.loads(text) if item]
+        except ValueError:
+            pass
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+def validate_field(spec: FieldSpec, existing: Iterable[str]):
+    """Raise ValueError if a custom field cannot be added"""
+    if not _NAME_RE.match(spec.name):
+        raise ValueError("Field name must be lowercase letters, digits and underscores")
+    if spec.name in RESERVED_NAMES or spec.name in existing:
+        raise ValueError(f"Field '{spec.name}' already exists")
+    if spec.type not in FIELD_TYPES:
+        raise ValueError(f"Field type must be one of {', '.join(FIELD_TYPES)}")
+    if spec.merge not in MERGE_POLICIES:
+        raise ValueError(f"Merge policy must be one of {', '.join(MERGE_POLICIES)}")
+    if spec.merge == APPEND and spec.type != TEXT:
+        raise ValueError("Only text fields can append")
+    if (spec.merge == UNION) != (spec.type == MULTI_SELECT):
+        raise ValueError("Multi-select fields, and only they, merge by union")
+
+class SchemaRegistry:
+    """Built-in and custom fields, with the per-field lookups compiled into dicts"""
+
+    def __init__(self, custom_fields_path: str):
+        self.path = custom_fields_path
+        self.version = 0
+        self._lock = threading.Lock()
+        self._compile(list(BUILTIN_FIELDS) + self._load_custom())
+
+    def _load_custom(self) -> List[FieldSpec]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Error reading custom fields: %s", e)
+            return []
+
+        specs, names = [], [spec.name for spec in BUILTIN_FIELDS]
+        for entry in entries:
+            spec = FieldSpec.from_dict(entry)
+            try:
+                validate_field(spec, names)
+            except ValueError as e:
+                logger.warning("Skipping custom field %r: %s", entry, e)
+                continue
+            specs.append(spec)
+            names.append(spec.name)
+        return specs
+
+    def _compile(self, specs: List[FieldSpec]):
+        # Built as new objects and swapped in, so readers never see a half-built schema
+        groups: Dict[str, Dict[str, str]] = {}
+        for spec in specs:
+            if spec.group:
+                groups.setdefault(spec.group, {})[spec.name[len(spec.group) + 1:]] = spec.name
+
+        self._specs = specs
+        self._by_name = {spec.name: spec for spec in specs}
+        self._merge = {spec.name: spec.merge for spec in specs}
+        self._types = {spec.name: spec.type for spec in specs}
+        self._meaningful = tuple(spec for spec in specs if spec.meaningful)
+        self._wellness = tuple(spec for spec in specs if spec.wellness)
+        self._groups = groups
+        self._columns = ["date"] + [spec.name for spec in specs] + ["last_updated"]
+        self.version += 1
+
+    def fields(self) -> List[FieldSpec]:
+        return self._specs
+
+    def get(self, name: str) -> Optional[FieldSpec]:
+        return self._by_name.get(name)
+
+    def columns(self) -> List[str]:
+        """CSV column order: date, built-in fields, custom fields, last_updated"""
+        return self._columns
+
+    def merge_policy(self, field: str) -> str:
+        # Anything undeclared (e.g. the timestamp Claude returns) is simply overwritten
+        return self._merge.get(field, OVERWRITE)
+
+    def field_type(self, field: str) -> str:
+        return self._types.get(field, TEXT)
+
+    def group(self, name: str) -> Dict[str, str]:
+        """Sub-key to field name for a nested prompt group such as mood"""
+        return self._groups.get(name, {})
+
+    def has_value(self, spec: FieldSpec, value) -> bool:
+        if not value:
+            return False  # None, "", False, 0, []
+        if spec.type == MULTI_SELECT:
+            return bool(as_list(value))
+        text = str(value).strip()
+        return bool(text) and text.lower() not in PLACEHOLDER_VALUES
+
+    def has_meaningful_data(self, data: Dict) -> bool:
+        """True if a flattened result holds any value worth merging into a day"""
+        return any(self.has_value(spec, data.get(spec.name)) for spec in self._meaningful)
+
+    def has_wellness_data(self, data: Dict) -> bool:
+        """True if a flattened result holds wellness information, not just notes"""
+        return any(self.has_value(spec, data.get(spec.name)) for spec in self._wellness)
+
+    def prompt_fields(self) -> Dict:
+        """Custom fields as they are added to the prompt schema's "fields" """
+        return {spec.name: spec.prompt_value() for spec in self._specs if spec.custom}
+
+    def add_field(self, spec: FieldSpec) -> FieldSpec:
+        """
+        Declare a custom field. Only the field list is written; stored rows are untouched,
+        and the prompt picks the field up on its next use.
+        """
+        with self._lock:
+            validate_field(spec, self._by_name)
+            spec.custom = True
+            specs = self._specs + [spec]
+            self._write_custom([s for s in specs if s.custom])
+            self._compile(specs)
+        return spec
+
+    def _write_custom(self, specs: List[FieldSpec]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump([spec.as_dict() for spec in specs], f, indent=2)
+        os.replace(temp_path, self.path)
+
+_registry: Optional[SchemaRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_schema_registry() -> SchemaRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = SchemaRegistry(get_custom_fields_path())
+    return _registry
@@ -0,0 +1,399 @@
+"""
+Full-text search over raw messages and daily log fields (SQLite FTS5).
+
+Each day and each raw message is one document, with a column per daily log field (and
+one for the message text), so field scopes are FTS5 column filters and every term of a
+query must match the same day or message. Rowids are ordered by date, which makes date
+ranges and newest-first results rowid ranges inside the index. The index is derived
+data: it is updated as messages are saved and days merged, and rebuilt from the logs
+when it is missing or the fields change.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date as date_type
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import stage
+from services.schema_registry import BOOLEAN, MULTI_SELECT, as_list, get_schema_registry
+from services.data_paths import user_path
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+RAW = "raw"
+DAILY = "daily"
+MESSAGE_FIELD = "message"
+
+# Rowid = day number << DAY_SHIFT, plus 1.. for that day's raw messages (0 is the daily log)
+DAY_SHIFT = 20
+
+_MESSAGE_COLUMN = "raw_message"
+_KEY_COLUMN = "doc_key"  # the date, or the raw message's timestamp
+
+# A term is a word, a "quoted phrase" or a prefix*, optionally scoped as field:term
+_TERM_RE = re.compile(r'(?:([a-z][a-z0-9_]*):)?(?:"([^"]*)"|(\S+))')
+_WORD_RE = re.compile(r"\w+")
+
+# Marks around matched words from highlight(), to tell which fields matched
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+def get_search_index_path() -> str:
+    return user_path("search.db")
+
+def search_enabled() -> bool:
+    return os.getenv("SEARCH_INDEX_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def _field_column(field: str) -> str:
+    # Prefixed so field names never clash with the other columns or FTS5's own (rank)
+    return f"f_{field}"
+
+def _day_number(value: Optional[str]) -> Optional[int]:
+    try:
+        return date_type.fromisoformat(value[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def _bound_day(value: Optional[str]) -> Optional[int]:
+    """Day number of a from/to bound; a malformed bound is an error, not an open range"""
+    if not value:
+        return None
+    day = _day_number(value)
+    if day is None:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+    return day
+
+def _field_text(field: str, value) -> str:
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    if get_schema_registry().field_type(field) == MULTI_SELECT:
+        return ", ".join(as_list(value))
+    return str(value)
+
+def daily_documents(row: Dict) -> Dict[str, str]:
+    """Field -> text for each filled, searchable field of a stored daily log row"""
+    documents = {}
+    for spec in get_schema_registry().fields():
+        value = row.get(spec.name)
+        if value in (None, "", []) or spec.type == BOOLEAN:
+            continue  # "True" is not worth finding
+        text = _field_text(spec.name, value).strip()
+        if text:
+            documents[spec.name] = text
+    return documents
+
+class Term:
+    def __init__(self, text: str, fields: Optional[List[str]] = None, phrase: bool = False):
+        self.text = text
+        self.fields = fields  # None matches any field
+        self.phrase = phrase
+
+    def match_expression(self) -> str:
+        """The term as an FTS5 query, quoted so user input is never read as syntax"""
+        prefix = not self.phrase and self.text.endswith("*")
+        expression = '"' + " ".join(_WORD_RE.findall(self.text)) + '"' + ("*" if prefix else "")
+        if self.fields is None:
+            return expression
+        columns = [_MESSAGE_COLUMN if field == MESSAGE_FIELD else _field_column(field) for field in self.fields]
+        return "{" + " ".join(columns) + "} : " + expression
+
+def parse_query(query: str) -> List[Term]:
+    """
+    Split a query into terms that must all match the same day or message.
+    field:term limits a term to one field; a prompt group (mood:) covers its fields.
+    Prefixes that are not field names are searched as ordinary text.
+    """
+    registry = get_schema_registry()
+    terms = []
+    for match in _TERM_RE.finditer(query):
+        scope, phrase, word = match.groups()
+        text = phrase if phrase is not None else word
+        fields = None
+        if scope is not None:
+            if scope == MESSAGE_FIELD or registry.get(scope) is not None:
+                fields = [scope]
+            elif registry.group(scope):
+                fields = list(registry.group(scope).values())
+            else:
+                text = f"{scope} {text}"
+        if _WORD_RE.search(text):
+            terms.append(Term(text, fields, phrase=phrase is not None))
+    return terms
+
+class SearchIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Rebuildable from the logs, so a commit need not wait for the disk
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._fields = self._meta("fields")
+        if self._fields is None:
+            self._create()
+            self._conn.commit()
+
+    def _meta(self, key: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _create(self):
+        """
+        (Re)create the documents table with a column per field in the schema, and
+        indexes for prefixes of up to 4 characters (magn*)
+        """
+        self._fields = [spec.name for spec in get_schema_registry().fields()]
+        columns = [f"{_KEY_COLUMN} UNINDEXED", _MESSAGE_COLUMN] + [_field_column(name) for name in self._fields]
+        self._conn.execute("DROP TABLE IF EXISTS documents")
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE documents USING fts5({', '.join(columns)}, "
+            f"tokenize='porter unicode61', prefix='2 3 4')"
+        )
+        self._set_meta("fields", self._fields)
+
+    def _insert_daily(self, day: int, row: Dict) -> bool:
+        # Fields added since the table was created are indexed by the rebuild they trigger
+        fields = daily_documents(row)
+        values = [fields.get(name, "") for name in self._fields]
+        if not any(values):
+            return False
+        self._conn.execute(
+            f"INSERT INTO documents (rowid, {_KEY_COLUMN}, {', '.join(map(_field_column, self._fields))}) "
+            f"VALUES (?, ?{', ?' * len(self._fields)})",
+            (day << DAY_SHIFT, row["date"], *values),
+        )
+        return True
+
+    def _insert_raw(self, rowid: int, timestamp: str, message: str):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO documents (rowid, {_KEY_COLUMN}, {_MESSAGE_COLUMN}) VALUES (?, ?, ?)",
+            (rowid, timestamp, message),
+        )
+
+    def add_raw_message(self, timestamp: str, message: str):
+        day = _day_number(timestamp)
+        if day is None:
+            return
+        with self._lock, self._conn:
+            last = self._conn.execute(
+                "SELECT MAX(rowid) FROM documents WHERE rowid BETWEEN ? AND ?",
+                (day << DAY_SHIFT, ((day + 1) << DAY_SHIFT) - 1),
+            ).fetchone()[0]
+            self._insert_raw((last or day << DAY_SHIFT) + 1, timestamp, message)
+
+    def update_daily_log(self, row: Dict):
+        """Replace the document of one day with the fields of its stored row"""
+        day = _day_number(row.get("date"))
+        if day is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE rowid = ?", (day << DAY_SHIFT,))
+            self._insert_daily(day, row)
+
+    def replace_daily_logs(self, rows: Iterable[Dict]):
+        """Replace the documents of every day, after the daily logs were rewritten in bulk"""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM documents WHERE (rowid & {(1 << DAY_SHIFT) - 1}) = 0")
+            for row in rows:
+                day = _day_number(row.get("date"))
+                if day is not None:
+                    self._insert_daily(day, row)
+
+    def rebuild(self, raw_messages: Iterable[Tuple[str, str]], daily_rows: Iterable[Dict]) -> Dict:
+        """
+        Recreate the index with the current fields, in one transaction; searches see
+        the old one until it commits.
+        """
+        counts = {"messages": 0, "days": 0}
+        with self._lock, self._conn:
+            self._create()
+
+            # Messages arrive in file order, so numbering them per day only needs the last day
+            numbered_day, number = None, 0
+            for timestamp, message in raw_messages:
+                day = _day_number(timestamp)
+                if day is None:
+                    continue
+                number = number + 1 if day == numbered_day else 1
+                numbered_day = day
+                self._insert_raw((day << DAY_SHIFT) + number, timestamp, message)
+                counts["messages"] += 1
+
+            for row in daily_rows:
+                day = _day_number(row.get("date"))
+                if day is not None and self._insert_daily(day, row):
+                    counts["days"] += 1
+
+            self._conn.execute("INSERT INTO documents (documents) VALUES ('optimize')")
+            self._set_meta("version", INDEX_VERSION)
+        return counts
+
+    def is_current(self) -> bool:
+        """Built by this version, with a column for every field in the schema"""
+        with self._lock:
+            return (self._meta("version") == INDEX_VERSION and
+                    self._fields == [spec.name for spec in get_schema_registry().fields()])
+
+    def search(self, query: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               kind: Optional[str] = None, order: str = "rank", limit: int = 20) -> Dict:
+        """
+        Days and messages matching every term, best first (or newest first with
+        order="date"), each with the text of the fields that matched. Date bounds are
+        inclusive days; a malformed one raises ValueError.
+        """
+        started = time.perf_counter()
+        first_day = _bound_day(date_from)
+        last_day = _bound_day(date_to)
+        terms = parse_query(query)
+        for term in terms:
+            # A field added since the index was built has no column (and no values) yet
+            if term.fields is not None:
+                term.fields = [field for field in term.fields if field == MESSAGE_FIELD or field in self._fields]
+        if not terms or any(term.fields == [] for term in terms):
+            return {"query": query, "total": 0, "results": [], "took_ms": 0.0}
+
+        expression = " AND ".join(term.match_expression() for term in terms)
+        if kind == RAW:
+            expression = "{" + _MESSAGE_COLUMN + "} : (" + expression + ")"
+        elif kind == DAILY:
+            expression = "- {" + _MESSAGE_COLUMN + "} : (" + expression + ")"
+
+        where = "documents MATCH ? AND rowid BETWEEN ? AND ?"
+        params = (
+            expression,
+            first_day << DAY_SHIFT if first_day is not None else 0,
+            ((last_day + 1) << DAY_SHIFT) - 1 if last_day is not None else 1 << 62,
+        )
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM documents WHERE {where}", params).fetchone()[0]
+            ranked = self._conn.execute(
+                f"SELECT rowid, -rank FROM documents WHERE {where} "
+                f"ORDER BY {'rowid DESC' if order == 'date' else 'rank'} LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+            results = self._results(expression, ranked)
+
+        return {
+            "query": query,
+            "total": total,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def _results(self, expression: str, ranked: List[Tuple[int, float]]) -> List[Dict]:
+        """Key and matched field text of the ranked documents, highlighted only for these"""
+        if not ranked:
+            return []
+        names = [MESSAGE_FIELD] + self._fields
+        highlights = ", ".join(
+            f"highlight(documents, {column}, char(2), char(3))" for column in range(1, len(names) + 1)
+        )
+        rows = {
+            row[0]: row[1:]
+            for row in self._conn.execute(
+                f"SELECT rowid, {_KEY_COLUMN}, {highlights} FROM documents "
+                f"WHERE documents MATCH ? AND rowid IN ({','.join('?' * len(ranked))})",
+                (expression, *(rowid for rowid, _ in ranked)),
+            )
+        }
+
+        results = []
+        for rowid, score in ranked:
+            key, *texts = rows[rowid]
+            fields = {
+                name: text.replace(_MARK_START, "").replace(_MARK_END, "")
+                for name, text in zip(names, texts) if text and _MARK_START in text
+            }
+            raw = rowid & ((1 << DAY_SHIFT) - 1) != 0
+            result = {"kind": RAW if raw else DAILY, "date": key[:10], "score": round(score, 3), "fields": fields}
+            if raw:
+                result["timestamp"] = key
+            results.append(result)
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# One index per database path (one process-wide connection)
+_indexes: Dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_search_index(path: Optional[str] = None) -> SearchIndex:
+    path = path or get_search_index_path()
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = SearchIndex(path)
+        return index
+
+def rebuild_search_index(index: Optional[SearchIndex] = None) -> Dict:
+    """Index every raw message and stored day from scratch"""
+    from services.daily_logs_manager import get_daily_logs_store
+    from services.raw_logger import iter_raw_messages
+
+    index = index or get_search_index()
+    started = time.perf_counter()
+    raw_messages = (
+        (row["timestamp"], row["message"])
+        for _, row in iter_raw_messages()
+        if row.get("timestamp") and (row.get("message") or "").strip()
+    )
+    counts = index.rebuild(raw_messages, get_daily_logs_store().iter_rows())
+    counts["documents"] = index.count()
+    counts["seconds"] = round(time.perf_counter() - started, 3)
+    return counts
+
+def ensure_search_index() -> SearchIndex:
+    """The index, rebuilt first if it never was, its format changed or fields were added"""
+    index = get_search_index()
+    if not index.is_current():
+        rebuild_search_index(index)
+    return index
+
+# Called from the write paths: a failed index update is logged, never fails the write
+
+def index_raw_message(timestamp: str, message: str):
+    if not search_enabled():
+        return
+    try:
+        with stage("index"):
+            get_search_index().add_raw_message(timestamp, message)
+    except sqlite3.Error as e:
+        logger.error("Error indexing raw message: %s", e)
+
+def index_daily_log(row: Dict):
+    if not search_enabled():
+        return
+    try:
+        with stage("index"):
+            get_search_index().update_daily_log(row)
+    except sqlite3.Error as e:
+        logger.error("Error indexing daily log for %s: %s", row.get("date"), e)
+
+def reindex_daily_logs(rows: Iterable[Dict]):
+    if not search_enabled():
+        return
+    try:
+        get_search_index().replace_daily_logs(rows)
+    except sqlite3.Error as e:
+        logger.error("Error reindexing daily logs: %s", e)
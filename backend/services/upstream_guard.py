@@ -0,0 +1,249 @@
+"""
+Admission control around calls to Claude: a concurrency limit with a bounded wait list,
+an optional rate limit, jittered exponential retries within a total deadline, and a
+circuit breaker that fails fast while the upstream is unhealthy.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import anthropic
+
+from services.metrics import UPSTREAM_CALLS, UPSTREAM_ERRORS
+from services.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Transient statuses worth retrying: rate limited, overloaded, server errors
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504, 529)
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+def unavailable_mode() -> str:
+    """What /log does while Claude is unavailable: "store" the raw message only, or "fail" with 503"""
+    return os.getenv("CLAUDE_UNAVAILABLE_MODE", "store").lower()
+
+class UpstreamUnavailable(Exception):
+    """Claude cannot be reached right now; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _error_label(error: Exception) -> str:
+    status = getattr(error, "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (anthropic.APITimeoutError, anthropic.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES
+    return False
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for `reset_seconds`,
+    then lets a single trial call through (half open); its outcome closes or reopens it.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> bool:
+        """Admit a call or raise UpstreamUnavailable; True if it is the half-open trial"""
+        state = self.state
+        if state == "open":
+            remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+            raise UpstreamUnavailable("Claude is unavailable (circuit open)", retry_after=max(1.0, remaining))
+        if state == "half_open":
+            if self.trial_running:
+                raise UpstreamUnavailable("Claude is unavailable (circuit half open)", retry_after=1.0)
+            self.trial_running = True
+            return True
+        return False
+
+    def end_trial(self):
+        """The trial ended without an outcome (rejected, timed out waiting or cancelled)"""
+        self.trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.threshold:
+            if self.opened_at is None or self.trial_running:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+class UpstreamGuard:
+    def __init__(self, max_concurrency: int, max_waiting: int, rate: Optional[float],
+                 deadline: float, attempt_timeout: float, base_delay: float, max_delay: float,
+                 breaker: CircuitBreaker):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_waiting = max(0, max_waiting)
+        self.rate_limiter = RateLimiter(rate, burst=self.max_concurrency) if rate else None
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0,
+                       "rejected_busy": 0, "rejected_open": 0, "deadline_exceeded": 0}
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, capped exponential]
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def call(self, request: Callable[[float], Awaitable]):
+        """
+        Run request(timeout) under admission control and retries. Each attempt gets the
+        attempt timeout, cut short to what is left of the deadline.
+        """
+        self._stats["calls"] += 1
+        try:
+            is_trial = self.breaker.before_call()
+        except UpstreamUnavailable:
+            self._stats["rejected_open"] += 1
+            UPSTREAM_CALLS.inc(outcome="rejected_open")
+            raise
+
+        try:
+            return await self._admit(request)
+        finally:
+            if is_trial:
+                # A success or failure has already closed or reopened the circuit; anything
+                # else, including cancellation, leaves it half open for the next call to try
+                self.breaker.end_trial()
+
+    async def _admit(self, request: Callable[[float], Awaitable]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._in_flight >= self.max_concurrency and self._waiting >= self.max_waiting:
+            self._stats["rejected_busy"] += 1
+            UPSTREAM_CALLS.inc(outcome="rejected_busy")
+            raise UpstreamUnavailable("Too many requests waiting for Claude", retry_after=1.0)
+
+        expires = time.monotonic() + self.deadline
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self._stats["deadline_exceeded"] += 1
+            UPSTREAM_CALLS.inc(outcome="deadline_exceeded")
+            raise UpstreamUnavailable("Timed out waiting for a Claude slot", retry_after=1.0)
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            return await self._call_with_retries(request, expires)
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _call_with_retries(self, request: Callable[[float], Awaitable], expires: float):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+
+            timeout = min(self.attempt_timeout, expires - time.monotonic())
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError()
+                result = await asyncio.wait_for(request(timeout), timeout=timeout)
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(error=_error_label(e))
+                if not is_retryable(e):
+                    # The upstream answered; the request itself was wrong
+                    self.breaker.record_success()
+                    self._stats["failed"] += 1
+                    UPSTREAM_CALLS.inc(outcome="failed")
+                    raise
+
+                delay = _retry_after(e) or self._backoff(attempt)
+                if time.monotonic() + delay >= expires:
+                    self.breaker.record_failure()
+                    self._stats["failed"] += 1
+                    self._stats["deadline_exceeded"] += 1
+                    UPSTREAM_CALLS.inc(outcome="deadline_exceeded")
+                    raise UpstreamUnavailable(f"Claude did not answer within {self.deadline:g}s: {e}") from e
+
+                attempt += 1
+                self._stats["retries"] += 1
+                logger.warning("Claude call failed (%s), retry %d in %.2fs", _error_label(e), attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._stats["succeeded"] += 1
+            UPSTREAM_CALLS.inc(outcome="succeeded")
+            return result
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+        }
+
+_guard: Optional[UpstreamGuard] = None
+
+def get_upstream_guard() -> UpstreamGuard:
+    global _guard
+    if _guard is None:
+        rate = _env_float("CLAUDE_RATE_PER_SECOND", 0)
+        _guard = UpstreamGuard(
+            max_concurrency=_env_int("CLAUDE_MAX_CONCURRENCY", 8),
+            max_waiting=_env_int("CLAUDE_MAX_WAITING", 32),
+            rate=rate or None,
+            deadline=_env_float("CLAUDE_DEADLINE_SECONDS", 30.0),
+            attempt_timeout=_env_float("CLAUDE_ATTEMPT_TIMEOUT_SECONDS", 20.0),
+            base_delay=_env_float("CLAUDE_RETRY_BASE_SECONDS", 0.5),
+            max_delay=_env_float("CLAUDE_RETRY_MAX_SECONDS", 8.0),
+            breaker=CircuitBreaker(
+                threshold=_env_int("CLAUDE_BREAKER_FAILURES", 5),
+                reset_seconds=_env_float("CLAUDE_BREAKER_RESET_SECONDS", 30.0),
+            ),
+        )
+    return _guard
@@ -0,0 +1,161 @@
+"""
+Coordinates writers to the data files, within this process and across processes
+(for example rebuild_daily_logs.py running beside the server).
+"""
+
+import errno
+import os
+import random
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import date as date_type
+from typing import Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+class _ReadWriteLock:
+    """Many shared holders or one exclusive holder; a waiting exclusive holder blocks new shared ones"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._shared = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._exclusive or self._exclusive_waiting:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._exclusive_waiting += 1
+            try:
+                while self._exclusive or self._shared:
+                    self._cond.wait()
+            finally:
+                self._exclusive_waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+_registry_lock = threading.Lock()
+_file_locks: Dict[str, _ReadWriteLock] = {}
+_thread_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_lock_files: Dict[str, int] = {}
+
+def _file_rw_lock(lock_path: str) -> _ReadWriteLock:
+    with _registry_lock:
+        lock = _file_locks.get(lock_path)
+        if lock is None:
+            lock = _file_locks[lock_path] = _ReadWriteLock()
+        return lock
+
+def _thread_lock(lock_path: str, key: str) -> threading.Lock:
+    with _registry_lock:
+        lock = _thread_locks.get((lock_path, key))
+        if lock is None:
+            lock = _thread_locks[(lock_path, key)] = threading.Lock()
+        return lock
+
+def _lock_file(lock_path: str) -> int:
+    # One descriptor per lock file for the life of the process: closing any
+    # descriptor on a file would drop every record lock this process holds on it
+    with _registry_lock:
+        fd = _lock_files.get(lock_path)
+        if fd is None:
+            os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+            fd = _lock_files[lock_path] = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return fd
+
+def _date_offset(date: str) -> int:
+    """Byte offset standing in for a date in the lock file, so each day locks independently"""
+    try:
+        return date_type.fromisoformat(date).toordinal()
+    except ValueError:
+        return zlib.crc32(date.encode("utf-8")) % (1 << 30) + 1_000_000
+
+def _acquire_range(fd: int, offset: int, length: int):
+    # Record locks belong to the process, not the thread, so the kernel can report a
+    # deadlock when threads of two processes wait on each other's dates. No thread is
+    # actually stuck behind its own process, so back off briefly and try again.
+    while True:
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, length, offset)
+            return
+        except OSError as e:
+            if e.errno != errno.EDEADLK:
+                raise
+            time.sleep(random.uniform(0.001, 0.01))
+
+@contextmanager
+def _range_locked(lock_path: str, offset: int, length: int):
+    """The cross-process byte-range lock"""
+    if fcntl is None:
+        yield
+        return
+
+    fd = _lock_file(lock_path)
+    _acquire_range(fd, offset, length)
+    try:
+        yield
+    finally:
+        fcntl.lockf(fd, fcntl.LOCK_UN, length, offset)
+
+@contextmanager
+def date_lock(data_path: str, date: str):
+    """Serialize read-modify-write merges of one date; other dates proceed in parallel"""
+    lock_path = f"{data_path}.lock"
+    # Record locks never conflict within a process, so the whole-file lock is held out
+    # in-process by the read/write lock: date locks share it, file_lock takes it alone
+    with _file_rw_lock(lock_path).shared(), _thread_lock(lock_path, date):
+        with _range_locked(lock_path, _date_offset(date), 1):
+            yield
+
+@contextmanager
+def file_lock(data_path: str):
+    """Exclusive lock on a whole data file (appends and full rewrites)"""
+    lock_path = f"{data_path}.lock"
+    with _file_rw_lock(lock_path).exclusive(), _range_locked(lock_path, 0, 0):
+        yield
+
+@contextmanager
+def atomic_write(path: str, newline: str = "", encoding: str = "utf-8"):
+    """
+    Write to a temporary file next to path and rename it over path on success,
+    so readers see either the old or the new file, never a truncated one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", newline=newline, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,282 @@
+"""
+Local stand-in for the Anthropic Messages API, for offline testing.
+
+Run it with:
+    uvicorn stubs.fake_claude:app --port 8100
+and point the backend at it with ANTHROPIC_BASE_URL=http://localhost:8100.
+
+Requests are checked for the shape claude_service sends (cacheable system prefix,
+one short user message); anything else is rejected with a 400 like the real API.
+The Message Batches endpoints are served too, for rebuild_daily_logs.py --batch, and
+failures (429/529/5xx/hung requests) can be injected to exercise retries and the breaker.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake Claude")
+
+# Prefix hashes already "cached", to report cache writes vs. cache reads
+_cached_prefixes = set()
+
+# Every request body received, newest last, for inspection by callers
+received_requests = []
+
+def _error(status: int, error_type: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"type": "error", "error": {"type": error_type, "message": message}},
+    )
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def check_request_shape(body: dict) -> str:
+    """Return a description of what is wrong with the request, or "" if it is valid"""
+    for key in ("model", "max_tokens", "messages"):
+        if key not in body:
+            return f"{key}: Field required"
+
+    system = body.get("system")
+    if not isinstance(system, list) or not system:
+        return "system: expected a list of content blocks"
+    for block in system:
+        if block.get("type") != "text" or not isinstance(block.get("text"), str):
+            return "system: blocks must be text blocks"
+    if system[-1].get("cache_control") != {"type": "ephemeral"}:
+        return "system: last block must carry cache_control ephemeral"
+
+    messages = body["messages"]
+    if len(messages) != 1 or messages[0].get("role") != "user":
+        return "messages: expected a single user message"
+    if not isinstance(messages[0].get("content"), str):
+        return "messages.0.content: expected the per-message suffix as a string"
+
+    return ""
+
+def build_reply(suffix: str) -> dict:
+    """
+    Deterministic structured reply: the user input is echoed into notes, or into the
+    field named by FAKE_CLAUDE_ECHO_FIELD (e.g. snack_description, to exercise merges)
+    """
+    date_match = re.search(r"Current date: (\S+)", suffix)
+    input_match = re.search(r"User input: (.*?)\n\s*Return only", suffix, re.S)
+    echoed = input_match.group(1).strip() if input_match else suffix.strip()
+
+    reply = {
+        "date": date_match.group(1) if date_match else datetime.now().strftime("%Y-%m-%d"),
+        "timestamp": datetime.now().isoformat(),
+        "fields": {
+            "breakfast_description": None,
+            "lunch_description": None,
+            "dinner_description": None,
+            "snack_description": None,
+            "mood": {"morning": None, "afternoon": None, "night": None},
+            "sleep": None,
+            "hydration": None,
+            "activity": None,
+            "notes": echoed,
+            "alcohol": None,
+            "caffeine": None,
+            "marijuana": None,
+            "exercise_type": None,
+            "supplements": [],
+        },
+    }
+    echo_field = os.getenv("FAKE_CLAUDE_ECHO_FIELD", "notes")
+    if echo_field != "notes" and echo_field in reply["fields"]:
+        reply["fields"]["notes"] = None
+        reply["fields"][echo_field] = echoed
+    return reply
+
+def _reply(body: dict) -> dict:
+    """The Message object answering a valid request"""
+    prefix = "".join(block["text"] for block in body["system"])
+    suffix = body["messages"][0]["content"]
+
+    prefix_hash = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+    prefix_tokens = _estimate_tokens(prefix)
+    if prefix_hash in _cached_prefixes:
+        cache_creation, cache_read = 0, prefix_tokens
+    else:
+        _cached_prefixes.add(prefix_hash)
+        cache_creation, cache_read = prefix_tokens, 0
+
+    reply = json.dumps(build_reply(suffix))
+
+    return {
+        "id": "msg_fake_" + hashlib.sha256(suffix.encode("utf-8")).hexdigest()[:16],
+        "type": "message",
+        "role": "assistant",
+        "model": body["model"],
+        "content": [{"type": "text", "text": reply}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": _estimate_tokens(suffix),
+            "output_tokens": _estimate_tokens(reply),
+            "cache_creation_input_tokens": cache_creation,
+            "cache_read_input_tokens": cache_read,
+        },
+    }
+
+# Fault injection: probability of each failure per /v1/messages request, set from
+# FAKE_CLAUDE_FAULTS ("429=0.2,529=0.1,timeout=0.05") or at runtime via POST /fake/faults.
+# A "timeout" fault holds the request for FAKE_CLAUDE_HANG_SECONDS before answering.
+_FAULT_ERRORS = {
+    429: "rate_limit_error",
+    500: "api_error",
+    503: "api_error",
+    529: "overloaded_error",
+}
+
+def _parse_faults(spec: str) -> dict:
+    faults = {}
+    for part in filter(None, (item.strip() for item in spec.split(","))):
+        name, _, probability = part.partition("=")
+        faults[name.strip()] = float(probability)
+    return faults
+
+faults = _parse_faults(os.getenv("FAKE_CLAUDE_FAULTS", ""))
+fault_counts = {}
+
+def _pick_fault():
+    roll = random.random()
+    for name, probability in faults.items():
+        if roll < probability:
+            return name
+        roll -= probability
+    return None
+
+@app.get("/fake/faults")
+async def get_faults():
+    return {"faults": faults, "injected": fault_counts}
+
+@app.post("/fake/faults")
+async def set_faults(request: Request):
+    """Replace the fault probabilities, e.g. {"529": 1.0} for a full outage or {} to heal"""
+    body = await request.json()
+    faults.clear()
+    faults.update({str(name): float(probability) for name, probability in body.items()})
+    return {"faults": faults}
+
+@app.post("/v1/messages")
+async def create_message(request: Request):
+    body = await request.json()
+    received_requests.append(body)
+
+    problem = check_request_shape(body)
+    if problem:
+        return _error(400, "invalid_request_error", problem)
+
+    latency_ms = float(os.getenv("FAKE_CLAUDE_LATENCY_MS", 0))
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000)
+
+    fault = _pick_fault()
+    if fault is not None:
+        fault_counts[fault] = fault_counts.get(fault, 0) + 1
+        if fault == "timeout":
+            await asyncio.sleep(float(os.getenv("FAKE_CLAUDE_HANG_SECONDS", 30)))
+        else:
+            status = int(fault)
+            return _error(status, _FAULT_ERRORS.get(status, "api_error"), f"Injected {status}")
+
+    return _reply(body)
+
+# Message Batches: a batch stays in progress for FAKE_BATCH_PROCESSING_SECONDS after
+# creation, then every request is answered as /v1/messages would.
+# FAKE_BATCH_ERROR_EVERY=n makes every nth request of a batch come back errored.
+batches = {}
+
+def _batch_view(batch: dict, request: Request) -> dict:
+    ended = time.time() >= batch["ends_at"]
+    total = len(batch["requests"])
+    errored = sum(1 for result in batch["results"] if result["result"]["type"] == "errored")
+    return {
+        "id": batch["id"],
+        "type": "message_batch",
+        "processing_status": "ended" if ended else "in_progress",
+        "request_counts": {
+            "processing": 0 if ended else total,
+            "succeeded": total - errored if ended else 0,
+            "errored": errored if ended else 0,
+            "canceled": 0,
+            "expired": 0,
+        },
+        "created_at": batch["created_at"],
+        "ended_at": datetime.fromtimestamp(batch["ends_at"]).isoformat() if ended else None,
+        "results_url": f"{str(request.base_url).rstrip('/')}/v1/messages/batches/{batch['id']}/results" if ended else None,
+    }
+
+@app.post("/v1/messages/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    requests = body.get("requests")
+    if not isinstance(requests, list) or not requests:
+        return _error(400, "invalid_request_error", "requests: expected a non-empty list")
+
+    custom_ids = set()
+    for n, item in enumerate(requests):
+        custom_id = item.get("custom_id")
+        if not isinstance(custom_id, str) or not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", custom_id):
+            return _error(400, "invalid_request_error", f"requests.{n}.custom_id: invalid")
+        if custom_id in custom_ids:
+            return _error(400, "invalid_request_error", f"requests.{n}.custom_id: duplicate")
+        custom_ids.add(custom_id)
+        problem = check_request_shape(item.get("params") or {})
+        if problem:
+            return _error(400, "invalid_request_error", f"requests.{n}.params.{problem}")
+
+    error_every = int(os.getenv("FAKE_BATCH_ERROR_EVERY", 0))
+    results = []
+    for n, item in enumerate(requests, start=1):
+        received_requests.append(item["params"])
+        if error_every and n % error_every == 0:
+            outcome = {"type": "errored", "error": {"type": "api_error", "message": "Simulated failure"}}
+        else:
+            outcome = {"type": "succeeded", "message": _reply(item["params"])}
+        results.append({"custom_id": item["custom_id"], "result": outcome})
+
+    batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:16]}"
+    batches[batch_id] = {
+        "id": batch_id,
+        "requests": requests,
+        "results": results,
+        "created_at": datetime.now().isoformat(),
+        "ends_at": time.time() + float(os.getenv("FAKE_BATCH_PROCESSING_SECONDS", 0)),
+    }
+    return _batch_view(batches[batch_id], request)
+
+@app.get("/v1/messages/batches/{batch_id}")
+async def retrieve_batch(batch_id: str, request: Request):
+    batch = batches.get(batch_id)
+    if batch is None:
+        return _error(404, "not_found_error", f"Batch {batch_id} not found")
+    return _batch_view(batch, request)
+
+@app.get("/v1/messages/batches/{batch_id}/results")
+async def batch_results(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        return _error(404, "not_found_error", f"Batch {batch_id} not found")
+    if time.time() < batch["ends_at"]:
+        return _error(400, "invalid_request_error", "Batch is still processing")
+
+    # Results come back in no particular order, as from the real API
+    results = list(batch["results"])
+    random.shuffle(results)
+    return StreamingResponse(
+        (json.dumps(result) + "\n" for result in results),
+        media_type="application/binary",
+    )
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Script to validate or repair the raw log (the monthly segments in data/raw) in one
+streaming pass.
+
+--check lists every problem with its segment and line number and exits 1 if the log
+needs repair, without changing anything (the server runs the same check at startup).
+--repair rewrites each segment that has fixable rows, atomically; rows that cannot be
+repaired are moved to data/logs.rejected.csv with their segment and line number.
+--path checks or repairs a single CSV file instead (e.g. an old logs.csv backup).
+
+Usage: python validate_logs.py --check [--path FILE.csv] [--max-listed 20] [--user ID]
+       python validate_logs.py --repair [--path FILE.csv] [--user ID]
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from services.data_paths import set_current_user
+from services.logs_validator import check_logs_csv, get_rejects_path, repair_logs_csv
+from services.raw_logger import get_raw_logs_dir, get_raw_logs_path, has_raw_messages
+
+def print_problems(limit):
+    printed = [0]
+
+    def on_problem(problem):
+        if limit is None or printed[0] < limit:
+            print(f"  {problem}")
+        printed[0] += 1
+
+    return on_problem
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Validate or repair the raw message log")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--check", action="store_true", help="report problems without changing the log")
+    mode.add_argument("--repair", action="store_true", help="rewrite the log with problems fixed")
+    parser.add_argument("--path", default=None, help="a single CSV file instead of the segmented log")
+    parser.add_argument("--max-listed", type=int, default=None,
+                        help="list at most this many problems (all are counted)")
+    parser.add_argument("--user", default=None, help="whose data to use (X-User-Id; default: the default user)")
+    args = parser.parse_args()
+    set_current_user(args.user)
+
+    if not (os.path.exists(args.path) if args.path else has_raw_messages()):
+        print(f"No raw logs found at {args.path or get_raw_logs_dir()}")
+        sys.exit(0)
+
+    on_problem = print_problems(args.max_listed)
+    report = repair_logs_csv(args.path, on_problem) if args.repair else check_logs_csv(args.path, on_problem)
+
+    rate = report.records / report.seconds if report.seconds else 0
+    print(f"{report.records} records in {report.seconds:.2f}s ({rate:,.0f}/s): "
+          f"{report.kept} valid, {report.rejected} rejected")
+    for kind, count in sorted(report.problems.items()):
+        print(f"  {kind}: {count}")
+
+    if args.repair:
+        print(f"✅ Repaired {args.path or get_raw_logs_dir()}" +
+              (f"; rejected records appended to {get_rejects_path(args.path or get_raw_logs_path())}"
+               if report.rejected else ""))
+    elif report.needs_repair:
+        print("Run with --repair to fix these problems")
+    sys.exit(1 if args.check and report.needs_repair else 0)
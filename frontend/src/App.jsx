@@ -9,7 +9,7 @@ const API_URL = 'http://localhost:8000'
 
 function App() {
   const [logs, setLogs] = useState([])
-  const [recentActivity, setRecentActivity] = useState({ recent_messages: [], today_log: null, daily_logs: [] })
+  const [recentActivity, setRecentActivity] = useState({ recent_messages: [], today_log: null })
   const [loading, setLoading] = useState(false)
   const [lastLoadedDate, setLastLoadedDate] = useState(new Date().toDateString())
 
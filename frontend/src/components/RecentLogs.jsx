@@ -4,7 +4,7 @@ import { Link } from 'react-router-dom'
 function RecentLogs({ recentActivity }) {
   const [isExpanded, setIsExpanded] = useState(false)
   
-  const { recent_messages = [], today_log, daily_logs = [] } = recentActivity || {}
+  const { recent_messages = [], today_log } = recentActivity || {}
   
   if (!recent_messages.length && !today_log) {
     return (